@@ -0,0 +1,184 @@
+import json
+
+import numpy as np
+import pandas as pd
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt6.QtWidgets import QAbstractItemView, QDialog, QHBoxLayout, QLabel, QLineEdit, QTableView, QVBoxLayout
+
+# Attribute table over a layer's GeoDataFrame. The model never copies the
+# data: it keeps each column's array and a view (an array of row positions
+# after sort and filter), and hands rows to the view in batches as they are
+# scrolled to. Sorting and filtering are vectorized pandas operations run on
+# the thread pool; their result only replaces the view array.
+
+FETCH_ROWS = 1000
+MAX_HIGHLIGHT = 10000
+
+
+def sort_rows(frame, column, ascending=True, rows=None):
+    # Row positions of `rows` (default all) ordered by column, missing last
+    rows = np.arange(len(frame)) if rows is None else rows
+    values = pd.Series(frame[column].to_numpy()[rows])
+    order = values.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+    return rows[order]
+
+
+def filter_rows(frame, expression):
+    """
+    Row positions matching a pandas expression such as "POP > 1000 and
+    STATE == 'Oyo'". Text that is not a valid expression is searched for,
+    case-insensitively, in every text column.
+    """
+    expression = expression.strip()
+    if not expression:
+        return np.arange(len(frame))
+    try:
+        mask = np.asarray(frame.eval(expression), dtype=bool)
+        if mask.shape == (len(frame),):
+            return np.flatnonzero(mask)
+    except Exception:
+        pass
+    mask = np.zeros(len(frame), dtype=bool)
+    for column in frame.select_dtypes(include=["object", "string"]).columns:
+        mask |= frame[column].astype("string").str.contains(expression, case=False, regex=False).fillna(False).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def _format(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    if isinstance(value, (float, np.floating)):
+        return f"{value:.6g}"
+    return str(value)
+
+
+class AttributeTableModel(QAbstractTableModel):
+    def __init__(self, frame, parent=None):
+        super().__init__(parent)
+        geometry = frame.geometry.name if hasattr(frame, "geometry") else None
+        self.frame = frame
+        self.names = [column for column in frame.columns if column != geometry]
+        self.columns = [frame[column].to_numpy() for column in self.names]
+        self.rows = np.arange(len(frame))
+        self.loaded = min(FETCH_ROWS, len(self.rows))
+        self.sort_requested = None  # set by the dialog to run sorts off-thread
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.loaded < len(self.rows)
+
+    def fetchMore(self, parent=QModelIndex()):
+        count = min(FETCH_ROWS, len(self.rows) - self.loaded)
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or not index.isValid():
+            return None
+        return _format(self.columns[index.column()][self.rows[index.row()]])
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.names[section]
+        return str(self.rows[section])
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        if self.sort_requested:
+            self.sort_requested(self.names[column], order == Qt.SortOrder.AscendingOrder)
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = rows
+        self.loaded = min(FETCH_ROWS, len(rows))
+        self.endResetModel()
+
+    def source_rows(self, view_rows):
+        return self.rows[np.asarray(view_rows, dtype=int)]
+
+
+class AttributeTable(QDialog):
+    def __init__(self, layer_id, name, layer, map_layers, start_task, parent=None):
+        """
+        Table of a layer's attributes. `start_task` is GISApp.start_task, used
+        for sorting and filtering; selected rows are highlighted on the map
+        through `map_layers`.
+        """
+        super().__init__(parent)
+        self.layer_id = layer_id
+        self.layer = layer
+        self.map_layers = map_layers
+        self.start_task = start_task
+        self.sort_key = None
+        self.generation = 0
+
+        self.setWindowTitle(f"Attribute Table - {name}")
+        self.resize(800, 500)
+        self.model = AttributeTableModel(layer.geodata, self)
+        self.model.sort_requested = self.sort
+
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("Filter: text, or an expression such as POP > 1000")
+        self.filter_input.returnPressed.connect(self.apply_filter)
+        self.count_label = QLabel()
+
+        self.view = QTableView()
+        self.view.setModel(self.model)
+        self.view.setSortingEnabled(True)
+        self.view.horizontalHeader().setSortIndicatorShown(True)
+        self.view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.view.selectionModel().selectionChanged.connect(self.highlight_selection)
+
+        top = QHBoxLayout()
+        top.addWidget(self.filter_input)
+        top.addWidget(self.count_label)
+        layout = QVBoxLayout(self)
+        layout.addLayout(top)
+        layout.addWidget(self.view)
+        self.update_count()
+
+    def update_count(self):
+        self.count_label.setText(f"{len(self.model.rows)} of {len(self.layer.geodata)} rows")
+
+    def run(self, label, fn):
+        # Only the latest sort/filter is applied if several overlap
+        self.generation += 1
+        generation = self.generation
+
+        def finished(rows):
+            if generation == self.generation:
+                self.model.set_rows(rows)
+                self.update_count()
+
+        self.start_task(label, lambda progress, cancelled, log: fn(), finished)
+
+    def sort(self, column, ascending):
+        self.sort_key = (column, ascending)
+        frame, rows = self.layer.geodata, self.model.rows
+        self.run(f"Sorting by {column}", lambda: sort_rows(frame, column, ascending, rows))
+
+    def apply_filter(self):
+        frame, expression, sort_key = self.layer.geodata, self.filter_input.text(), self.sort_key
+
+        def run():
+            rows = filter_rows(frame, expression)
+            if sort_key:
+                rows = sort_rows(frame, *sort_key, rows=rows)
+            return rows
+
+        self.run("Filtering", run)
+
+    def selected_rows(self):
+        view_rows = sorted({index.row() for index in self.view.selectionModel().selectedRows()})
+        return self.model.source_rows(view_rows)
+
+    def highlight_selection(self, *args):
+        rows = self.selected_rows()
+        self.map_layers.highlight(json.loads(self.layer.features_geojson(rows[:MAX_HIGHLIGHT])))
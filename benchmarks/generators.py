@@ -0,0 +1,149 @@
+import numpy as np
+import geopandas as gpd
+import netCDF4
+import pandas as pd
+import pyogrio
+import rasterio
+import shapely
+from rasterio.transform import from_bounds
+from rasterio.windows import Window
+
+# Seeded synthetic data for the benchmarks: points, overlapping polygons and
+# random-walk lines over Nigeria, a tiled GeoTIFF and a monthly precipitation
+# NetCDF cube. The same (size, seed) always gives the same files, so timings
+# are comparable across commits; rasters and cubes are written block by block
+# so large sizes don't need to fit in memory.
+
+NIGERIA = (2.7, 4.3, 14.6, 13.8)  # lon/lat bounds
+SIZES = {
+    "small": {"points": 10_000, "polygons": 2_000, "lines": 2_000, "raster": 2048, "cube": (240, 60, 60)},
+    "medium": {"points": 200_000, "polygons": 20_000, "lines": 20_000, "raster": 8192, "cube": (480, 200, 200)},
+    "large": {"points": 1_000_000, "polygons": 100_000, "lines": 100_000, "raster": 16384, "cube": (720, 400, 400)},
+}
+
+
+def _lonlat(rng, n, bounds=NIGERIA):
+    return rng.uniform(bounds[0], bounds[2], n), rng.uniform(bounds[1], bounds[3], n)
+
+
+def _attributes(rng, n):
+    return pd.DataFrame({
+        "value": rng.normal(100, 25, n).round(3),
+        "category": rng.integers(0, 12, n),
+        "name": [f"feature {i}" for i in range(n)],
+    })
+
+
+def points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    lon, lat = _lonlat(rng, n)
+    return gpd.GeoDataFrame(_attributes(rng, n), geometry=gpd.points_from_xy(lon, lat), crs=4326)
+
+
+def polygons(n, seed=0, quad_segs=4):
+    # Overlapping discs of 4 * quad_segs vertices, so union has real work to do
+    rng = np.random.default_rng(seed)
+    lon, lat = _lonlat(rng, n)
+    radius = rng.uniform(0.01, 0.15, n)
+    geoms = shapely.buffer(shapely.points(lon, lat), radius, quad_segs=quad_segs)
+    return gpd.GeoDataFrame(_attributes(rng, n), geometry=geoms, crs=4326)
+
+
+def lines(n, seed=0, vertices=20):
+    rng = np.random.default_rng(seed)
+    lon, lat = _lonlat(rng, n)
+    steps = rng.normal(0, 0.01, (n, vertices, 2))
+    steps[:, 0] = np.column_stack([lon, lat])
+    coords = np.cumsum(steps, axis=1).reshape(-1, 2)
+    geoms = shapely.linestrings(coords, indices=np.repeat(np.arange(n), vertices))
+    return gpd.GeoDataFrame(_attributes(rng, n), geometry=geoms, crs=4326)
+
+
+def write_vector(frame, path):
+    # Driver from the suffix (.shp, .geojson, .gpkg)
+    pyogrio.write_dataframe(frame, path)
+    return path
+
+
+def geotiff(path, size, seed=0, block=512):
+    """
+    Square float32 GeoTIFF over Nigeria: a smooth field plus noise, tiled and
+    compressed, with a nodata hole, written one block row at a time.
+    """
+    rng = np.random.default_rng(seed)
+    profile = dict(
+        driver="GTiff", width=size, height=size, count=1, dtype="float32", nodata=-9999.0,
+        crs="EPSG:4326", transform=from_bounds(*NIGERIA, size, size),
+        tiled=True, blockxsize=block, blockysize=block, compress="deflate", bigtiff="if_safer"
+    )
+    x = np.linspace(0, 6 * np.pi, size)
+    with rasterio.open(path, "w", **profile) as dst:
+        for row in range(0, size, block):
+            height = min(block, size - row)
+            y = np.linspace(0, 6 * np.pi, size)[row:row + height, None]
+            data = (1000 + 300 * np.sin(x) * np.cos(y) + rng.normal(0, 20, (height, size))).astype("float32")
+            data[:, : size // 20] = -9999.0
+            dst.write(data, 1, window=Window(0, row, size, height))
+    return path
+
+
+def precip_cube(path, shape, seed=0):
+    """
+    Monthly precipitation (time, lat, lon) NetCDF from a gamma distribution
+    with a wet-season cycle, written one year at a time.
+    """
+    steps, height, width = shape
+    rng = np.random.default_rng(seed)
+    with netCDF4.Dataset(path, "w") as dataset:
+        dataset.createDimension("time", steps)
+        dataset.createDimension("lat", height)
+        dataset.createDimension("lon", width)
+        time = dataset.createVariable("time", "f8", ("time",))
+        time.units = "days since 1970-01-01"
+        time[:] = (pd.date_range("1981-01-01", periods=steps, freq="MS") - pd.Timestamp("1970-01-01")).days
+        dataset.createVariable("lat", "f4", ("lat",))[:] = np.linspace(NIGERIA[3], NIGERIA[1], height)
+        dataset.createVariable("lon", "f4", ("lon",))[:] = np.linspace(NIGERIA[0], NIGERIA[2], width)
+        precip = dataset.createVariable("precip", "f4", ("time", "lat", "lon"), zlib=True, chunksizes=(12, height, width))
+        precip.units = "mm"
+        for start in range(0, steps, 12):
+            months = np.arange(start, min(start + 12, steps)) % 12
+            scale = 10 + 140 * np.clip(np.sin((months - 2) * np.pi / 8), 0, None)  # wet April-October
+            precip[start:start + len(months)] = rng.gamma(0.8, 1.0, (len(months), height, width)) * scale[:, None, None]
+    return path
+
+
+def make_data(directory, size="small", seed=0):
+    """
+    Generate (or reuse) every benchmark input in `directory`. Returns
+    {name: path}.
+    """
+    spec = SIZES[size]
+    directory.mkdir(parents=True, exist_ok=True)
+    tag = f"{size}-{seed}"
+    paths = {
+        "points_shp": directory / f"points-{tag}.shp",
+        "points_geojson": directory / f"points-{tag}.geojson",
+        "polygons_shp": directory / f"polygons-{tag}.shp",
+        "polygons_geojson": directory / f"polygons-{tag}.geojson",
+        "lines_shp": directory / f"lines-{tag}.shp",
+        "raster": directory / f"raster-{tag}.tif",
+        "cube": directory / f"precip-{tag}.nc",
+    }
+    makers = {
+        "points": lambda: points(spec["points"], seed),
+        "polygons": lambda: polygons(spec["polygons"], seed),
+        "lines": lambda: lines(spec["lines"], seed),
+    }
+    frames = {}
+    for name, path in paths.items():
+        if path.exists():
+            continue
+        kind = name.split("_")[0]
+        if kind in makers:
+            frames[kind] = frames[kind] if kind in frames else makers[kind]()
+            write_vector(frames[kind], path)
+        elif kind == "raster":
+            geotiff(path, spec["raster"], seed)
+        else:
+            precip_cube(path, spec["cube"], seed)
+    return {name: str(path) for name, path in paths.items()}
@@ -0,0 +1,289 @@
+import argparse
+import atexit
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# The on-disk caches (pyramids, LOD levels) go to a scratch directory that is
+# wiped before every timed call, so loads are timed cold and ~/.mapgis is left
+# alone; it must be set before the modules read MAPGIS_CACHE
+CACHE_ROOT = Path(tempfile.mkdtemp(prefix="mapgis-benchmarks-"))
+os.environ["MAPGIS_CACHE"] = str(CACHE_ROOT)
+atexit.register(shutil.rmtree, CACHE_ROOT, True)
+
+import folium
+import pyogrio
+import xarray as xr
+
+import geoprocessing
+import nc_export
+import spi
+import trend
+from benchmarks.generators import NIGERIA, SIZES, make_data
+from layer_cache import get_cache
+from layers import CircleMarker, GeoJSONLayer, ShapefileLayer, TIFFLayer
+from tiles import RasterTileSource, get_tile_server
+
+# Timing of the hot paths on generated data:
+#
+#   python benchmarks/run.py --size small --repeat 5
+#   python benchmarks/run.py --compare benchmarks/results/<old>.json
+#
+# Every benchmark is a setup function returning the callable that is timed, so
+# loading inputs is not counted unless it is what is measured. The layer cache
+# and the on-disk caches are cleared before each call, except for benchmarks
+# marked warm, which time serving from what their setup built. Results (all timings plus the best and median,
+# and the output size when a call returns text) go to a JSON file named after
+# the commit, for comparison across commits.
+
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+BENCHMARKS = {}
+
+
+def benchmark(name, warm=False):
+    def register(setup):
+        setup.warm = warm
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def _loaded(layer_class, path):
+    layer = layer_class(path)
+    layer.load()
+    return layer
+
+
+@benchmark("layers.shapefile.load")
+def _(data):
+    return lambda: ShapefileLayer(data["polygons_shp"]).load()
+
+
+@benchmark("layers.shapefile.add_to_map")
+def _(data):
+    layer = _loaded(ShapefileLayer, data["polygons_shp"])
+    return lambda: layer.add_to_map(folium.Map())
+
+
+@benchmark("layers.geojson.add_to_map")
+def _(data):
+    layer = _loaded(GeoJSONLayer, data["polygons_geojson"])
+    return lambda: layer.add_to_map(folium.Map())
+
+
+@benchmark("layers.points.add_to_map")
+def _(data):
+    layer = _loaded(CircleMarker, data["points_shp"])
+    return lambda: layer.add_to_map(folium.Map())
+
+
+@benchmark("layers.lines.add_to_map")
+def _(data):
+    layer = _loaded(ShapefileLayer, data["lines_shp"])
+    return lambda: layer.add_to_map(folium.Map())
+
+
+@benchmark("layers.raster.load")
+def _(data):
+    return lambda: TIFFLayer(data["raster"]).load()
+
+
+@benchmark("layers.raster.add_to_map")
+def _(data):
+    layer = _loaded(TIFFLayer, data["raster"])
+    return lambda: layer.add_to_map(folium.Map())
+
+
+@benchmark("map.html")
+def _(data):
+    # Serialization of a map holding every vector layer, as the static export does
+    folium_map = folium.Map()
+    for layer_class, key in ((ShapefileLayer, "polygons_shp"), (ShapefileLayer, "lines_shp"), (CircleMarker, "points_shp")):
+        _loaded(layer_class, data[key]).add_to_map(folium_map)
+    return lambda: folium_map.get_root().render()
+
+
+@benchmark("geoprocessing.buffer")
+def _(data):
+    polygons = pyogrio.read_dataframe(data["polygons_shp"])
+    return lambda: geoprocessing.buffer(polygons, 1000)
+
+
+@benchmark("geoprocessing.union")
+def _(data):
+    polygons = pyogrio.read_dataframe(data["polygons_shp"])
+    return lambda: geoprocessing.union(polygons)
+
+
+@benchmark("spi")
+def _(data):
+    precip = xr.open_dataset(data["cube"])["precip"].load()
+    return lambda: spi.spi(precip, chunks={"lat": 50}).compute()
+
+
+@benchmark("trend.mann_kendall")
+def _(data):
+    precip = xr.open_dataset(data["cube"])["precip"].load()
+    return lambda: trend.mann_kendall(precip, chunks={"lat": 50}).compute()
+
+
+@benchmark("nc_export.parquet")
+def _(data):
+    output = Path(tempfile.mkdtemp()) / "export.parquet"
+    return lambda: nc_export.export(data["cube"], "precip", output)
+
+
+def _tiles_over(bounds, zoom):
+    # XYZ tiles covering lon/lat bounds at one zoom
+    west, south, east, north = bounds
+    n = 2 ** zoom
+
+    def row(lat):
+        return int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+
+    columns = range(int((west + 180) / 360 * n), int((east + 180) / 360 * n) + 1)
+    return [(zoom, x, y) for x in columns for y in range(row(north), row(south) + 1)]
+
+
+def _fetch_all(urls):
+    # Fetched one after another from the local tile server, as the page would
+    total = 0
+    for url in urls:
+        with urllib.request.urlopen(url) as response:
+            total += len(response.read())
+    return total
+
+
+@benchmark("tiles.raster", warm=True)
+def _(data):
+    # A fresh source per call, so tiles are read from the pyramid, not memory
+    RasterTileSource(data["raster"])
+    server = get_tile_server()
+
+    def serve():
+        source = RasterTileSource(data["raster"])
+        template = server.register(source)
+        try:
+            return _fetch_all(template.split("?")[0].format(z=z, x=x, y=y) for z, x, y in _tiles_over(NIGERIA, 7))
+        finally:
+            server.unregister(source)
+    return serve
+
+
+@benchmark("tiles.points", warm=True)
+def _(data):
+    layer = _loaded(CircleMarker, data["points_shp"])
+    template = layer.to_spec()["url"]
+    urls = [template.format(z=z, x=x, y=y) + "?pad=3" for zoom in (5, 7, 9) for z, x, y in _tiles_over(NIGERIA, zoom)]
+    return lambda: _fetch_all(urls)
+
+
+@benchmark("tiles.lod", warm=True)
+def _(data):
+    # Viewport requests across the layer at the band of each zoom
+    layer = _loaded(ShapefileLayer, data["polygons_shp"])
+    template = layer.to_spec()["url"]
+    west, south, east, north = NIGERIA
+    urls = []
+    for zoom, step in ((6, 4.0), (8, 1.0)):
+        band = layer.lod.band_for_zoom(zoom)
+        for x in range(int((east - west) / step)):
+            for y in range(int((north - south) / step)):
+                bbox = f"{west + x * step},{south + y * step},{west + (x + 1) * step},{south + (y + 1) * step}"
+                urls.append(template.format(band=band) + f"?bbox={bbox}")
+    return lambda: _fetch_all(urls)
+
+
+def _commit():
+    def git(*args):
+        result = subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else None
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def clear_caches():
+    get_cache().clear()
+    for child in CACHE_ROOT.iterdir():
+        shutil.rmtree(child) if child.is_dir() else child.unlink()
+
+
+def time_call(fn, repeat, warm=False):
+    seconds, output = [], None
+    for _ in range(repeat):
+        if not warm:
+            clear_caches()
+        start = time.perf_counter()
+        output = fn()
+        seconds.append(time.perf_counter() - start)
+    result = {"seconds": seconds, "best": min(seconds), "median": statistics.median(seconds)}
+    if isinstance(output, (str, bytes)):
+        result["output_bytes"] = len(output.encode() if isinstance(output, str) else output)
+    return result
+
+
+def run(size="small", seed=0, repeat=3, only=None, data_dir=None, log=print):
+    """
+    Run the benchmarks whose names start with any of `only` (default all)
+    and return the results document.
+    """
+    data = make_data(Path(data_dir or RESULTS_DIR.parent / "data"), size, seed)
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        results[name] = time_call(setup(data), repeat, setup.warm)
+        log(f"{name:32} {results[name]['best']:9.4f}s")
+    return {
+        **_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "size": size,
+        "seed": seed,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(old, new, log=print):
+    # Best-time ratio new/old of every benchmark in both runs
+    for name, result in new["results"].items():
+        if name in old["results"]:
+            before = old["results"][name]["best"]
+            log(f"{name:32} {before:9.4f}s -> {result['best']:9.4f}s  x{result['best'] / before:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark MapGIS hot paths on generated data")
+    parser.add_argument("--size", choices=list(SIZES), default="small")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="benchmark name prefixes")
+    parser.add_argument("--data", help="directory for the generated inputs")
+    parser.add_argument("--output", help="results JSON (default benchmarks/results/<commit>-<size>.json)")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    document = run(args.size, args.seed, args.repeat, args.only, args.data)
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{(document['commit'] or 'unknown')[:12]}-{args.size}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(document, indent=2))
+    print(f"results: {output}")
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), document)
+
+
+if __name__ == "__main__":
+    main()
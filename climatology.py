@@ -0,0 +1,128 @@
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+# Climatology of daily station temperatures. Every station goes into one long
+# columnar table (station, date, tmax, tmin, t) and each statistic is a single
+# grouped aggregation over it, for all stations at once: monthly and seasonal
+# extremes, and per-calendar-month envelopes. The seasons follow the notebooks:
+# wet from April to October, dry otherwise, with November and December counted
+# in the dry season of the following year so each dry season is contiguous.
+
+COLUMNS = {"Date": "date", "Maximum Temperature": "tmax", "Minimum Temperature": "tmin"}
+VARIABLES = ("tmax", "tmin", "t")
+WET_MONTHS = (4, 10)  # first and last month of the wet season
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+def read_station(path, station=None, columns=COLUMNS):
+    # One station's CSV as (station, date, tmax, tmin); station defaults to the file name
+    frame = pd.read_csv(path, usecols=list(columns), engine="pyarrow").rename(columns=columns)
+    frame["date"] = pd.to_datetime(frame["date"])
+    frame.insert(0, "station", station or Path(path).stem)
+    return frame
+
+
+def load_stations(paths, columns=COLUMNS):
+    """
+    Daily table of many stations. `paths` is a list of CSV files (named by
+    their file names) or a {station: path} mapping.
+    """
+    items = paths.items() if isinstance(paths, dict) else ((None, path) for path in paths)
+    frame = pd.concat([read_station(path, station, columns) for station, path in items], ignore_index=True)
+    return daily(frame)
+
+
+def daily(frame):
+    """
+    Normalize a long (station, date, tmax, tmin) table: daily mean `t`,
+    calendar columns and the season, sorted by station and date.
+    """
+    frame = frame.assign(station=frame["station"].astype("category"))
+    frame = frame.sort_values(["station", "date"], kind="stable", ignore_index=True)
+    frame["t"] = (frame["tmax"] + frame["tmin"]) / 2
+    dates = frame["date"].dt
+    frame["year"] = dates.year
+    frame["month"] = dates.month
+    wet = frame["month"].between(*WET_MONTHS)
+    frame["season"] = pd.Categorical.from_codes(wet.to_numpy().astype("int8"), ["Dry", "Wet"])
+    frame["season_year"] = frame["year"] + (frame["month"] > WET_MONTHS[1])
+    return frame
+
+
+def _extremes(frame, keys, variables=VARIABLES):
+    # min and max of every variable per group, as flat {var}_min/{var}_max columns
+    table = frame.groupby(keys, observed=True, sort=True)[list(variables)].agg(["min", "max"])
+    table.columns = [f"{var}_{stat}" for var, stat in table.columns]
+    table["days"] = frame.groupby(keys, observed=True, sort=True).size()
+    return table.reset_index()
+
+
+def monthly_extremes(frame, variables=VARIABLES):
+    # One row per station and month
+    return _extremes(frame, ["station", "year", "month"], variables)
+
+
+def seasonal_extremes(frame, variables=VARIABLES):
+    # One row per station, season year and season
+    return _extremes(frame, ["station", "season_year", "season"], variables)
+
+
+def monthly_envelope(frame, variables=VARIABLES):
+    """
+    Per station and calendar month: the lowest and highest value of every
+    variable over the whole record, and its mean.
+    """
+    grouped = frame.groupby(["station", "month"], observed=True, sort=True)[list(variables)]
+    table = grouped.agg(["min", "mean", "max"])
+    table.columns = [f"{var}_{stat}" for var, stat in table.columns]
+    table = table.reset_index()
+    table.insert(2, "month_name", pd.Categorical.from_codes(table["month"] - 1, MONTHS))
+    return table
+
+
+def climatology(frame, variables=VARIABLES):
+    """
+    {"daily", "monthly", "seasonal", "envelope"} tables for a daily table
+    from daily() or load_stations(), each covering every station.
+    """
+    return {
+        "daily": frame,
+        "monthly": monthly_extremes(frame, variables),
+        "seasonal": seasonal_extremes(frame, variables),
+        "envelope": monthly_envelope(frame, variables),
+    }
+
+
+def by_station(table):
+    # {station: rows of that station}, without the station column
+    return {
+        station: rows.drop(columns="station").reset_index(drop=True)
+        for station, rows in table.groupby("station", observed=True, sort=True)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monthly, seasonal and calendar-month climatology of station CSVs")
+    parser.add_argument("csv", nargs="+", help="daily station CSVs (Date, Maximum/Minimum Temperature)")
+    parser.add_argument("output", help="directory for the tables")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="parquet")
+    parser.add_argument("--per-station", action="store_true", help="one file per station and table")
+    args = parser.parse_args(argv)
+
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    tables = climatology(load_stations(args.csv))
+    for name, table in tables.items():
+        parts = by_station(table) if args.per_station else {None: table}
+        for station, part in parts.items():
+            path = output / (f"{station}_{name}.{args.format}" if station else f"{name}.{args.format}")
+            if args.format == "csv":
+                part.to_csv(path, index=False)
+            else:
+                part.to_parquet(path, index=False)
+
+
+if __name__ == "__main__":
+    main()
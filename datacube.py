@@ -0,0 +1,189 @@
+import argparse
+from pathlib import Path
+
+import dask
+import dask.array as da
+import numpy as np
+import rasterio
+import xarray as xr
+
+# Zarr datacube for gridded climate data. The same variables are stored twice,
+# chunked for two access patterns:
+#   series - every time step of a small spatial tile per chunk, so one pixel's
+#            full record is a single chunk read
+#   maps   - one time step of a large spatial tile per chunk, so a map of one
+#            date is a handful of chunk reads
+# Queries count the chunks each available layout would touch and read from the
+# cheaper one. Chunks are compressed with the Zarr default codec.
+
+LAYOUTS = {
+    "series": {"time": -1, "lat": 32, "lon": 32},
+    "maps": {"time": 1, "lat": 1024, "lon": 1024},
+}
+DIM_NAMES = {"latitude": "lat", "y": "lat", "longitude": "lon", "x": "lon", "valid_time": "time"}
+
+
+def _normalize(dataset):
+    # (time, lat, lon) dimension names whatever the source used
+    rename = {name: DIM_NAMES[name] for name in dataset.dims if name in DIM_NAMES and DIM_NAMES[name] not in dataset.dims}
+    dataset = dataset.rename(rename)
+    for name, var in dataset.data_vars.items():
+        if {"time", "lat", "lon"} <= set(var.dims):
+            dataset[name] = var.transpose(..., "time", "lat", "lon")
+    return dataset
+
+
+def _read_band(path, band):
+    with rasterio.open(path) as src:
+        data = src.read(band, masked=True).astype("float32")
+    return data.filled(np.nan)
+
+
+def open_geotiffs(paths, variable="value", times=None):
+    """
+    Lazily stack single- or multi-band GeoTIFFs on the same grid into a
+    (time, lat, lon) Dataset, one time step per band. `times` labels the
+    steps (defaults to 0..n-1). Rasters without a CRS are taken as WGS84.
+    """
+    bands = []
+    for path in paths:
+        with rasterio.open(path) as src:
+            transform, shape, count = src.transform, src.shape, src.count
+        bands += [(path, band) for band in range(1, count + 1)]
+
+    stack = da.stack([
+        da.from_delayed(dask.delayed(_read_band)(path, band), shape=shape, dtype="float32") for path, band in bands
+    ])
+    rows, cols = np.arange(shape[0]) + 0.5, np.arange(shape[1]) + 0.5
+    coords = {
+        "time": list(times) if times is not None else np.arange(len(bands)),
+        "lat": transform.f + rows * transform.e,
+        "lon": transform.c + cols * transform.a,
+    }
+    return xr.Dataset({variable: (("time", "lat", "lon"), stack)}, coords=coords)
+
+
+def open_source(paths, variable="value", times=None):
+    paths = [str(path) for path in ([paths] if isinstance(paths, (str, Path)) else paths)]
+    if all(Path(path).suffix.lower() in (".tif", ".tiff") for path in paths):
+        return open_geotiffs(paths, variable, times)
+    return _normalize(xr.open_mfdataset(paths, combine="by_coords", chunks={}))
+
+
+def ingest(sources, store, variables=None, layouts=LAYOUTS, times=None):
+    """
+    Write NetCDF files or GeoTIFFs into a Zarr store, once per layout.
+
+    `layouts` maps a layout name to its chunk sizes per dimension (-1 for the
+    whole dimension). Data is streamed chunk by chunk through dask, never
+    loaded whole.
+    """
+    dataset = open_source(sources, times=times)
+    if variables is not None:
+        dataset = dataset[list(variables)]
+
+    for layout, chunks in layouts.items():
+        sizes = {dim: (dataset.sizes[dim] if size == -1 else min(size, dataset.sizes[dim])) for dim, size in chunks.items()}
+        chunked = dataset.chunk(sizes)
+        encoding = {
+            name: {"chunks": tuple(sizes.get(dim, var.shape[k]) for k, dim in enumerate(var.dims))}
+            for name, var in chunked.data_vars.items()
+        }
+        for var in chunked.data_vars.values():
+            var.encoding.pop("chunks", None)
+            var.encoding.pop("preferred_chunks", None)
+        chunked.to_zarr(store, group=layout, mode="w", encoding=encoding)
+    return DataCube(store)
+
+
+class DataCube:
+    def __init__(self, store):
+        self.store = store
+        self.layouts = {}
+        for layout in LAYOUTS:
+            try:
+                self.layouts[layout] = xr.open_zarr(store, group=layout)
+            except (FileNotFoundError, KeyError, ValueError):
+                continue
+        if not self.layouts:
+            raise FileNotFoundError(f"No datacube layouts in {store}")
+
+    @property
+    def variables(self):
+        return list(next(iter(self.layouts.values())).data_vars)
+
+    def _variable(self, variable):
+        return variable or self.variables[0]
+
+    @staticmethod
+    def chunks_touched(var, indexers):
+        # Number of stored chunks a positional selection reads
+        count = 1
+        for dim, chunk in zip(var.dims, var.encoding.get("chunks") or var.shape):
+            index = indexers.get(dim, slice(None))
+            if isinstance(index, slice):
+                index = np.arange(var.sizes[dim])[index]
+            count *= len(np.unique(np.atleast_1d(index) // chunk))
+        return count
+
+    def plan(self, variable, indexers):
+        """
+        (layout, DataArray) reading the fewest chunks for positional
+        `indexers` (dimension -> slice or index array).
+        """
+        variable = self._variable(variable)
+        costs = {
+            layout: self.chunks_touched(dataset[variable], indexers) for layout, dataset in self.layouts.items()
+        }
+        layout = min(costs, key=costs.get)
+        return layout, self.layouts[layout][variable]
+
+    def _positions(self, dataset, dim, values, method="nearest"):
+        return dataset.get_index(dim).get_indexer(np.atleast_1d(values), method=method)
+
+    def series(self, lat, lon, variable=None, start=None, end=None):
+        # Full (or start..end) record at the pixel nearest to lat/lon
+        return self.points([lat], [lon], variable, start, end).isel(point=0)
+
+    def points(self, lats, lons, variable=None, start=None, end=None):
+        """
+        Records at many points as a (point, time) DataArray, nearest pixel.
+        """
+        dataset = next(iter(self.layouts.values()))
+        rows = self._positions(dataset, "lat", lats)
+        cols = self._positions(dataset, "lon", lons)
+        times = dataset.get_index("time").slice_indexer(start, end)
+        _, var = self.plan(variable, {"time": times, "lat": rows, "lon": cols})
+        rows = xr.DataArray(rows, dims="point")
+        cols = xr.DataArray(cols, dims="point")
+        return var.isel(time=times, lat=rows, lon=cols).transpose("point", "time").load()
+
+    def map(self, time, variable=None, bbox=None):
+        """
+        Grid of the step nearest to `time`, optionally cut to
+        bbox = (minx, miny, maxx, maxy).
+        """
+        dataset = next(iter(self.layouts.values()))
+        step = self._positions(dataset, "time", [time])[0]
+        indexers = {"time": step}
+        if bbox is not None:
+            lats, lons = dataset["lat"].values, dataset["lon"].values
+            indexers["lat"] = np.flatnonzero((lats >= bbox[1]) & (lats <= bbox[3]))
+            indexers["lon"] = np.flatnonzero((lons >= bbox[0]) & (lons <= bbox[2]))
+        _, var = self.plan(variable, indexers)
+        return var.isel(indexers).load()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest NetCDF files or GeoTIFFs into a Zarr datacube")
+    parser.add_argument("store")
+    parser.add_argument("sources", nargs="+")
+    parser.add_argument("--variables", nargs="+")
+    parser.add_argument("--layouts", nargs="+", choices=list(LAYOUTS), default=list(LAYOUTS))
+    args = parser.parse_args(argv)
+    cube = ingest(args.sources, args.store, args.variables, {layout: LAYOUTS[layout] for layout in args.layouts})
+    print(f"{args.store}: {', '.join(cube.layouts)} ({', '.join(cube.variables)})")
+
+
+if __name__ == "__main__":
+    main()
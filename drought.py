@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+# Drought event catalog for SPI/SPEI values of any shape: a point series or a
+# (..., time) cube. Every series is padded with a non-drought step on both
+# ends and flattened, so runs below the threshold never cross series and all
+# events of the whole grid fall out of one diff. Per-event statistics are
+# reduceat calls over the flat array.
+
+# Upper bounds (inclusive) of the drought classes used in the notebooks
+THRESHOLDS = (-1.0, -1.5, -2.0)
+CATEGORIES = ("No drought", "Drought", "Severe drought", "Extreme drought")
+
+
+def classify_drought(values):
+    # Class code per value, indexing CATEGORIES (NaN counts as no drought)
+    values = np.asarray(values, dtype="float64")
+    codes = np.zeros(values.shape, dtype="int8")
+    for code, threshold in enumerate(THRESHOLDS, start=1):
+        codes[values <= threshold] = code
+    return codes
+
+
+def event_arrays(values, threshold=THRESHOLDS[0], min_duration=1):
+    """
+    Runs of values <= threshold along the last axis.
+
+    Returns a dict of equal-length arrays: series (flat index over the leading
+    axes), start and end (inclusive time steps), duration, severity (sum of
+    the index over the event), peak (its minimum) and category (code of the
+    peak, see CATEGORIES).
+    """
+    values = np.asarray(values, dtype="float64")
+    steps = values.shape[-1]
+    flat = values.reshape(-1, steps)
+    width = steps + 2
+
+    padded = np.zeros((flat.shape[0], width))
+    padded[:, 1:-1] = flat
+    dry = np.zeros(padded.shape, dtype=bool)
+    dry[:, 1:-1] = flat <= threshold  # NaN is never dry, so it ends an event
+
+    change = np.diff(dry.ravel().view(np.int8))
+    starts = np.flatnonzero(change == 1) + 1
+    ends = np.flatnonzero(change == -1) + 1  # exclusive
+    keep = (ends - starts) >= min_duration
+    starts, ends = starts[keep], ends[keep]
+
+    series, start = np.divmod(starts, width)
+    # Events end on a padding step at the latest, so every bound is in range
+    bounds = np.ravel(np.column_stack([starts, ends]))
+    data = padded.ravel()
+    if len(bounds):
+        peak = np.minimum.reduceat(data, bounds)[::2]
+        severity = np.add.reduceat(data, bounds)[::2]
+    else:
+        peak = severity = np.empty(0)
+    return {
+        "series": series,
+        "start": start - 1,
+        "end": ends - series * width - 2,
+        "duration": ends - starts,
+        "severity": severity,
+        "peak": peak,
+        "category": classify_drought(peak),
+    }
+
+
+def drought_events(index, threshold=THRESHOLDS[0], time_dim="time", min_duration=1):
+    """
+    Catalog of drought events in an SPI/SPEI DataArray, Series or array.
+
+    One row per event with the coordinates of its series, start and end dates,
+    duration in time steps, severity, peak intensity and drought category.
+    """
+    if isinstance(index, pd.Series):
+        index = xr.DataArray(index.values, coords={time_dim: index.index}, dims=[time_dim])
+    if not isinstance(index, xr.DataArray):
+        index = xr.DataArray(np.asarray(index))
+        time_dim = index.dims[-1]
+
+    index = index.transpose(..., time_dim)
+    spatial = index.dims[:-1]
+    events = event_arrays(index.values, threshold, min_duration)
+
+    columns = {}
+    series = events.pop("series")
+    positions = np.unravel_index(series, index.shape[:-1]) if spatial else ()
+    for dim, position in zip(spatial, positions):
+        columns[dim] = index[dim].values[position] if dim in index.coords else position
+    times = index[time_dim].values if time_dim in index.coords else np.arange(index.shape[-1])
+    columns["start"] = times[events.pop("start")]
+    columns["end"] = times[events.pop("end")]
+    columns.update(events)
+
+    table = pd.DataFrame(columns)
+    table["category"] = pd.Categorical.from_codes(table["category"], categories=CATEGORIES)
+    return table
@@ -0,0 +1,324 @@
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import geopandas as gpd
+import pandas as pd
+import pyogrio
+import rasterio
+import rasterio.windows
+import shapely
+from rasterio.crs import CRS
+from rasterio.errors import WindowError
+from rasterio.features import geometry_mask
+from rasterio.windows import Window, from_bounds
+
+from loaders import Cancelled, _never_cancelled, _noop_progress
+
+# Buffer, union/dissolve, clip and intersect on GeoDataFrames. Work is done on
+# whole geometry arrays with shapely 2; large inputs are split into spatially
+# coherent chunks (Hilbert order) that run in a process pool, and unions are
+# reduced pairwise as a tree. Every operation takes progress(done, total) and
+# cancelled() like the loaders, so it runs the same from the GUI or headless.
+
+CHUNK_SIZE = 20_000
+
+
+def default_workers():
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def spatial_chunks(geoms, chunk_size=CHUNK_SIZE):
+    """
+    Split a geometry array into chunks of nearby geometries.
+
+    Returns a list of positional index arrays, ordered along a Hilbert curve
+    so each chunk covers a compact area.
+    """
+    if len(geoms) <= chunk_size:
+        return [np.arange(len(geoms))]
+    order = np.argsort(gpd.GeoSeries(geoms).hilbert_distance().values, kind="stable")
+    return np.array_split(order, int(np.ceil(len(geoms) / chunk_size)))
+
+
+def run_chunks(fn, jobs, workers=None, progress=None, cancelled=None):
+    """
+    Run fn(*job) for every job, in a process pool when there is more than one.
+
+    Results come back in job order.
+    """
+    progress = progress or _noop_progress
+    cancelled = cancelled or _never_cancelled
+    workers = workers or default_workers()
+
+    if len(jobs) == 1 or workers == 1:
+        results = []
+        for done, job in enumerate(jobs, start=1):
+            if cancelled():
+                raise Cancelled(fn.__name__)
+            results.append(fn(*job))
+            progress(done, len(jobs))
+        return results
+
+    results = [None] * len(jobs)
+    # Spawned, not forked: the GUI calls this from a worker thread of a
+    # multi-threaded Qt process, and forking one of those can deadlock
+    executor = ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=multiprocessing.get_context("spawn"))
+    try:
+        futures = {executor.submit(fn, *job): i for i, job in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            if cancelled():
+                raise Cancelled(fn.__name__)
+            results[futures[future]] = future.result()
+            progress(done, len(jobs))
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    return results
+
+
+def _buffer_chunk(geoms, distance, quad_segs):
+    return shapely.buffer(geoms, distance, quad_segs=quad_segs)
+
+
+def _union_chunk(geoms):
+    return shapely.union_all(geoms)
+
+
+def _clip_chunk(geoms, mask):
+    shapely.prepare(mask)
+    inside = shapely.contains_properly(mask, geoms)
+    return np.where(inside, geoms, shapely.intersection(geoms, mask))
+
+
+def _intersect_chunk(left, right):
+    return shapely.intersection(left, right)
+
+
+def _projected(geodata):
+    # Distances are given in metres, so geographic layers are buffered in
+    # their local UTM zone
+    if geodata.crs is not None and geodata.crs.is_geographic:
+        return geodata.to_crs(geodata.estimate_utm_crs()), geodata.crs
+    return geodata, None
+
+
+def buffer(geodata, distance, quad_segs=8, workers=None, progress=None, cancelled=None):
+    data, original_crs = _projected(geodata)
+    geoms = data.geometry.values
+    chunks = spatial_chunks(geoms)
+    results = run_chunks(
+        _buffer_chunk, [(geoms[rows], distance, quad_segs) for rows in chunks],
+        workers=workers, progress=progress, cancelled=cancelled
+    )
+    buffered = np.empty(len(geoms), dtype=object)
+    for rows, result in zip(chunks, results):
+        buffered[rows] = result
+    result = data.set_geometry(gpd.array.from_shapely(buffered, crs=data.crs))
+    return result.to_crs(original_crs) if original_crs is not None else result
+
+
+def union_all(geoms, workers=None, progress=None, cancelled=None):
+    """
+    Union of a geometry array as a tree reduction.
+
+    Spatially coherent chunks are unioned in parallel, then the partial results
+    are merged pairwise level by level until one geometry is left.
+    """
+    parts = [geoms[rows] for rows in spatial_chunks(geoms)]
+    levels = max(1, int(np.ceil(np.log2(len(parts)))) + 1)
+    level = 0
+
+    def level_progress(done, total):
+        if progress:
+            progress(level * 100 + done * 100 // total, levels * 100)
+
+    partials = run_chunks(_union_chunk, [(part,) for part in parts], workers, level_progress, cancelled)
+    while len(partials) > 1:
+        level += 1
+        pairs = [(np.array(partials[i:i + 2], dtype=object),) for i in range(0, len(partials), 2)]
+        partials = run_chunks(_union_chunk, pairs, workers, level_progress, cancelled)
+    return partials[0] if partials else shapely.GeometryCollection()
+
+
+def union(geodata, by=None, workers=None, progress=None, cancelled=None):
+    """
+    Union (by=None) or dissolve by one or more attribute columns.
+    """
+    geoms = geodata.geometry.values
+    if by is None:
+        merged = union_all(geoms, workers, progress, cancelled)
+        return gpd.GeoDataFrame(geometry=[merged], crs=geodata.crs)
+
+    by = [by] if isinstance(by, str) else list(by)
+    groups = geodata.groupby(by, sort=True).indices
+    keys = list(groups)
+
+    # Small groups are unioned side by side in the pool, large ones get their
+    # own tree reduction
+    small = [key for key in keys if len(groups[key]) <= CHUNK_SIZE]
+    merged = dict(zip(small, run_chunks(
+        _union_chunk, [(geoms[groups[key]],) for key in small],
+        workers=workers, progress=progress, cancelled=cancelled
+    ))) if small else {}
+    for key in keys:
+        if key not in merged:
+            merged[key] = union_all(geoms[groups[key]], workers, progress, cancelled)
+
+    key_columns = pd.DataFrame([key if isinstance(key, tuple) else (key,) for key in keys], columns=by)
+    return gpd.GeoDataFrame(key_columns, geometry=[merged[key] for key in keys], crs=geodata.crs)
+
+
+def clip(geodata, mask, workers=None, progress=None, cancelled=None):
+    """
+    Clip a layer to a mask (a geometry or a GeoDataFrame, unioned first).
+    """
+    if isinstance(mask, gpd.GeoDataFrame):
+        mask = union_all(mask.to_crs(geodata.crs).geometry.values, workers, cancelled=cancelled)
+
+    # Only features the index says can touch the mask are intersected
+    candidates = np.sort(shapely.STRtree(geodata.geometry.values).query(mask, predicate="intersects"))
+    geoms = geodata.geometry.values[candidates]
+    chunks = spatial_chunks(geoms)
+    results = run_chunks(
+        _clip_chunk, [(geoms[rows], mask) for rows in chunks],
+        workers=workers, progress=progress, cancelled=cancelled
+    )
+    clipped = np.empty(len(geoms), dtype=object)
+    for rows, result in zip(chunks, results):
+        clipped[rows] = result
+
+    result = geodata.iloc[candidates].set_geometry(gpd.array.from_shapely(clipped, crs=geodata.crs))
+    return result[~result.geometry.is_empty].reset_index(drop=True)
+
+
+def intersect(left, right, workers=None, progress=None, cancelled=None):
+    """
+    Pairwise intersection of two layers, keeping the attributes of both.
+    """
+    right = right.to_crs(left.crs)
+    left_idx, right_idx = shapely.STRtree(right.geometry.values).query(left.geometry.values, predicate="intersects")
+    left_geoms = left.geometry.values[left_idx]
+    right_geoms = right.geometry.values[right_idx]
+
+    chunks = spatial_chunks(left_geoms)
+    results = run_chunks(
+        _intersect_chunk, [(left_geoms[rows], right_geoms[rows]) for rows in chunks],
+        workers=workers, progress=progress, cancelled=cancelled
+    )
+    geoms = np.empty(len(left_geoms), dtype=object)
+    for rows, result in zip(chunks, results):
+        geoms[rows] = result
+
+    attributes = pd.concat([
+        left.drop(columns=left.geometry.name).iloc[left_idx].reset_index(drop=True).add_suffix("_1"),
+        right.drop(columns=right.geometry.name).iloc[right_idx].reset_index(drop=True).add_suffix("_2"),
+    ], axis=1)
+    result = gpd.GeoDataFrame(attributes, geometry=gpd.array.from_shapely(geoms, crs=left.crs))
+    return result[~result.geometry.is_empty].reset_index(drop=True)
+
+
+def clip_raster(raster_path, shapes, output_path, block_size=1024, all_touched=False, progress=None, cancelled=None):
+    """
+    Clip a raster to polygons, streaming block by block into a tiled GeoTIFF.
+
+    Only the pixel window covering the polygons' bounds is visited, blocks that
+    miss every polygon are never read (they stay sparse nodata in the output),
+    and peak memory is one block of all bands whatever the input size.
+    """
+    progress = progress or _noop_progress
+    cancelled = cancelled or _never_cancelled
+
+    with rasterio.open(raster_path) as src:
+        crs = src.crs or CRS.from_epsg(4326)
+        if isinstance(shapes, (gpd.GeoDataFrame, gpd.GeoSeries)):
+            geoms = np.asarray(shapes.to_crs(crs).geometry.values, dtype=object)
+        else:
+            geoms = np.asarray(shapes if isinstance(shapes, (list, np.ndarray)) else [shapes], dtype=object)
+        geoms = geoms[~shapely.is_empty(geoms)]
+        if len(geoms) == 0:
+            raise ValueError("Clip shapes do not overlap the raster")
+        tree = shapely.STRtree(geoms)
+
+        full = Window(0, 0, src.width, src.height)
+        # Outer pixel window of the polygons' bounds
+        inner = from_bounds(*shapely.total_bounds(geoms), src.transform)
+        col_off, row_off = int(np.floor(inner.col_off)), int(np.floor(inner.row_off))
+        try:
+            window = Window(
+                col_off, row_off,
+                int(np.ceil(inner.col_off + inner.width)) - col_off, int(np.ceil(inner.row_off + inner.height)) - row_off
+            ).intersection(full)
+        except WindowError:
+            raise ValueError("Clip shapes do not overlap the raster") from None
+
+        nodata = src.nodata
+        if nodata is None:
+            nodata = np.nan if np.issubdtype(np.dtype(src.dtypes[0]), np.floating) else 0
+        profile = src.profile.copy()
+        profile.update(
+            driver="GTiff", crs=crs, width=window.width, height=window.height,
+            transform=src.window_transform(window), nodata=nodata,
+            tiled=True, blockxsize=256, blockysize=256, compress="deflate",
+            predictor=3 if np.issubdtype(np.dtype(src.dtypes[0]), np.floating) else 2,
+            bigtiff="IF_SAFER", sparse_ok=True,
+        )
+
+        blocks = [
+            Window(col, row, min(block_size, window.width - col), min(block_size, window.height - row))
+            for row in range(0, window.height, block_size)
+            for col in range(0, window.width, block_size)
+        ]
+        with rasterio.open(output_path, "w", **profile) as dst:
+            for done, block in enumerate(blocks, start=1):
+                if cancelled():
+                    raise Cancelled(raster_path)
+                transform = dst.window_transform(block)
+                box = shapely.box(*rasterio.windows.bounds(block, dst.transform))
+                hits = geoms[tree.query(box, predicate="intersects")]
+                if len(hits):
+                    source_window = Window(window.col_off + block.col_off, window.row_off + block.row_off, block.width, block.height)
+                    data = src.read(window=source_window)
+                    if not any(shapely.contains(hit, box) for hit in hits):
+                        inside = geometry_mask(hits, (block.height, block.width), transform, all_touched=all_touched, invert=True)
+                        data[:, ~inside] = nodata
+                    dst.write(data, window=block)
+                progress(done, len(blocks))
+    return output_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MapGIS geoprocessing")
+    parser.add_argument("operation", choices=["buffer", "union", "clip", "intersect", "clip-raster"])
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--other", help="mask layer for clip, second layer for intersect")
+    parser.add_argument("--distance", type=float, help="buffer distance in metres")
+    parser.add_argument("--by", nargs="+", help="dissolve columns for union")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    def progress(done, total):
+        print(f"\r{args.operation}: {done}/{total}", end="", flush=True)
+
+    if args.operation == "clip-raster":
+        clip_raster(args.input, pyogrio.read_dataframe(args.other), args.output, progress=progress)
+        print()
+        return
+
+    geodata = pyogrio.read_dataframe(args.input)
+    if args.operation == "buffer":
+        result = buffer(geodata, args.distance, workers=args.workers, progress=progress)
+    elif args.operation == "union":
+        result = union(geodata, by=args.by, workers=args.workers, progress=progress)
+    elif args.operation == "clip":
+        result = clip(geodata, pyogrio.read_dataframe(args.other), workers=args.workers, progress=progress)
+    else:
+        result = intersect(geodata, pyogrio.read_dataframe(args.other), workers=args.workers, progress=progress)
+    print()
+    pyogrio.write_dataframe(result, args.output)
+
+
+if __name__ == "__main__":
+    main()
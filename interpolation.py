@@ -0,0 +1,268 @@
+import argparse
+
+import dask.array as da
+import numpy as np
+import pandas as pd
+import rasterio
+import xarray as xr
+from rasterio.transform import from_origin
+from rasterio.warp import transform_bounds
+from scipy import sparse
+from scipy.optimize import curve_fit
+from scipy.spatial import cKDTree
+
+from loaders import Cancelled, _never_cancelled, _noop_progress
+from sampling import _xy, locations_frame
+from tiles import WGS84
+from zonal import Grid
+
+# Station readings to a raster time stack. For a fixed set of stations, both
+# inverse distance weighting and ordinary kriging make every cell a fixed
+# linear combination of its nearest stations, so the weights are built once
+# (a sparse cells x stations matrix, from a KD-tree neighbour search) and each
+# batch of time steps is then one sparse matrix product. A station missing at
+# some step is dropped from that step by renormalizing the remaining weights:
+# exact for IDW, an approximation for kriging. Batches are streamed to a
+# multi-band GeoTIFF or a Zarr (time, y, x) store, so the stack never has to
+# fit in memory.
+
+NIGERIA_BOUNDS = (2.6, 4.2, 14.7, 13.9)  # lon/lat
+DEFAULT_CRS = "EPSG:32632"  # UTM 32N, metres over Nigeria
+RESOLUTION = 1000
+METHODS = ("idw", "kriging")
+BATCH_BYTES = 256 * 2 ** 20  # output values held per batch
+SOLVE_CELLS = 20000  # kriging systems solved at once
+
+
+def grid_for(bounds=NIGERIA_BOUNDS, resolution=RESOLUTION, crs=DEFAULT_CRS):
+    # Grid covering lon/lat `bounds` at `resolution` units of `crs`
+    crs = rasterio.crs.CRS.from_user_input(crs)
+    left, bottom, right, top = transform_bounds(WGS84, crs, *bounds)
+    width = int(np.ceil((right - left) / resolution))
+    height = int(np.ceil((top - bottom) / resolution))
+    return Grid(from_origin(left, top, resolution, resolution), (height, width), crs)
+
+
+def cell_centers(grid):
+    # x and y of every cell centre, flattened in row order
+    rows, cols = np.indices(grid.shape)
+    x, y = grid.transform * (cols.ravel() + 0.5, rows.ravel() + 0.5)
+    return np.asarray(x), np.asarray(y)
+
+
+def _neighbours(stations, cells, k):
+    k = min(k, len(stations))
+    distance, index = cKDTree(stations).query(cells, k=k, workers=-1)
+    return distance.reshape(len(cells), k), index.reshape(len(cells), k)
+
+
+def _matrix(weights, index, stations):
+    cells, k = index.shape
+    return sparse.csr_matrix(
+        (weights.ravel().astype("float32"), index.ravel(), np.arange(0, cells * k + 1, k)),
+        shape=(cells, stations),
+    )
+
+
+def idw_weights(stations, cells, k=8, power=2.0):
+    """
+    Sparse (cells, stations) inverse distance weights over the k nearest
+    stations. `stations` and `cells` are (n, 2) coordinate arrays; a cell on
+    a station takes its value.
+    """
+    distance, index = _neighbours(stations, cells, k)
+    with np.errstate(divide="ignore"):
+        weights = 1.0 / distance ** power
+    exact = distance[:, 0] == 0
+    weights[exact] = 0.0
+    weights[exact, 0] = 1.0
+    return _matrix(weights, index, len(stations))
+
+
+# Variogram models gamma(h) with nugget, partial sill and range
+VARIOGRAMS = {
+    "spherical": lambda h, nugget, sill, rng: nugget + sill * np.where(
+        h < rng, 1.5 * h / rng - 0.5 * (h / rng) ** 3, 1.0),
+    "exponential": lambda h, nugget, sill, rng: nugget + sill * (1 - np.exp(-3 * h / rng)),
+    "gaussian": lambda h, nugget, sill, rng: nugget + sill * (1 - np.exp(-3 * (h / rng) ** 2)),
+}
+
+
+def fit_variogram(stations, values, model="spherical", bins=15):
+    """
+    (nugget, sill, range) of a variogram model fitted to the empirical
+    semivariogram pooled over all time steps. `values` is (steps, stations);
+    each step's mean is removed first, so only the spatial structure counts.
+    """
+    i, j = np.triu_indices(len(stations), 1)
+    h = np.hypot(*(stations[i] - stations[j]).T)
+    anomalies = values - np.nanmean(values, axis=1, keepdims=True)
+    semivariance = 0.5 * np.nanmean((anomalies[:, i] - anomalies[:, j]) ** 2, axis=0)
+
+    edges = np.linspace(0, h.max() / 2, bins + 1)
+    which = np.digitize(h, edges) - 1
+    keep = (which < bins) & ~np.isnan(semivariance)
+    count = np.bincount(which[keep], minlength=bins)
+    lag = np.bincount(which[keep], weights=h[keep], minlength=bins)[count > 0] / count[count > 0]
+    gamma = np.bincount(which[keep], weights=semivariance[keep], minlength=bins)[count > 0] / count[count > 0]
+
+    start = (gamma.min(), max(gamma.max() - gamma.min(), 1e-9), h.max() / 4)
+    params, _ = curve_fit(VARIOGRAMS[model], lag, gamma, p0=start, bounds=(0, np.inf), maxfev=10000)
+    return tuple(params)
+
+
+def kriging_weights(stations, cells, variogram, model="spherical", k=16):
+    """
+    Sparse (cells, stations) ordinary kriging weights over the k nearest
+    stations, for a (nugget, sill, range) variogram. The (k+1)-square
+    systems are solved in batches of SOLVE_CELLS cells.
+    """
+    gamma = VARIOGRAMS[model]
+    distance, index = _neighbours(stations, cells, k)
+    k = index.shape[1]
+    weights = np.empty((len(cells), k))
+    for start in range(0, len(cells), SOLVE_CELLS):
+        block = slice(start, start + SOLVE_CELLS)
+        near = stations[index[block]]  # (n, k, 2)
+        pairs = np.hypot(*np.moveaxis(near[:, :, None, :] - near[:, None, :, :], -1, 0))
+        n = len(near)
+        a = np.ones((n, k + 1, k + 1))
+        a[:, :k, :k] = gamma(pairs, *variogram)
+        a[:, np.arange(k), np.arange(k)] = 0.0  # gamma(0) = 0, the nugget is a discontinuity
+        a[:, k, k] = 0.0
+        b = np.ones((n, k + 1))
+        b[:, :k] = np.where(distance[block] > 0, gamma(distance[block], *variogram), 0.0)
+        weights[block] = np.linalg.solve(a, b[..., None])[:, :k, 0]
+    return _matrix(weights, index, len(stations))
+
+
+def interpolate_steps(weights, values, grid):
+    """
+    Apply (cells, stations) weights to (steps, stations) values. Returns
+    float32 (steps, height, width); cells whose stations are all missing are
+    NaN.
+    """
+    values = np.asarray(values, dtype="float32")
+    missing = np.isnan(values)
+    total = weights @ np.where(missing, 0.0, values).T
+    if missing.any():
+        norm = weights @ (~missing).T.astype("float32")
+    else:
+        norm = np.asarray(weights.sum(axis=1))  # every station present: the plain row sums
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total /= norm
+    total[np.broadcast_to(norm == 0, total.shape)] = np.nan
+    return np.ascontiguousarray(total.T).reshape((len(values),) + grid.shape)
+
+
+def station_weights(points, grid, method="idw", values=None, k=None, power=2.0, model="spherical", variogram=None):
+    """
+    Weights from the station GeoDataFrame `points` to every cell of `grid`.
+    Kriging fits the variogram to `values` unless one is given.
+    """
+    stations = np.column_stack(_xy(points, grid.crs))
+    cells = np.column_stack(cell_centers(grid))
+    if method == "idw":
+        return idw_weights(stations, cells, k or 8, power)
+    if method != "kriging":
+        raise ValueError(f"Unknown interpolation method {method!r}")
+    if variogram is None:
+        variogram = fit_variogram(stations, np.asarray(values, dtype="float64"), model)
+    return kriging_weights(stations, cells, variogram, model, k or 16)
+
+
+def _batches(weights, values, grid, progress, cancelled):
+    steps = len(values)
+    batch = max(1, BATCH_BYTES // (8 * grid.shape[0] * grid.shape[1]))
+    for start in range(0, steps, batch):
+        if cancelled():
+            raise Cancelled("interpolation")
+        yield start, interpolate_steps(weights, values[start:start + batch], grid)
+        progress(min(start + batch, steps), steps)
+
+
+def _write_geotiff(path, grid, batches, count):
+    profile = dict(
+        driver="GTiff", width=grid.shape[1], height=grid.shape[0], count=count, dtype="float32",
+        crs=grid.crs, transform=grid.transform, nodata=np.nan, tiled=True, blockxsize=256, blockysize=256,
+        compress="deflate", predictor=3, bigtiff="if_safer", interleave="band"
+    )
+    with rasterio.open(path, "w", **profile) as dst:
+        for start, stack in batches:
+            dst.write(stack, indexes=list(range(start + 1, start + len(stack) + 1)))
+
+
+def _write_zarr(store, grid, batches, times, variable):
+    # Empty (time, y, x) store, chunked one map per step, then filled by region
+    transform = grid.transform
+    x = transform.c + (np.arange(grid.shape[1]) + 0.5) * transform.a
+    y = transform.f + (np.arange(grid.shape[0]) + 0.5) * transform.e
+    dims = ("time", "y", "x")
+    shape = (len(times),) + grid.shape
+    template = xr.Dataset(
+        {variable: (dims, da.full(shape, np.nan, dtype="float32", chunks=(1,) + grid.shape))},
+        coords={"time": times, "y": y, "x": x},
+        attrs={"crs": grid.crs.to_wkt(), "transform": list(tuple(transform)[:6])},
+    )
+    template.to_zarr(store, mode="w", compute=False)
+    for start, stack in batches:
+        xr.Dataset({variable: (dims, stack)}).to_zarr(store, region={"time": slice(start, start + len(stack))})
+
+
+def interpolate(points, values, output, grid=None, method="idw", times=None, variable="value",
+                progress=None, cancelled=None, **options):
+    """
+    Interpolate station readings onto `grid` (default: Nigeria at 1 km) and
+    write the stack to `output`, a .tif (one band per step) or a .zarr store.
+
+    `points` is a station GeoDataFrame and `values` a (steps, stations)
+    array, or a DataFrame indexed by time with one column per station (in the
+    order of `points`). `options` go to station_weights (k, power, model,
+    variogram). Returns the output path.
+    """
+    progress = progress or _noop_progress
+    cancelled = cancelled or _never_cancelled
+    if isinstance(values, pd.DataFrame):
+        times = values.index.values if times is None else times
+        values = values.to_numpy()
+    values = np.atleast_2d(np.asarray(values, dtype="float32"))
+    times = np.arange(len(values)) if times is None else times
+    grid = grid or grid_for()
+
+    weights = station_weights(points, grid, method, values, **options)
+    batches = _batches(weights, values, grid, progress, cancelled)
+    if str(output).rstrip("/").endswith(".zarr"):
+        _write_zarr(output, grid, batches, times, variable)
+    else:
+        _write_geotiff(output, grid, batches, len(values))
+    return output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Interpolate station readings to a GeoTIFF or Zarr time stack")
+    parser.add_argument("readings", help="CSV with a time column and one column per station (the state names)")
+    parser.add_argument("output", help=".tif or .zarr")
+    parser.add_argument("--time-column", default="time")
+    parser.add_argument("--method", choices=METHODS, default="idw")
+    parser.add_argument("--resolution", type=float, default=RESOLUTION, help="cell size in metres")
+    parser.add_argument("--crs", default=DEFAULT_CRS)
+    parser.add_argument("--neighbours", type=int, default=None)
+    parser.add_argument("--power", type=float, default=2.0)
+    parser.add_argument("--model", choices=list(VARIOGRAMS), default="spherical")
+    args = parser.parse_args(argv)
+
+    readings = pd.read_csv(args.readings, index_col=args.time_column, parse_dates=True)
+    points = locations_frame()
+    points = points.loc[[name for name in readings.columns if name in points.index]]
+    readings = readings[list(points.index)]
+
+    def progress(done, total):
+        print(f"\rinterpolating: {done}/{total}", end="", flush=True)
+
+    interpolate(points, readings, args.output, grid_for(resolution=args.resolution, crs=args.crs), args.method,
+                progress=progress, k=args.neighbours, power=args.power, model=args.model)
+    print()
+
+
+if __name__ == "__main__":
+    main()
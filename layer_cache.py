@@ -0,0 +1,162 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyogrio
+import rasterio
+import shapely
+
+from loaders import raster_block_stats, read_vector_chunked
+
+# Process-wide cache of parsed layer data (GeoDataFrames, raster metadata),
+# keyed by file identity so an edited file is never served stale. Entries are
+# shared between callers and must be treated as read-only.
+
+DEFAULT_BUDGET_MB = int(os.environ.get("MAPGIS_CACHE_MB", 1024))
+
+
+def file_identity(file_path):
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns
+
+
+def estimate_size(value):
+    if isinstance(value, pd.DataFrame):
+        size = int(value.drop(columns=value.select_dtypes("geometry").columns).memory_usage(deep=True).sum())
+        for column in value.select_dtypes("geometry").columns:
+            geoms = value[column].values
+            # 16 bytes per xy coordinate plus the GEOS object overhead
+            size += int(shapely.get_num_coordinates(geoms).sum()) * 16 + len(geoms) * 100
+        return size
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, tuple):
+        return sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class LayerCache:
+    def __init__(self, max_bytes=DEFAULT_BUDGET_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+
+    def get(self, file_path, kind, loader):
+        """
+        Return the cached value for (file identity, kind), calling loader() on a miss.
+        """
+        return self.lookup((kind,) + file_identity(file_path), loader)
+
+    def lookup(self, key, loader):
+        # Same as get() for values not tied to a single file
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+
+        # Load outside the lock so other files keep being served meanwhile
+        value = loader()
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        nbytes = estimate_size(value)
+        with self._lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return
+            self.entries[key] = (value, nbytes)
+            self.size += nbytes
+            self._evict()
+
+    def _evict(self):
+        while self.size > self.max_bytes and self.entries:
+            _, (_, nbytes) = self.entries.popitem(last=False)
+            self.size -= nbytes
+            self.evictions += 1
+
+    def set_budget(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def invalidate(self, file_path):
+        path = os.path.abspath(file_path)
+        with self._lock:
+            for key in [key for key in self.entries if key[1] == path]:
+                self.size -= self.entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_cache = LayerCache()
+
+
+def get_cache():
+    return _cache
+
+
+def geometry_type(file_path):
+    # Layer metadata is enough for most drivers; only files that report a
+    # generic geometry type need their first feature read
+    def detect():
+        geom_type = pyogrio.read_info(file_path)["geometry_type"]
+        if geom_type in (None, "Unknown", "Geometry"):
+            first = pyogrio.read_dataframe(file_path, max_features=1)
+            geom_type = first.geometry.iloc[0].geom_type if len(first) else None
+        return geom_type
+
+    return _cache.get(file_path, "geometry_type", detect)
+
+
+def read_vector(file_path, progress=None, cancelled=None):
+    value = _cache.get(file_path, "vector", lambda: read_vector_chunked(file_path, progress=progress, cancelled=cancelled))
+    if progress:
+        progress(1, 1)
+    return value
+
+
+def raster_info(file_path, band=1, progress=None, cancelled=None):
+    def scan():
+        with rasterio.open(file_path) as src:
+            info = {
+                "crs": src.crs,
+                "bounds": src.bounds,
+                "transform": src.transform,
+                "nodata": src.nodata,
+                "width": src.width,
+                "height": src.height,
+                "count": src.count,
+                "dtype": src.dtypes[band - 1],
+            }
+        info["vmin"], info["vmax"] = raster_block_stats(file_path, band, progress=progress, cancelled=cancelled)
+        return info
+
+    value = _cache.get(file_path, f"raster_info:{band}", scan)
+    if progress:
+        progress(1, 1)
+    return value
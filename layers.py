@@ -0,0 +1,276 @@
+import json
+import os
+
+import folium
+import numpy as np
+import pandas as pd
+import shapely
+import xyzservices
+from folium.plugins import FastMarkerCluster
+
+from layer_cache import geometry_type, raster_info, read_vector
+from lod import VectorLOD
+from spatial_index import SpatialIndex
+from tiles import PointTileSource, RasterTileSource, get_tile_server
+
+# Every layer can be added to a folium map (static export) and describe itself
+# as a spec for the live Leaflet page driven by map_bridge.LayerManager. A spec
+# may carry its payload under "data" as ready-made JSON text.
+
+
+class TIFFLayer:
+    def __init__(self, file_name):
+        self.file_path = file_name
+        self.layer = None
+        self.source = None
+        self.opacity = 0.6
+
+    def load(self, progress=None, cancelled=None, log=None):
+        info = raster_info(self.file_path, progress=progress, cancelled=cancelled)
+        self.source = RasterTileSource(self.file_path, vmin=info["vmin"], vmax=info["vmax"])
+
+    def tile_url(self):
+        # Tiles are rendered on demand by the local tile server, so only the
+        # part of the raster in view at the current zoom is ever read
+        if self.source is None:
+            self.source = RasterTileSource(self.file_path)
+        return get_tile_server().register(self.source)
+
+    def restyle(self, style):
+        """
+        Recolour with a raster_style.RasterStyle. Returns the style update for
+        LayerManager.restyle: the new tile URL the page switches to.
+        """
+        if self.source is None:
+            self.source = RasterTileSource(self.file_path)
+        self.source.set_style(style)
+        return {"url": self.tile_url()}
+
+    def add_to_map(self, folium_map):
+        self.layer = folium.TileLayer(
+            tiles=self.tile_url(),
+            attr=os.path.basename(self.file_path),
+            name=os.path.basename(self.file_path),
+            opacity=self.opacity,
+            overlay=True,
+            control=True,
+            max_zoom=22
+        )
+        self.layer.add_to(folium_map)
+        return self.layer
+
+    def to_spec(self):
+        return {
+            "type": "tile",
+            "url": self.tile_url(),
+            "options": {"opacity": self.opacity, "maxZoom": 22},
+            "bounds": self.source.latlon_bounds(),
+        }
+
+    def remove_from_map(self, folium_map):
+        if self.layer:
+            # Remove the layer using JavaScript if needed
+            folium_map._children.pop(self.layer.get_name())
+            get_tile_server().unregister(self.source)
+            self.layer = None  # Clear reference after removing
+
+
+class IndexedLayer:
+    # Queries shared by the vector layers. self.latlon is the layer in
+    # EPSG:4326 and self.index the STRtree built over it at load time; all
+    # results are positional row indices.
+
+    def identify(self, lon, lat, tolerance=0.0):
+        return self.index.identify(lon, lat, tolerance)
+
+    def select(self, geometry):
+        return self.index.select(geometry)
+
+    def attributes(self, index):
+        # Popups are built on click from the row that was hit
+        row = self.latlon.iloc[int(index)].drop(labels=self.latlon.geometry.name)
+        return row.to_json(default_handler=str)
+
+    def features_geojson(self, rows):
+        return self.latlon.iloc[rows].to_json(drop_id=True)
+
+
+class ShapefileLayer(IndexedLayer):
+    style = {
+        'fillColor': 'grey',
+        'color': 'black',
+        'weight': 2,
+        'fillOpacity': 0.5
+    }
+
+    def __init__(self, file_name):
+        self.file_path = file_name
+        self.layer = None
+        self.geodata = None
+        self.latlon = None
+        self.index = None
+        self.lod = None
+
+    def load(self, progress=None, cancelled=None, log=None):
+        self.geodata = read_vector(self.file_path, progress=progress, cancelled=cancelled)
+        self.latlon = _latlon(self.geodata)
+        self.index = SpatialIndex(self.latlon.geometry.values)
+        # Simplified versions per zoom band, served by the tile server so the
+        # page only fetches the level the current zoom needs
+        self.lod = VectorLOD(self.file_path, self.latlon, self.index).build(progress=progress, cancelled=cancelled, log=log)
+
+    def read(self):
+        if self.geodata is None:
+            self.load()
+        return self.geodata
+
+    def add_to_map(self, folium_map):
+        geodata = self.read()
+        self.layer = folium.GeoJson(
+            geodata,
+            name=os.path.basename(self.file_path),
+            style_function=lambda feature: self.style
+        )
+        self.layer.add_to(folium_map)
+        return self.layer
+
+    def to_spec(self):
+        if self.lod is None:
+            self.load()
+        return {
+            "type": "lod",
+            "url": get_tile_server().register(self.lod),
+            "bands": self.lod.bands_spec(),
+            "style": self.style,
+            "bounds": _latlon_bounds(self.latlon),
+        }
+
+    def remove_from_map(self, folium_map):
+        if self.layer:
+            folium_map._children.pop(self.layer.get_name())
+            self.layer = None
+
+
+class GeoJSONLayer(ShapefileLayer):
+    style = {
+        'fillColor': 'green',
+        'color': 'black',
+        'weight': 2,
+        'fillOpacity': 0.6
+    }
+
+
+class CircleMarker(IndexedLayer):
+    style = {
+        'radius': 2,  # You can adjust the size
+        'color': 'black',
+        'fill': True,
+        'fillOpacity': 0.5
+    }
+
+    def __init__(self, file_name):
+        self.file_path = file_name
+        self.layer = None
+        self.geodata = None
+        self.latlon = None
+        self.index = None
+        self.tiles = None
+
+    def load(self, progress=None, cancelled=None, log=None):
+        self.geodata = read_vector(self.file_path, progress=progress, cancelled=cancelled)
+        self.latlon = _latlon(self.geodata)
+        self.index = SpatialIndex(self.latlon.geometry.values)
+        # Canvas tiles fetch only their own points, found through the index
+        self.tiles = PointTileSource(self.file_path, self.index)
+
+    def read(self):
+        if self.latlon is None:
+            self.load()
+        return self.latlon
+
+    def coordinates(self):
+        # One columnar pass over the geometry array, no per-row objects
+        coords = shapely.get_coordinates(self.read().geometry.values)
+        return np.round(coords, 6)
+
+    def add_to_map(self, folium_map):
+        coords = self.coordinates()
+        geodata = self.read()
+        label = geodata['value'] if 'value' in geodata else pd.Series(geodata.index, index=geodata.index)
+        data = list(zip(coords[:, 1].tolist(), coords[:, 0].tolist(), label.astype(str).tolist()))
+        self.layer = FastMarkerCluster(
+            data,
+            name=os.path.basename(self.file_path),
+            callback="""function (row) {
+                var marker = L.circleMarker(new L.LatLng(row[0], row[1]), %s);
+                marker.on('click', function () { marker.bindPopup(row[2]).openPopup(); });
+                return marker;
+            }""" % json.dumps(self.style)
+        )
+        self.layer.add_to(folium_map)
+        return self.layer
+
+    def to_spec(self):
+        if self.tiles is None:
+            self.load()
+        return {
+            "type": "points",
+            "url": get_tile_server().register(self.tiles),
+            "style": self.style,
+            "bounds": _latlon_bounds(self.latlon),
+        }
+
+    def remove_from_map(self, folium_map):
+        if self.layer:
+            folium_map._children.pop(self.layer.get_name())
+            self.layer = None
+
+
+class BasemapLayer:
+    def __init__(self, name, tiles):
+        self.name = name
+        self.provider = xyzservices.providers.query_name(tiles)
+        self.layer = None
+
+    def add_to_map(self, folium_map):
+        self.layer = folium.TileLayer(tiles=self.provider, name=self.name)
+        self.layer.add_to(folium_map)
+        return self.layer
+
+    def to_spec(self):
+        return {
+            "type": "tile",
+            "url": self.provider.build_url(),
+            "options": {"attribution": self.provider.html_attribution, "maxZoom": self.provider.get("max_zoom", 19)},
+            "basemap": True,
+        }
+
+    def remove_from_map(self, folium_map):
+        if self.layer:
+            folium_map._children.pop(self.layer.get_name())
+            self.layer = None
+
+
+def open_layer(file_path):
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension in (".tif", ".tiff"):
+        return TIFFLayer(file_path)
+    if file_extension in (".shp", ".gpkg", ".fgb"):
+        if (geometry_type(file_path) or "").startswith('Point'):
+            return CircleMarker(file_path)
+        return ShapefileLayer(file_path)
+    if file_extension == ".geojson":
+        return GeoJSONLayer(file_path)
+    raise ValueError(f"Unsupported file type: {file_extension}")
+
+
+def _latlon(geodata):
+    # Layers without a CRS are taken as WGS84, as build_pyramid does for rasters
+    if geodata.crs is None:
+        return geodata.set_crs(4326)
+    return geodata.to_crs(4326)
+
+
+def _latlon_bounds(geodata):
+    minx, miny, maxx, maxy = geodata.total_bounds
+    return [[miny, minx], [maxy, maxx]]
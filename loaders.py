@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pyogrio
+import rasterio
+from rasterio.windows import Window
+
+# Readers used by the layer classes. They report real progress as
+# progress(done, total) and poll cancelled() between chunks, so the same code
+# runs on a GUI worker thread or headless.
+
+CHUNK_FEATURES = 50_000
+CHUNK_PIXELS = 4_000_000
+
+
+class Cancelled(Exception):
+    pass
+
+
+def _noop_progress(done, total):
+    pass
+
+
+def _never_cancelled():
+    return False
+
+
+def read_vector_chunked(file_path, chunk_size=CHUNK_FEATURES, progress=None, cancelled=None):
+    progress = progress or _noop_progress
+    cancelled = cancelled or _never_cancelled
+
+    info = pyogrio.read_info(file_path, force_feature_count=True)
+    total = max(int(info["features"]), 0)
+    if total <= chunk_size:
+        geodata = pyogrio.read_dataframe(file_path)
+        progress(total, total)
+        return geodata
+
+    chunks = []
+    for offset in range(0, total, chunk_size):
+        if cancelled():
+            raise Cancelled(file_path)
+        chunks.append(pyogrio.read_dataframe(file_path, skip_features=offset, max_features=chunk_size))
+        progress(min(offset + chunk_size, total), total)
+
+    return gpd.GeoDataFrame(pd.concat(chunks, ignore_index=True), crs=chunks[0].crs)
+
+
+def block_row_windows(src, band=1, chunk_pixels=CHUNK_PIXELS):
+    # Full-width strips aligned to the internal block height, so each read
+    # decodes whole blocks while strip-organised files don't end up with one
+    # window per scanline
+    block_height = src.block_shapes[band - 1][0]
+    rows = max(block_height, chunk_pixels // max(src.width, 1) // block_height * block_height)
+    return [Window(0, row, src.width, min(rows, src.height - row)) for row in range(0, src.height, rows)]
+
+
+def raster_block_stats(file_path, band=1, progress=None, cancelled=None):
+    """
+    Min/max of a raster band read block by block (nodata excluded).
+
+    Returns (vmin, vmax), or (None, None) when the band has no valid pixel.
+    """
+    progress = progress or _noop_progress
+    cancelled = cancelled or _never_cancelled
+
+    vmin, vmax = np.inf, -np.inf
+    with rasterio.open(file_path) as src:
+        windows = block_row_windows(src, band)
+        for done, window in enumerate(windows, start=1):
+            if cancelled():
+                raise Cancelled(file_path)
+            block = src.read(band, window=window, masked=True)
+            if block.count():
+                vmin = min(vmin, float(block.min()))
+                vmax = max(vmax, float(block.max()))
+            progress(done, len(windows))
+
+    if vmin > vmax:
+        return None, None
+    return vmin, vmax
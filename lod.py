@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pyogrio
+import shapely
+
+from spatial_index import SpatialIndex
+from tiles import CACHE_DIR, TILE_SIZE, file_key
+
+# Level-of-detail versions of a vector layer. Each zoom band gets geometry
+# simplified to about half a screen pixel at the band's deepest zoom, so the
+# browser never receives vertices it cannot draw. Simplified levels are written
+# to the cache directory, keyed by the source file, and reused by later sessions.
+
+# (min zoom, max zoom) per band; the last band keeps full resolution
+ZOOM_BANDS = [(0, 4), (5, 7), (8, 10), (11, 13), (14, 22)]
+PIXEL_TOLERANCE = 0.5
+LOD_DIR = CACHE_DIR.parent / "lod"
+
+
+def band_tolerance(max_zoom):
+    # Size of one screen pixel in degrees at the equator
+    return PIXEL_TOLERANCE * 360 / (TILE_SIZE * 2 ** max_zoom)
+
+
+def simplify(geoms, tolerance):
+    """
+    Topology-preserving simplification of a geometry array.
+
+    A clean polygon coverage (e.g. admin boundaries) is simplified as a whole
+    so neighbours keep sharing their edges; anything else is simplified per
+    feature with preserve_topology, which may open gaps between neighbours.
+    """
+    polygonal = np.isin(shapely.get_type_id(geoms), (3, 6))
+    if polygonal.all():
+        try:
+            if shapely.coverage_is_valid(geoms):
+                return shapely.coverage_simplify(geoms, tolerance)
+        except shapely.errors.GEOSException:
+            pass
+    return shapely.simplify(geoms, tolerance, preserve_topology=True)
+
+
+class VectorLOD:
+    def __init__(self, file_path, geodata, index=None, cache_dir=LOD_DIR):
+        # geodata is expected in EPSG:4326; every level keeps one row per
+        # source feature (collapsed ones become empty) so positional indices
+        # from the spatial index apply to all of them
+        self.file_path = file_path
+        self.key = f"lod-{file_key(file_path)}-{id(self):x}"
+        self.geodata = geodata
+        self.index = index if index is not None else SpatialIndex(geodata.geometry.values)
+        self.levels = {}
+        self._json = {}
+        self._lock = threading.Lock()
+        self.cache_dir = Path(cache_dir) / file_key(file_path)
+
+    def _manifest(self):
+        stat = os.stat(self.file_path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "rows": len(self.geodata), "bands": ZOOM_BANDS}
+
+    def _load_cached(self):
+        manifest_path = self.cache_dir / "manifest.json"
+        if not manifest_path.exists():
+            return False
+        with open(manifest_path) as f:
+            if json.load(f) != json.loads(json.dumps(self._manifest())):
+                return False
+        for band, _ in enumerate(ZOOM_BANDS[:-1]):
+            self.levels[band] = pyogrio.read_dataframe(self.cache_dir / f"band{band}.fgb")
+        return True
+
+    def build(self, progress=None, cancelled=None, log=None):
+        log = log or (lambda message: None)
+        self.levels[len(ZOOM_BANDS) - 1] = self.geodata
+        if self._load_cached():
+            return self
+
+        columns = [column for column in self.geodata.columns if column != self.geodata.geometry.name]
+        geoms = self.geodata.geometry.values
+        for band, (_, max_zoom) in enumerate(ZOOM_BANDS[:-1]):
+            if cancelled and cancelled():
+                return self
+            simplified = simplify(geoms, band_tolerance(max_zoom))
+            self.levels[band] = self.geodata[columns].set_geometry(simplified, crs=self.geodata.crs)
+            if progress:
+                progress(band + 1, len(ZOOM_BANDS) - 1)
+
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            for band, _ in enumerate(ZOOM_BANDS[:-1]):
+                # No spatial index: it would reorder the rows on write
+                pyogrio.write_dataframe(
+                    self.levels[band], self.cache_dir / f"band{band}.fgb", driver="FlatGeobuf", SPATIAL_INDEX="NO"
+                )
+            with open(self.cache_dir / "manifest.json", "w") as f:
+                json.dump(self._manifest(), f)
+        except OSError as e:
+            log(f"Could not cache simplified levels for {self.file_path}: {e}")
+        return self
+
+    def band_for_zoom(self, zoom):
+        for band, (min_zoom, max_zoom) in enumerate(ZOOM_BANDS):
+            if min_zoom <= zoom <= max_zoom:
+                return band
+        return len(ZOOM_BANDS) - 1
+
+    def features(self, band, rows=None):
+        level = self.levels[band]
+        if rows is not None:
+            level = level.iloc[rows]
+        geoms = level.geometry.values
+        return level[~(shapely.is_missing(geoms) | shapely.is_empty(geoms))]
+
+    def geojson(self, band, bbox=None):
+        if bbox is not None:
+            minx, miny, maxx, maxy = self.geodata.total_bounds
+            covers = bbox[0] <= minx and bbox[1] <= miny and bbox[2] >= maxx and bbox[3] >= maxy
+            if not covers:
+                # Viewport culling: only features intersecting the view are sent
+                return self.features(band, self.index.query_bbox(*bbox)).to_json(drop_id=True)
+        with self._lock:
+            if band not in self._json:
+                self._json[band] = self.features(band).to_json(drop_id=True)
+            return self._json[band]
+
+    def url_template(self, base):
+        return f"{base}/{{band}}.geojson"
+
+    def handle(self, parts, query):
+        band = int(parts[0].split(".")[0])
+        bbox = [float(v) for v in query["bbox"][0].split(",")] if "bbox" in query else None
+        return "application/geo+json", self.geojson(band, bbox)
+
+    def bands_spec(self):
+        return [{"band": band, "minZoom": min_zoom, "maxZoom": max_zoom} for band, (min_zoom, max_zoom) in enumerate(ZOOM_BANDS)]
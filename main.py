@@ -1,121 +1,23 @@
 from pathlib import Path
-import json
-import io
-import folium.raster_layers
-import pandas as pd
-import rioxarray
-from shapely.geometry import Point
-import numpy as np
-import geopandas as gpd
-import rasterio
-import folium
-from folium.plugins import Draw, MousePosition
+import shapely.geometry
+import pyogrio
 from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QPushButton, QWidget, QFileDialog, QLabel, QHBoxLayout, QCheckBox, QListWidget, QTableWidget, QToolBar, QDialog, QPushButton, QTextEdit, QInputDialog, QComboBox, QProgressBar, QTreeWidget, QTreeWidgetItem, QSplashScreen, QLineEdit, QFormLayout, QMenu
 from PyQt6.QtWebEngineWidgets import QWebEngineView 
-from PyQt6.QtGui import QAction, QIcon, QPixmap, QIntValidator
-from PyQt6.QtCore import QSize, Qt, QPoint
-from folium.raster_layers import ImageOverlay
+from PyQt6.QtGui import QAction, QIcon, QPixmap, QDoubleValidator
+from PyQt6.QtCore import QSize, Qt, QPoint, QThreadPool
+from attribute_table import AttributeTable
+import geoprocessing
+import zonal
+from layers import BasemapLayer, TIFFLayer, open_layer
+from map_bridge import LayerManager
+from tiles import CACHE_DIR
+from workers import Task
 import os, sys
-import time
+import multiprocessing
 os.environ["QT_OPENGL"] = "software"
 os.environ["QT_QUICK_BACKEND"] = "software"
 
-class TIFFLayer:
-    def __init__(self, file_name):
-        self.file_path = file_name
-        self.layer = None
-
-    def add_to_map(self, folium_map):
-        with rasterio.open(self.file_path) as src:
-            bounds = [[src.bounds.bottom, src.bounds.left], [src.bounds.top, src.bounds.right]]
-            self.layer = ImageOverlay(
-                image=src.read(1),
-                bounds=bounds,
-                opacity=0.6,
-                name=os.path.basename(self.file_path),
-                interactive=True,
-                cross_origin=True,
-                overlay=True
-            )
-            self.layer.add_to(folium_map)
-            return self.layer
-        
-    def remove_from_map(self, folium_map):
-        if self.layer:
-            # Remove the layer using JavaScript if needed
-            folium_map._children.pop(self.layer._name)
-            self.layer = None  # Clear reference after removing
-
-class ShapefileLayer:
-    def __init__(self, file_name):
-        self.file_path = file_name
-        self.layer = None
-
-    def add_to_map(self, folium_map):
-        geodata = gpd.read_file(self.file_path)
-        self.layer = folium.GeoJson(
-            geodata,
-            name=os.path.basename(self.file_path),
-            style_function=lambda feature: {
-                'fillColor': 'grey',
-                'color': 'black',
-                'weight': 2,
-                'fillOpacity': 0.5
-            }
-        )
-        self.layer.add_to(folium_map)
-        return self.layer
-    
-    def remove_from_map(self, folium_map):
-        if self.layer:
-            folium_map._children.pop(self.layer._name)
-            self.layer = None
-
-class GeoJSONLayer:
-    def __init__(self, file_name):
-        self.file_path = file_name
-        self.layer = None
-
-    def add_to_map(self, folium_map):
-        with open(self.file_path) as f:
-            geojson_data = json.load(f)
-        self.layer = folium.GeoJson(
-            geojson_data,
-            name=os.path.basename(self.file_path),
-            style_function=lambda feature: {
-                'fillColor': 'green',
-                'color': 'black',
-                'weight': 2,
-                'fillOpacity': 0.6
-            }
-        )
-        self.layer.add_to(folium_map)
-        return self.layer
-
-    def remove_from_map(self, folium_map):
-        if self.layer:
-            folium_map._children.pop(self.layer._name)
-            self.layer = None
-
-class CircleMarker:
-    def __init__(self, file_name):
-        self.file_path = file_name
-        self.layer = None
-    
-    def add_to_map(self, folium_map):
-        geodata = gpd.read_file(self.file_path)
-        for idx, row in geodata.iterrows():
-            self.layer  = folium.CircleMarker(
-                location=(row.geometry.y, row.geometry.x),
-                radius=2,  # You can adjust the size
-                color='black',
-                fill=True,
-                fill_opacity=0.5,
-                popup=str(row['value'])  # Optionally add a popup with the value
-            )
-        self.layer.add_to(folium_map)
-        return self.layer
-
+RESULTS_DIR = CACHE_DIR.parent / "results"
 
 class BasemapDialog(QDialog):
     def __init__(self, parent=None):
@@ -163,8 +65,6 @@ class GISApp(QMainWindow):
 
         self.path = None
         self.filters = 'Shp Files (*.shp)'
-        self.m = folium.Map(location=[0, 0], tiles=None, control_scale=True, zoom_start=2)
-        MousePosition().add_to(self.m)
 
         self.main_layout = QHBoxLayout(self.central_widget)
 
@@ -189,6 +89,10 @@ class GISApp(QMainWindow):
         self.web_view_widget = QWidget()
         self.web_view = QWebEngineView(self.web_view_widget)
         self.main_layout.addWidget(self.web_view)
+        self.map_layers = LayerManager(self.web_view)
+        self.map_layers.bridge.shapeDrawn.connect(self.select_by_shape)
+        self.selection = {}
+        self.attribute_tables = []
 
         self.right_list_widget = QWidget()
         self.right_list = QVBoxLayout(self.right_list_widget)
@@ -205,6 +109,8 @@ class GISApp(QMainWindow):
         self.main_layout.setStretch(2, 1)
 
         self.geodata = None
+        self.thread_pool = QThreadPool.globalInstance()
+        self.tasks = []
 
         self.create_menu_bar()
         self.toolbar1()
@@ -285,11 +191,20 @@ class GISApp(QMainWindow):
         geop_menu.addAction(buffer)
 
         clip = QAction('Clip', self)
+        clip.triggered.connect(self.clip)
         geop_menu.addAction(clip)
 
+        intersect = QAction('Intersect', self)
+        intersect.triggered.connect(self.intersect)
+        geop_menu.addAction(intersect)
+
         union = QAction('Union', self)
         union.triggered.connect(self.union_data)
         geop_menu.addAction(union)
+
+        zonal_stats = QAction('Zonal Statistics', self)
+        zonal_stats.triggered.connect(self.zonal_statistics)
+        geop_menu.addAction(zonal_stats)
         
         # Create insert actions using QAction
         basemap_action = QAction('Add Basemap', self)
@@ -356,16 +271,50 @@ class GISApp(QMainWindow):
         self.path = Path(filename)
         self.path.write_text(text_edit.toPlainText())
 
+    def vector_layers(self):
+        return {
+            self.map_layers.names[layer_id]: layer
+            for layer_id, layer in self.map_layers.layers.items()
+            if getattr(layer, "geodata", None) is not None
+        }
+
+    def choose_layer(self, title, label, layers=None):
+        layers = self.vector_layers() if layers is None else layers
+        if not layers:
+            self.statusBar().showMessage("Load a vector layer first", 5000)
+            return None, None
+        name, ok = QInputDialog.getItem(self, title, label, list(layers), 0, False)
+        if not ok:
+            return None, None
+        return name, layers[name]
+
+    def run_geoprocessing(self, label, fn, output_name):
+        # The result is written to the results folder and loaded like any file
+        def run(progress, cancelled, log):
+            result = fn(progress, cancelled)
+            RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+            output = RESULTS_DIR / f"{output_name}.gpkg"
+            pyogrio.write_dataframe(result, output)
+            return str(output)
+
+        self.start_task(label, run, self.create_layer)
+
     def buffer(self):
-        dialog = QDialog()
+        layers = self.vector_layers()
+        if not layers:
+            self.statusBar().showMessage("Load a vector layer first", 5000)
+            return
+
+        dialog = QDialog(self)
         dialog.setWindowIcon(QIcon('icons/buffer.png'))
         dialog.setWindowTitle("Buffer")
-        self.layer_list = QListWidget()
-        self.layer_list.addItems(self.layers)  # Add the layers to the list
-        self.layer_list.setSelectionMode(QListWidget.SelectionMode.SingleSelection)
+        layer_list = QListWidget()
+        layer_list.addItems(list(layers))  # Add the layers to the list
+        layer_list.setSelectionMode(QListWidget.SelectionMode.SingleSelection)
+        layer_list.setCurrentRow(0)
 
         self.number_input = QLineEdit()
-        self.number_input.setValidator(QIntValidator())
+        self.number_input.setValidator(QDoubleValidator())
         ok_button = QPushButton("OK")
         ok_button.clicked.connect(dialog.accept)
         
@@ -374,36 +323,112 @@ class GISApp(QMainWindow):
 
         layout = QVBoxLayout()
         layout.addWidget(QLabel("Select a Layer:"))
-        layout.addWidget(self.layer_list)
+        layout.addWidget(layer_list)
         
         form_layout = QFormLayout()
-        form_layout.addRow("Distance(in cm):", self.number_input)
+        form_layout.addRow("Distance(in m):", self.number_input)
         layout.addLayout(form_layout)
 
         button_layout = QHBoxLayout()
         button_layout.addWidget(ok_button)
         button_layout.addWidget(cancel_button)
         layout.addLayout(button_layout)
+        dialog.setLayout(layout)
+
+        if not dialog.exec() or not layer_list.currentItem() or not self.number_input.text():
+            return
+        name = layer_list.currentItem().text()
+        geodata = layers[name].geodata
+        distance = float(self.number_input.text())
+        self.run_geoprocessing(
+            f"Buffering {name}",
+            lambda progress, cancelled: geoprocessing.buffer(geodata, distance, progress=progress, cancelled=cancelled),
+            f"{os.path.splitext(name)[0]}_buffer"
+        )
 
     def clip(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "Load GeoData", "", "DataSets, Layers (*.tif *.tiff *.shp *.geojson)",
-            options=QFileDialog.Option.DontUseNativeDialog
+        layers = {
+            self.map_layers.names[layer_id]: layer
+            for layer_id, layer in self.map_layers.layers.items()
+            if isinstance(layer, TIFFLayer) or getattr(layer, "geodata", None) is not None
+        }
+        name, layer = self.choose_layer("Clip", "Layer to clip:", layers)
+        if layer is None:
+            return
+        mask_name, mask_layer = self.choose_layer("Clip", "Clip to:")
+        if mask_layer is None:
+            return
+        mask = mask_layer.geodata
+
+        if isinstance(layer, TIFFLayer):
+            # Rasters are clipped window by window straight into a GeoTIFF
+            def run(progress, cancelled, log):
+                RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+                output = RESULTS_DIR / f"{os.path.splitext(name)[0]}_clip.tif"
+                return str(geoprocessing.clip_raster(layer.file_path, mask, output, progress=progress, cancelled=cancelled))
+
+            self.start_task(f"Clipping {name}", run, self.create_layer)
+            return
+
+        geodata = layer.geodata
+        self.run_geoprocessing(
+            f"Clipping {name}",
+            lambda progress, cancelled: geoprocessing.clip(geodata, mask, progress=progress, cancelled=cancelled),
+            f"{os.path.splitext(name)[0]}_clip"
         )
-        xds = rioxarray.open_rasterio(
-            file_path,
-            masked=True,
+
+    def intersect(self):
+        name, layer = self.choose_layer("Intersect", "First layer:")
+        if layer is None:
+            return
+        other_name, other = self.choose_layer("Intersect", "Second layer:")
+        if other is None:
+            return
+        left, right = layer.geodata, other.geodata
+        self.run_geoprocessing(
+            f"Intersecting {name} and {other_name}",
+            lambda progress, cancelled: geoprocessing.intersect(left, right, progress=progress, cancelled=cancelled),
+            f"{os.path.splitext(name)[0]}_{os.path.splitext(other_name)[0]}_intersect"
         )
 
     def union_data(self):
-        try:
-            if self.geodata is not None:
-                unioned = self.geodata.unary_union
-                unioned_geodata = gpd.GeoDataFrame(geometry=[unioned])
-                self.geodata = unioned_geodata
-                self.display_map()
-        except Exception as e:
-            self.statusBar().showMessage(f"Union operation failed: {e}")
-    
+        name, layer = self.choose_layer("Union", "Layer to union:")
+        if layer is None:
+            return
+        geodata = layer.geodata
+        self.run_geoprocessing(
+            f"Union of {name}",
+            lambda progress, cancelled: geoprocessing.union(geodata, progress=progress, cancelled=cancelled),
+            f"{os.path.splitext(name)[0]}_union"
+        )
+
+    def zonal_statistics(self):
+        rasters = {
+            self.map_layers.names[layer_id]: layer
+            for layer_id, layer in self.map_layers.layers.items()
+            if isinstance(layer, TIFFLayer)
+        }
+        if not rasters:
+            self.statusBar().showMessage("Load a raster layer first", 5000)
+            return
+        name, raster = self.choose_layer("Zonal Statistics", "Raster:", rasters)
+        if raster is None:
+            return
+        zones_name, zones_layer = self.choose_layer("Zonal Statistics", "Zones:")
+        if zones_layer is None:
+            return
+        zones = zones_layer.geodata
+        output_name = f"{os.path.splitext(zones_name)[0]}_{os.path.splitext(name)[0]}_zonal"
+
+        def run(progress, cancelled):
+            # Full table as CSV; the zones with the statistics joined are loaded
+            table = zonal.zonal_stats(raster.file_path, zones, percentiles=(50,), progress=progress, cancelled=cancelled)
+            RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+            table.to_csv(RESULTS_DIR / f"{output_name}.csv", index=False)
+            return zonal.join_zones(zones, table)
+
+        self.run_geoprocessing(f"Zonal statistics of {name}", run, output_name)
+
     def open_basemap_dialog(self):
         dialog = BasemapDialog(self)
         if dialog.exec():
@@ -412,116 +437,138 @@ class GISApp(QMainWindow):
 
     def add_basemap(self, basemap_name):
         basemap_dict = {
-            'OpenStreetMap': 'openstreetmap',
-            'Stadia StamenToner': 'stadiastamentoner',
-            'Stadia StamenWaterColor': 'stadiastamenwatercolor',
-            'CartoDB positron': 'cartodbpositron',
-            'CartoDB dark_matter': 'cartodbdark_matter',
+            'OpenStreetMap': 'OpenStreetMap.Mapnik',
+            'Stadia StamenToner': 'Stadia.StamenToner',
+            'Stadia StamenWaterColor': 'Stadia.StamenWatercolor',
+            'CartoDB positron': 'CartoDB.Positron',
+            'CartoDB dark_matter': 'CartoDB.DarkMatter',
         }
 
         if basemap_name in basemap_dict:
-            tile_layer_name = basemap_dict[basemap_name]
-            basemap_layer = folium.TileLayer(tiles=tile_layer_name, name=basemap_name)
-            basemap_layer.add_to(self.m)
+            basemap_layer = BasemapLayer(basemap_name, basemap_dict[basemap_name])
+            layer_id = self.map_layers.add(basemap_layer, basemap_name)
 
-            self.add_layer_checkbox(basemap_layer, basemap_name)
-            self.layers.append(basemap_layer)
-            
-            data = io.BytesIO()
-            self.m.save(data, close_file=False)
-            self.web_view.setHtml(data.getvalue().decode())
+            self.add_layer_checkbox(layer_id, basemap_name)
+            self.layers.append(basemap_name)
         else:
             self.statusBar().showMessage(f"Basemap {basemap_name} is not recognized.")
 
     def load_data(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "Load GeoData", "", "DataSets, Layers (*.tif *.tiff *.shp *.geojson)",
+        file_path, _ = QFileDialog.getOpenFileName(self, "Load GeoData", "", "DataSets, Layers (*.tif *.tiff *.shp *.geojson *.gpkg *.fgb)",
             options=QFileDialog.Option.DontUseNativeDialog
         )
         if file_path:
             self.create_layer(file_path)
 
-    def create_layer(self, file_path):
-        file_name = os.path.basename(file_path)
-        file_extension = os.path.splitext(file_path)[1]
-        
+    def start_task(self, label, fn, on_finished):
+        # Runs fn(progress, cancelled, log) on the thread pool with its own
+        # progress bar and Cancel button in the status bar; logged messages
+        # show there too
         temp_status_widget = QWidget(self)
         temp_layout = QHBoxLayout()
+        temp_layout.setContentsMargins(0, 0, 0, 0)
         temp_status_widget.setLayout(temp_layout)
 
         progress_bar = QProgressBar(self)
         progress_bar.setValue(0)
+        cancel_button = QPushButton("Cancel")
 
-        temp_layout.addWidget(QLabel("Loading: "))
+        temp_layout.addWidget(QLabel(f"{label}: "))
         temp_layout.addWidget(progress_bar)
+        temp_layout.addWidget(cancel_button)
 
         self.statusBar().addPermanentWidget(temp_status_widget)
-        self.statusBar().showMessage(f"Loading {file_name}")
-
-        def progress():
-            for i in range(1, 101):
-                time.sleep(0.02)  # Simulating load time for each step
-                progress_bar.setValue(i)
-                QApplication.processEvents()
-        try:
-            if file_extension in (".tif", ".tiff"):
-                layer = TIFFLayer(file_path)
-                progress()
-            elif file_extension == ".shp":
-                geodata = gpd.read_file(file_path)
-                if geodata.geometry.iloc[0].geom_type == 'Point':
-                    layer = CircleMarker(file_path)
-                    self.add_layer_checkbox(layer, file_name)
-                    self.layers.append(file_name)
-                    print('circlemarker', layer)
-                else:
-                    layer = ShapefileLayer(file_path)
-                    print('shapelayer')
-                progress()
-            elif file_extension == ".geojson":
-                layer = GeoJSONLayer(file_path)
-                progress()
-    
-            layer.add_to_map(self.m)
-            self.add_layer_checkbox(layer, file_name)
+        self.statusBar().showMessage(label)
+
+        def update_progress(done, total):
+            progress_bar.setMaximum(max(total, 1))
+            progress_bar.setValue(done)
+
+        def failed(error):
+            self.statusBar().showMessage(f"{label} failed: {error}")
+
+        def cancelled():
+            self.statusBar().showMessage(f"{label} cancelled", 5000)
+
+        def log(message):
+            self.statusBar().showMessage(message, 10000)
+
+        def done():
+            self.statusBar().removeWidget(temp_status_widget)
+            temp_status_widget.deleteLater()
+            self.tasks.remove(task)
+
+        task = Task(fn)
+        task.signals.progress.connect(update_progress)
+        task.signals.finished.connect(on_finished)
+        task.signals.failed.connect(failed)
+        task.signals.cancelled.connect(cancelled)
+        task.signals.log.connect(log)
+        for signal in (task.signals.finished, task.signals.failed, task.signals.cancelled):
+            signal.connect(done)
+        cancel_button.clicked.connect(task.cancel)
+
+        self.tasks.append(task)
+        self.thread_pool.start(task)
+        return task
+
+    def create_layer(self, file_path):
+        file_name = os.path.basename(file_path)
+
+        def load(progress, cancelled, log):
+            # Runs on the thread pool: detection, the chunked read and the
+            # page payload are all built off the GUI thread
+            layer = open_layer(file_path)
+            layer.load(progress=progress, cancelled=cancelled, log=log)
+            return layer, layer.to_spec()
+
+        def loaded(result):
+            layer, spec = result
+            # Only the new layer is pushed to the page
+            layer_id = self.map_layers.add(layer, file_name, spec=spec)
+            self.add_layer_checkbox(layer_id, file_name)
             self.layers.append(file_name)
-            # Save the map
-            data = io.BytesIO()
-            self.m.save(data, close_file=False)
-            self.web_view.setHtml(data.getvalue().decode())
             self.statusBar().showMessage(f"{file_name} loaded successfully", 5000)
-            print(self.layers, self.layer_checboxes)
-        except Exception as e:
-            self.statusBar().showMessage(f"Error loading data: {e}")
-            print(e)
-        finally:
-            self.statusBar().removeWidget(temp_status_widget)
 
-    def add_layer_checkbox(self, layer, file_name):
+        self.start_task(f"Loading {file_name}", load, loaded)
+
+    def add_layer_checkbox(self, layer_id, file_name):
         checkbox = QCheckBox(file_name)
         checkbox.setCheckState(Qt.CheckState.Checked)
-        checkbox.stateChanged.connect(lambda state: self.toggle_layer(layer, state))
+        checkbox.stateChanged.connect(lambda state: self.toggle_layer(layer_id, state))
         self.layer_list.addWidget(checkbox)
+        self.layer_checboxes[layer_id] = checkbox
 
-    def toggle_layer(self, state, layer):
-        if state == 2:
-            layer.add_to_map(self.m)
-        else:
-            layer.remove_from_map(self.m)
+    def toggle_layer(self, layer_id, state):
+        # The layer stays loaded in the page, only its visibility flips
+        self.map_layers.set_visible(layer_id, state == 2)
 
-    def attribute_table(self, file_path):
-        if file_path:
-            try:
-                pass
-            except Exception as e:
-                self.statusBar().showMessage(f"Error {e}.")
+    def attribute_table(self):
+        layers = {
+            self.map_layers.names[layer_id]: layer_id
+            for layer_id, layer in self.map_layers.layers.items()
+            if getattr(layer, "geodata", None) is not None
+        }
+        name, layer_id = self.choose_layer("Attribute Table", "Layer:", layers)
+        if layer_id is None:
+            return
+        table = AttributeTable(layer_id, name, self.map_layers.layers[layer_id], self.map_layers, self.start_task, self)
+        table.finished.connect(lambda: self.attribute_tables.remove(table))
+        self.attribute_tables.append(table)
+        table.show()
 
     def draw_polygon(self):
-        Draw(export=True).add_to(self.m)
-        data = io.BytesIO()
-        self.m.save(data, close_file=False)
-        self.web_view.setHtml(data.getvalue().decode())
+        self.map_layers.enable_draw()
+
+    def select_by_shape(self, geojson):
+        shape = shapely.geometry.shape(geojson["geometry"])
+        self.selection = self.map_layers.select(shape)
+        count = sum(len(rows) for rows in self.selection.values())
+        self.statusBar().showMessage(f"{count} features selected", 5000)
 
 if __name__ == "__main__":
+    # Geoprocessing uses a process pool, which needs this in frozen builds
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     pixmap = QPixmap("icons/loading.png").scaled(500, 500, Qt.AspectRatioMode.KeepAspectRatioByExpanding)
     splash = QSplashScreen(pixmap)
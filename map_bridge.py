@@ -0,0 +1,382 @@
+import itertools
+import json
+
+from PyQt6.QtCore import QObject, QUrl, pyqtSignal, pyqtSlot
+from PyQt6.QtWebChannel import QWebChannel
+
+# The map is a single Leaflet page that stays loaded for the whole session.
+# Python only pushes the layer that changed through runJavaScript, and the page
+# reports back (view changes, drawn shapes) over a QWebChannel, so the view and
+# zoom survive every update and nothing is re-serialized.
+MAP_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8"/>
+<link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/leaflet@1.9.4/dist/leaflet.css"/>
+<link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/leaflet.draw/1.0.4/leaflet.draw.css"/>
+<script src="https://cdn.jsdelivr.net/npm/leaflet@1.9.4/dist/leaflet.js"></script>
+<script src="https://cdnjs.cloudflare.com/ajax/libs/leaflet.draw/1.0.4/leaflet.draw.js"></script>
+<script src="qrc:///qtwebchannel/qwebchannel.js"></script>
+<style>
+html, body, #map { height: 100%; width: 100%; margin: 0; padding: 0; }
+.mapgis-position { background: rgba(255, 255, 255, 0.8); padding: 0 5px; font: 11px monospace; }
+</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var map = L.map('map', {center: [0, 0], zoom: 2, preferCanvas: true});
+L.control.scale().addTo(map);
+
+var position = L.control({position: 'bottomright'});
+position.onAdd = function () {
+    this._div = L.DomUtil.create('div', 'mapgis-position');
+    return this._div;
+};
+position.addTo(map);
+map.on('mousemove', function (e) {
+    position._div.innerHTML = e.latlng.lat.toFixed(5) + ' : ' + e.latlng.lng.toFixed(5);
+});
+
+// Draws a point layer onto canvas tiles. Each tile fetches the pixel
+// positions of its own points from the local tile server, which finds them
+// through the layer's spatial index, so neither the page nor a tile ever
+// handles the whole layer and no per-point Leaflet objects exist.
+var PointLayer = L.GridLayer.extend({
+    initialize: function (spec, options) {
+        L.GridLayer.prototype.initialize.call(this, options);
+        this.spec = spec;
+        this.style = spec.style;
+    },
+
+    setStyle: function (style) {
+        this.style = Object.assign({}, this.style, style);
+        this.redraw();
+    },
+
+    createTile: function (coords, done) {
+        var tile = L.DomUtil.create('canvas', 'leaflet-tile');
+        var size = this.getTileSize();
+        tile.width = size.x;
+        tile.height = size.y;
+        var style = this.style, r = style.radius || 2;
+        var url = L.Util.template(this.spec.url, coords) + '?pad=' + Math.ceil(r + 1);
+        fetch(url)
+            .then(function (response) { return response.status === 204 ? null : response.json(); })
+            .then(function (points) {
+                if (points) { drawPoints(tile.getContext('2d'), points, r, style); }
+                done(null, tile);
+            })
+            .catch(function (error) { done(error, tile); });
+        return tile;
+    }
+});
+
+function drawPoints(ctx, points, r, style) {
+    ctx.beginPath();
+    for (var i = 0; i < points.x.length; i++) {
+        ctx.moveTo(points.x[i] + r, points.y[i]);
+        ctx.arc(points.x[i], points.y[i], r, 0, 2 * Math.PI);
+    }
+    if (style.fill !== false) {
+        ctx.globalAlpha = style.fillOpacity === undefined ? 0.2 : style.fillOpacity;
+        ctx.fillStyle = style.fillColor || style.color || 'black';
+        ctx.fill();
+    }
+    ctx.globalAlpha = style.opacity === undefined ? 1 : style.opacity;
+    ctx.strokeStyle = style.color || 'black';
+    ctx.stroke();
+}
+
+// Vector layer with one simplified GeoJSON level per zoom band. Each view
+// change fetches the current band's features inside a padded view box from the
+// local tile server; moves that stay inside the fetched box cost nothing.
+var LodLayer = L.GeoJSON.extend({
+    initialize: function (spec) {
+        L.GeoJSON.prototype.initialize.call(this, null, {style: function () { return spec.style; }});
+        this.spec = spec;
+        this.band = null;
+        this.fetched = null;
+        this.request = 0;
+    },
+
+    onAdd: function (map) {
+        L.GeoJSON.prototype.onAdd.call(this, map);
+        map.on('moveend', this.refresh, this);
+        this.band = null;
+        this.refresh();
+    },
+
+    onRemove: function (map) {
+        map.off('moveend', this.refresh, this);
+        L.GeoJSON.prototype.onRemove.call(this, map);
+    },
+
+    bandFor: function (zoom) {
+        var bands = this.spec.bands;
+        for (var i = 0; i < bands.length; i++) {
+            if (zoom >= bands[i].minZoom && zoom <= bands[i].maxZoom) { return bands[i].band; }
+        }
+        return bands[bands.length - 1].band;
+    },
+
+    refresh: function () {
+        var band = this.bandFor(this._map.getZoom()), view = this._map.getBounds();
+        if (band === this.band && this.fetched && this.fetched.contains(view)) { return; }
+        var box = view.pad(0.5), self = this, request = ++this.request;
+        var bbox = [box.getWest(), box.getSouth(), box.getEast(), box.getNorth()].join(',');
+        fetch(this.spec.url.replace('{band}', band) + '?bbox=' + bbox)
+            .then(function (response) { return response.json(); })
+            .then(function (data) {
+                if (request !== self.request) { return; }
+                self.band = band;
+                self.fetched = box;
+                self.clearLayers();
+                self.addData(data);
+            });
+    }
+});
+
+function escapeHtml(value) {
+    return String(value).replace(/[&<>"']/g, function (c) {
+        return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+    });
+}
+
+var mapgis = {
+    bridge: null,
+    layers: {},
+    drawn: null,
+    selected: null,
+
+    build: function (spec, data) {
+        if (spec.type === 'tile') {
+            return L.tileLayer(spec.url, spec.options || {});
+        }
+        if (spec.type === 'points') {
+            return new PointLayer(spec);
+        }
+        if (spec.type === 'lod') {
+            return new LodLayer(spec);
+        }
+        return L.geoJSON(data, {style: function () { return spec.style; }});
+    },
+
+    addLayer: function (id, spec, data) {
+        var layer = mapgis.build(spec, data);
+        layer.addTo(map);
+        if (spec.basemap) { layer.bringToBack(); }
+        mapgis.layers[id] = {layer: layer, spec: spec};
+        if (spec.bounds && Object.keys(mapgis.layers).length === 1) {
+            map.fitBounds(spec.bounds);
+        }
+    },
+
+    removeLayer: function (id) {
+        var entry = mapgis.layers[id];
+        if (entry) {
+            map.removeLayer(entry.layer);
+            delete mapgis.layers[id];
+        }
+    },
+
+    setVisible: function (id, visible) {
+        var entry = mapgis.layers[id];
+        if (!entry) { return; }
+        if (!visible) { map.removeLayer(entry.layer); return; }
+        entry.layer.addTo(map);
+        if (entry.spec.basemap) { entry.layer.bringToBack(); }
+    },
+
+    setStyle: function (id, style) {
+        var entry = mapgis.layers[id];
+        if (!entry) { return; }
+        entry.spec.style = style;
+        if (entry.layer.setStyle) { entry.layer.setStyle(style); }
+        if (entry.layer.setUrl && style.url) { entry.layer.setUrl(style.url); }
+        if (entry.layer.setOpacity && style.opacity !== undefined) { entry.layer.setOpacity(style.opacity); }
+    },
+
+    zoomTo: function (id) {
+        var entry = mapgis.layers[id];
+        if (entry && entry.spec.bounds) { map.fitBounds(entry.spec.bounds); }
+    },
+
+    highlight: function (data) {
+        if (mapgis.selected) { map.removeLayer(mapgis.selected); }
+        mapgis.selected = L.geoJSON(data, {
+            style: function () { return {color: 'yellow', weight: 3, fillOpacity: 0.2}; },
+            pointToLayer: function (feature, latlng) {
+                return L.circleMarker(latlng, {radius: 4, color: 'yellow', weight: 2});
+            }
+        }).addTo(map);
+    },
+
+    enableDraw: function () {
+        if (mapgis.drawn) { return; }
+        mapgis.drawn = new L.FeatureGroup().addTo(map);
+        map.addControl(new L.Control.Draw({edit: {featureGroup: mapgis.drawn}}));
+        map.on(L.Draw.Event.CREATED, function (e) {
+            mapgis.drawn.addLayer(e.layer);
+            if (mapgis.bridge) { mapgis.bridge.onShapeDrawn(JSON.stringify(e.layer.toGeoJSON())); }
+        });
+    }
+};
+
+map.on('click', function (e) {
+    if (!mapgis.bridge) { return; }
+    // Identification runs against the layers' spatial indexes in Python,
+    // with a tolerance of a few screen pixels
+    var size = map.getSize(), b = map.getBounds();
+    var tolerance = 4 * (b.getEast() - b.getWest()) / size.x;
+    mapgis.bridge.identifyAt(e.latlng.lng, e.latlng.lat, tolerance, function (text) {
+        var hits = JSON.parse(text);
+        if (!hits.length) { return; }
+        var html = hits.map(function (hit) {
+            var rows = Object.entries(hit.attributes).map(function (kv) {
+                return '<tr><th>' + escapeHtml(kv[0]) + '</th><td>' + escapeHtml(kv[1]) + '</td></tr>';
+            });
+            return '<b>' + escapeHtml(hit.layer) + '</b><table>' + rows.join('') + '</table>';
+        });
+        L.popup().setLatLng(e.latlng).setContent(html.join('')).openOn(map);
+    });
+});
+
+map.on('moveend', function () {
+    if (!mapgis.bridge) { return; }
+    var b = map.getBounds();
+    mapgis.bridge.onViewChanged(b.getWest(), b.getSouth(), b.getEast(), b.getNorth(), map.getZoom());
+});
+
+new QWebChannel(qt.webChannelTransport, function (channel) {
+    mapgis.bridge = channel.objects.bridge;
+    mapgis.bridge.onPageReady();
+});
+</script>
+</body>
+</html>
+"""
+
+
+class MapBridge(QObject):
+    pageReady = pyqtSignal()
+    viewChanged = pyqtSignal(float, float, float, float, int)
+    shapeDrawn = pyqtSignal(dict)
+
+    def __init__(self, manager):
+        super().__init__()
+        self.manager = manager
+
+    @pyqtSlot()
+    def onPageReady(self):
+        self.pageReady.emit()
+
+    @pyqtSlot(float, float, float, float, int)
+    def onViewChanged(self, west, south, east, north, zoom):
+        self.viewChanged.emit(west, south, east, north, zoom)
+
+    @pyqtSlot(str)
+    def onShapeDrawn(self, geojson):
+        self.shapeDrawn.emit(json.loads(geojson))
+
+    @pyqtSlot(float, float, float, result=str)
+    def identifyAt(self, lon, lat, tolerance):
+        return json.dumps(self.manager.identify(lon, lat, tolerance))
+
+
+class LayerManager:
+    def __init__(self, web_view):
+        self.web_view = web_view
+        self.layers = {}
+        self.names = {}
+        self.hidden = set()
+        self._ids = itertools.count(1)
+        self._pending = []
+        self._ready = False
+
+        self.bridge = MapBridge(self)
+        self.bridge.pageReady.connect(self._on_ready)
+        self.channel = QWebChannel(self.web_view.page())
+        self.channel.registerObject("bridge", self.bridge)
+        self.web_view.page().setWebChannel(self.channel)
+        self.web_view.setHtml(MAP_PAGE, QUrl("http://localhost/"))
+
+    def _on_ready(self):
+        self._ready = True
+        for script in self._pending:
+            self.web_view.page().runJavaScript(script)
+        self._pending = []
+
+    def run(self, script):
+        # Commands issued before the page has loaded are replayed once it is ready
+        if self._ready:
+            self.web_view.page().runJavaScript(script)
+        else:
+            self._pending.append(script)
+
+    def add(self, layer, name, spec=None):
+        # spec may be prepared on a worker thread; it is built here otherwise
+        layer_id = f"layer{next(self._ids)}"
+        spec = dict(spec or layer.to_spec())
+        data = spec.pop("data", None)
+        spec["name"] = name
+        self.layers[layer_id] = layer
+        self.names[layer_id] = name
+        self.run(f"mapgis.addLayer({json.dumps(layer_id)}, {json.dumps(spec)}, {data or 'null'});")
+        return layer_id
+
+    def remove(self, layer_id):
+        self.layers.pop(layer_id, None)
+        self.names.pop(layer_id, None)
+        self.hidden.discard(layer_id)
+        self.run(f"mapgis.removeLayer({json.dumps(layer_id)});")
+
+    def set_visible(self, layer_id, visible):
+        if visible:
+            self.hidden.discard(layer_id)
+        else:
+            self.hidden.add(layer_id)
+        self.run(f"mapgis.setVisible({json.dumps(layer_id)}, {json.dumps(bool(visible))});")
+
+    def restyle(self, layer_id, style):
+        self.run(f"mapgis.setStyle({json.dumps(layer_id)}, {json.dumps(style)});")
+
+    def zoom_to(self, layer_id):
+        self.run(f"mapgis.zoomTo({json.dumps(layer_id)});")
+
+    def enable_draw(self):
+        self.run("mapgis.enableDraw();")
+
+    def queryable(self):
+        # Visible layers that carry a spatial index, topmost first
+        for layer_id in reversed(list(self.layers)):
+            layer = self.layers[layer_id]
+            if layer_id not in self.hidden and getattr(layer, "index", None) is not None:
+                yield layer_id, layer
+
+    def identify(self, lon, lat, tolerance):
+        for layer_id, layer in self.queryable():
+            rows = layer.identify(lon, lat, tolerance)
+            if len(rows):
+                return [{"layer": self.names[layer_id], "attributes": json.loads(layer.attributes(rows[0]))}]
+        return []
+
+    def select(self, geometry, max_highlight=10000):
+        """
+        Select the features of every visible indexed layer intersecting geometry.
+
+        Returns {layer_id: row indices} and highlights the selection in the page.
+        """
+        selection = {}
+        highlighted = []
+        for layer_id, layer in self.queryable():
+            rows = layer.select(geometry)
+            if len(rows):
+                selection[layer_id] = rows
+                highlighted.append(json.loads(layer.features_geojson(rows[:max_highlight])))
+        features = [feature for collection in highlighted for feature in collection["features"]]
+        self.highlight({"type": "FeatureCollection", "features": features})
+        return selection
+
+    def highlight(self, geojson):
+        self.run(f"mapgis.highlight({json.dumps(geojson)});")
@@ -0,0 +1,157 @@
+import argparse
+from pathlib import Path
+
+import netCDF4
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import pyogrio
+import shapely
+
+from loaders import Cancelled, _never_cancelled, _noop_progress
+
+# Export a (time, lat, lon) NetCDF variable to a long table of
+# (time, latitude, longitude, value) rows. The file is read a block of time
+# steps at a time, only inside the clip window, and each block is appended to
+# the Parquet/CSV writer straight away, so memory stays at about one block
+# whatever the length of the record. Fill and NaN cells are never written.
+
+CHUNK_CELLS = 4_000_000  # cells per block read
+
+
+def _coordinate(dataset, dim):
+    if dim in dataset.variables:
+        return np.asarray(dataset.variables[dim][:], dtype="float64")
+    return np.arange(len(dataset.dimensions[dim]), dtype="float64")
+
+
+def _times(dataset, dim):
+    # datetime64[s] per time step, or plain step numbers without CF units
+    var = dataset.variables.get(dim)
+    if var is None or not hasattr(var, "units"):
+        return np.arange(len(dataset.dimensions[dim]))
+    dates = netCDF4.num2date(var[:], var.units, getattr(var, "calendar", "standard"), only_use_cftime_datetimes=False)
+    return pd.to_datetime([date.isoformat() for date in np.ravel(dates)]).values.astype("datetime64[s]")
+
+
+def _window(selected):
+    # Smallest slice covering every selected index
+    hits = np.flatnonzero(selected)
+    if len(hits) == 0:
+        return slice(0, 0)
+    return slice(hits[0], hits[-1] + 1)
+
+
+def _writer(output, schema, fmt):
+    if fmt == "csv":
+        return pacsv.CSVWriter(output, schema)
+    return pq.ParquetWriter(output, schema, compression="zstd")
+
+
+def export(nc_path, variable, output, fmt=None, bbox=None, polygon=None, chunk_cells=CHUNK_CELLS,
+           progress=None, cancelled=None):
+    """
+    Stream `variable` of a NetCDF file to a Parquet or CSV table.
+
+    `fmt` defaults to the output suffix. `bbox` is (minx, miny, maxx, maxy)
+    and `polygon` a shapely geometry, both in the file's lon/lat (longitudes
+    over 180 are wrapped to -180..180 first). Returns the number of rows
+    written.
+    """
+    progress = progress or _noop_progress
+    cancelled = cancelled or _never_cancelled
+    fmt = fmt or Path(output).suffix.lstrip(".").lower()
+
+    with netCDF4.Dataset(nc_path) as dataset:
+        var = dataset.variables[variable]
+        if var.ndim != 3:
+            raise ValueError(f"{variable} has dimensions {var.dimensions}, expected (time, lat, lon)")
+        var.set_auto_maskandscale(True)
+        time_dim, lat_dim, lon_dim = var.dimensions
+        times = _times(dataset, time_dim)
+        lats = _coordinate(dataset, lat_dim)
+        lons = _coordinate(dataset, lon_dim)
+        if lons.max() > 180:
+            lons = (lons + 180) % 360 - 180
+
+        if polygon is not None:
+            bounds = polygon.bounds
+            bbox = bounds if bbox is None else (
+                max(bbox[0], bounds[0]), max(bbox[1], bounds[1]), min(bbox[2], bounds[2]), min(bbox[3], bounds[3])
+            )
+        lat_in = np.ones(len(lats), dtype=bool)
+        lon_in = np.ones(len(lons), dtype=bool)
+        if bbox is not None:
+            lat_in = (lats >= bbox[1]) & (lats <= bbox[3])
+            lon_in = (lons >= bbox[0]) & (lons <= bbox[2])
+        rows, cols = _window(lat_in), _window(lon_in)
+
+        # Cells of the read window kept by the clip, computed once
+        lat_grid, lon_grid = np.meshgrid(lats[rows], lons[cols], indexing="ij")
+        keep = lat_in[rows][:, None] & lon_in[cols][None, :]
+        if polygon is not None:
+            shapely.prepare(polygon)
+            keep &= shapely.intersects_xy(polygon, lon_grid, lat_grid)
+
+        # dtype after unpacking scale_factor/add_offset
+        dtype = pa.from_numpy_dtype(var[0:0, 0:0, 0:0].dtype)
+        schema = pa.schema([
+            ("time", pa.from_numpy_dtype(times.dtype)), ("latitude", pa.float64()), ("longitude", pa.float64()), (variable, dtype)
+        ])
+
+        cells = max(keep.size, 1)
+        step = max(1, chunk_cells // cells)
+        written = 0
+        with _writer(output, schema, fmt) as writer:
+            for start in range(0, len(times), step):
+                if cancelled():
+                    raise Cancelled(nc_path)
+                stop = min(start + step, len(times))
+                if keep.any():
+                    block = var[start:stop, rows, cols]
+                    values = np.ma.getdata(block)
+                    valid = ~np.ma.getmaskarray(block) & keep[None]
+                    if values.dtype.kind == "f":
+                        valid &= np.isfinite(values)
+                    t, y, x = np.nonzero(valid)
+                    if len(t):
+                        writer.write_table(pa.table({
+                            "time": times[start:stop][t],
+                            "latitude": lat_grid[y, x],
+                            "longitude": lon_grid[y, x],
+                            variable: values[t, y, x],
+                        }, schema=schema))
+                        written += len(t)
+                progress(stop, len(times))
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a NetCDF variable to a Parquet or CSV table")
+    parser.add_argument("input")
+    parser.add_argument("variable")
+    parser.add_argument("output", help=".parquet or .csv")
+    parser.add_argument("--format", choices=["parquet", "csv"], help="defaults to the output suffix")
+    parser.add_argument("--bbox", nargs=4, type=float, metavar=("MINX", "MINY", "MAXX", "MAXY"))
+    parser.add_argument("--clip", help="vector file whose polygons the export is clipped to")
+    parser.add_argument("--chunk-cells", type=int, default=CHUNK_CELLS)
+    args = parser.parse_args(argv)
+
+    polygon = None
+    if args.clip:
+        shapes = pyogrio.read_dataframe(args.clip)
+        if shapes.crs is not None:
+            shapes = shapes.to_crs(4326)
+        polygon = shapely.union_all(shapes.geometry.values)
+
+    def progress(done, total):
+        print(f"\rexport: {done}/{total} time steps", end="", flush=True)
+
+    rows = export(args.input, args.variable, args.output, args.format, args.bbox, polygon, args.chunk_cells, progress)
+    print(f"\n{rows} rows written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
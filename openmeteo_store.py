@@ -0,0 +1,157 @@
+import datetime as dt
+from pathlib import Path
+
+import openmeteo_requests
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import requests
+from retry_requests import retry
+
+# Local store of Open-Meteo daily archives. Data lives in Parquet files
+# partitioned by variable and location (<root>/variable=<v>/location=<id>/),
+# each holding (date, value) sorted by date. A fetch only asks the API for the
+# dates a location is missing, many coordinates per request, so a rerun over
+# an up-to-date store makes no request at all and loading is a local read.
+
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+BATCH_SIZE = 50  # coordinates per request
+SCHEMA = pa.schema([("date", pa.date32()), ("value", pa.float32())])
+
+
+def location_id(lat, lon):
+    return f"{lat:.4f}_{lon:.4f}"
+
+
+def _partition(root, variable, loc_id):
+    return Path(root) / f"variable={variable}" / f"location={loc_id}" / "data.parquet"
+
+
+def _coverage(path):
+    # (first date, last date) already stored in a partition file, or None
+    if not path.exists():
+        return None
+    dates = pq.read_table(path, columns=["date"]).column("date")
+    if len(dates) == 0:
+        return None
+    return dates[0].as_py(), dates[-1].as_py()
+
+
+def missing_ranges(root, lat, lon, variables, start, end):
+    """
+    Date ranges still needed for one location, merged across variables.
+
+    A store only ever grows at its ends, so at most one range before and one
+    after the stored coverage are returned.
+    """
+    loc_id = location_id(lat, lon)
+    head_end, tail_start = None, None
+    for variable in variables:
+        coverage = _coverage(_partition(root, variable, loc_id))
+        if coverage is None:
+            return [(start, end)]
+        first, last = coverage
+        if start < first:
+            head_end = max(head_end or first, first)
+        if end > last:
+            tail_start = min(tail_start or last, last)
+    ranges = []
+    if head_end is not None:
+        ranges.append((start, head_end - dt.timedelta(days=1)))
+    if tail_start is not None:
+        ranges.append((tail_start + dt.timedelta(days=1), end))
+    return ranges
+
+
+def _client(retries=5, backoff_factor=0.2):
+    return openmeteo_requests.Client(session=retry(requests.Session(), retries=retries, backoff_factor=backoff_factor))
+
+
+def _write(root, variable, loc_id, dates, values):
+    path = _partition(root, variable, loc_id)
+    table = pa.table({"date": pa.array(dates, pa.date32()), "value": pa.array(values, pa.float32())}, schema=SCHEMA)
+    if path.exists():
+        table = pa.concat_tables([pq.read_table(path, schema=SCHEMA), table])
+        frame = table.to_pandas().drop_duplicates("date", keep="last").sort_values("date")
+        table = pa.Table.from_pandas(frame, schema=SCHEMA, preserve_index=False)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(table, path, compression="zstd")
+
+
+def fetch(root, points, variables, start, end, batch_size=BATCH_SIZE, client=None, url=ARCHIVE_URL):
+    """
+    Bring the store up to date for points over [start, end].
+
+    points is a sequence of (lat, lon). Points missing the same date range are
+    requested together, batch_size coordinates per call. Returns the number of
+    API calls made.
+    """
+    start, end = pd.Timestamp(start).date(), pd.Timestamp(end).date()
+    client = client or _client()
+
+    needed = {}
+    for lat, lon in points:
+        for date_range in missing_ranges(root, lat, lon, variables, start, end):
+            needed.setdefault(date_range, []).append((lat, lon))
+
+    calls = 0
+    for (range_start, range_end), group in needed.items():
+        for i in range(0, len(group), batch_size):
+            batch = group[i:i + batch_size]
+            params = {
+                "latitude": [lat for lat, _ in batch],
+                "longitude": [lon for _, lon in batch],
+                "start_date": range_start.isoformat(),
+                "end_date": range_end.isoformat(),
+                "daily": list(variables),
+            }
+            responses = client.weather_api(url, params=params)
+            calls += 1
+            # Responses come back in request order, one per coordinate
+            for (lat, lon), response in zip(batch, responses):
+                daily = response.Daily()
+                dates = pd.date_range(
+                    start=pd.to_datetime(daily.Time(), unit="s", utc=True),
+                    end=pd.to_datetime(daily.TimeEnd(), unit="s", utc=True),
+                    freq=pd.Timedelta(seconds=daily.Interval()),
+                    inclusive="left"
+                ).date
+                for k, variable in enumerate(variables):
+                    _write(root, variable, location_id(lat, lon), dates, daily.Variables(k).ValuesAsNumpy())
+    return calls
+
+
+def load(root, variables=None, points=None, start=None, end=None):
+    """
+    Read the store as a long table (variable, location, date, value).
+
+    Filters are pushed down to the partition and row-group level, so only the
+    requested variables and locations are opened.
+    """
+    dataset = ds.dataset(root, format="parquet", partitioning="hive", schema=pa.schema([
+        ("date", pa.date32()), ("value", pa.float32()), ("variable", pa.string()), ("location", pa.string())
+    ]))
+    expr = None
+
+    def both(a, b):
+        return b if a is None else a & b
+
+    if variables is not None:
+        expr = both(expr, ds.field("variable").isin(list(variables)))
+    if points is not None:
+        expr = both(expr, ds.field("location").isin([location_id(lat, lon) for lat, lon in points]))
+    if start is not None:
+        expr = both(expr, ds.field("date") >= pd.Timestamp(start).date())
+    if end is not None:
+        expr = both(expr, ds.field("date") <= pd.Timestamp(end).date())
+
+    frame = dataset.to_table(filter=expr).to_pandas()
+    frame["date"] = pd.to_datetime(frame["date"])
+    return frame[["variable", "location", "date", "value"]].sort_values(["variable", "location", "date"], ignore_index=True)
+
+
+def load_wide(root, variable, points=None, start=None, end=None):
+    # date x location table of one variable
+    frame = load(root, [variable], points, start, end)
+    return frame.pivot(index="date", columns="location", values="value")
@@ -0,0 +1,441 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path, PureWindowsPath
+
+import folium
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pyogrio
+import rasterio
+import rasterio.shutil
+import xarray as xr
+import yaml
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import calculate_default_transform
+
+import drought
+import geoprocessing
+import spei
+import spi
+import trend
+import zonal
+from geoprocessing import default_workers
+from loaders import Cancelled, _never_cancelled, _noop_progress
+from raster_style import RasterStyle
+from tiles import WGS84
+
+# Headless runner for declarative pipelines (YAML or JSON):
+#
+#   steps:
+#     states: {op: load, path: data/states.shp}
+#     rain: {op: load, path: data\cdf\chirps.nc}
+#     spi: {op: spi, input: rain, variable: precip, scales: [3, 12]}
+#     stats: {op: zonal, input: rain, zones: states}
+#     out: {op: export, input: stats, path: out/stats.csv}
+#   map: {path: out/map.html, layers: [states]}
+#
+# Steps name their inputs in the REFERENCES parameters, which makes the spec a
+# DAG. Every step's result is written to the cache directory under a key
+# hashing its operation, parameters, the keys of its inputs and the content of
+# the files it reads, so an unchanged step is never recomputed, and results are
+# handed between worker processes as those files. Independent steps run in a
+# process pool as soon as their inputs are ready.
+
+CACHE_DIR = Path(os.environ.get("MAPGIS_CACHE", Path.home() / ".mapgis")) / "pipeline"
+REFERENCES = ("input", "zones", "mask", "other", "pet")
+VECTOR_SUFFIXES = (".shp", ".gpkg", ".geojson", ".fgb")
+CUBE_SUFFIXES = (".nc", ".zarr")
+VERSION = 1  # bump to invalidate every cached result
+HASH_BLOCK = 2 ** 20  # bytes read at a time when hashing inputs
+
+
+def _path(path):
+    # Specs written on Windows use backslashes
+    return Path(*PureWindowsPath(path).parts) if "\\" in str(path) else Path(path)
+
+
+def _files(path):
+    # A shapefile is read with its sidecars, a Zarr store is a directory
+    path = Path(path)
+    if path.is_dir():
+        return sorted(p for p in path.rglob("*") if p.is_file())
+    if path.suffix.lower() == ".shp":
+        return sorted(p for p in path.parent.glob(path.stem + ".*") if p.is_file())
+    return [path]
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    for file in _files(path):
+        digest.update(file.name.encode())
+        content = hashlib.sha256()
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                content.update(block)
+        digest.update(content.digest())
+    return digest.hexdigest()
+
+
+def load_output(path):
+    """
+    A step result from its file: vectors as GeoDataFrames, tables as
+    DataFrames and cubes as lazily opened Datasets. Rasters stay paths.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".parquet":
+        if b"geo" in (pq.read_schema(path).metadata or {}):
+            return gpd.read_parquet(path)
+        return pd.read_parquet(path)
+    if suffix in VECTOR_SUFFIXES:
+        return pyogrio.read_dataframe(path)
+    if suffix == ".zarr":
+        return xr.open_zarr(path)
+    if suffix == ".nc":
+        return xr.open_dataset(path, chunks={})
+    if suffix == ".csv":
+        return pd.read_csv(path)
+    return str(path)
+
+
+def _save(value, stem):
+    # Write a step's value next to its cache key; returns the file
+    if isinstance(value, (str, Path)):
+        return str(value)
+    if isinstance(value, gpd.GeoDataFrame):
+        path = stem.with_suffix(".parquet")
+        value.to_parquet(path)
+    elif isinstance(value, pd.DataFrame):
+        path = stem.with_suffix(".parquet")
+        value.to_parquet(path, index=False)
+    elif isinstance(value, (xr.Dataset, xr.DataArray)):
+        path = stem.with_suffix(".nc")
+        value = value.to_dataset(name=value.name or "value") if isinstance(value, xr.DataArray) else value
+        value.to_netcdf(path)
+    else:
+        raise TypeError(f"Cannot cache a {type(value).__name__}")
+    return str(path)
+
+
+def _cube(value, variable=None):
+    # DataArray from a Dataset or a NetCDF/Zarr path
+    if isinstance(value, str):
+        value = load_output(value)
+    if isinstance(value, xr.Dataset):
+        value = value[variable or next(iter(value.data_vars))]
+    return value
+
+
+def _load(inputs, params, stem):
+    path = _path(params["path"])
+    if path.suffix.lower() in VECTOR_SUFFIXES:
+        return pyogrio.read_dataframe(path)
+    return str(path.resolve())
+
+
+def _reproject(inputs, params, stem):
+    crs = CRS.from_user_input(params["crs"])
+    data = inputs["input"]
+    if isinstance(data, gpd.GeoDataFrame):
+        return data.to_crs(crs)
+    # Rasters are warped to a tiled GeoTIFF in the cache
+    output = stem.with_suffix(".tif")
+    with rasterio.open(data) as src:
+        transform, width, height = calculate_default_transform(
+            src.crs or WGS84, crs, src.width, src.height, *src.bounds, resolution=params.get("resolution")
+        )
+        resampling = Resampling[params.get("resampling", "bilinear")]
+        with WarpedVRT(src, crs=crs, transform=transform, width=width, height=height, resampling=resampling) as vrt:
+            rasterio.shutil.copy(vrt, output, driver="GTiff", tiled=True, compress="deflate", bigtiff="if_safer")
+    return output
+
+
+def _buffer(inputs, params, stem):
+    return geoprocessing.buffer(inputs["input"], params["distance"], workers=params.get("workers", 1))
+
+
+def _union(inputs, params, stem):
+    return geoprocessing.union(inputs["input"], by=params.get("by"), workers=params.get("workers", 1))
+
+
+def _clip(inputs, params, stem):
+    data, mask = inputs["input"], inputs["mask"]
+    if isinstance(data, str):
+        return geoprocessing.clip_raster(data, mask, stem.with_suffix(".tif"))
+    return geoprocessing.clip(data, mask, workers=params.get("workers", 1))
+
+
+def _intersect(inputs, params, stem):
+    return geoprocessing.intersect(inputs["input"], inputs["other"], workers=params.get("workers", 1))
+
+
+def _zonal(inputs, params, stem):
+    source = inputs["input"]
+    if isinstance(source, xr.Dataset) or str(source).lower().endswith(CUBE_SUFFIXES):
+        source = _cube(source, params.get("variable"))
+    table = zonal.zonal_stats(
+        source, inputs["zones"], params.get("stats", zonal.STATS), params.get("percentiles", ()),
+        params.get("all_touched", False), params.get("workers", 1)
+    )
+    return zonal.join_zones(inputs["zones"], table) if params.get("join") else table
+
+
+def _spi(inputs, params, stem):
+    return spi.spi(
+        _cube(inputs["input"], params.get("variable")), params.get("scales", spi.SCALES),
+        params.get("time_dim", "time"), params.get("calibration")
+    )
+
+
+def _spei(inputs, params, stem):
+    return spei.spei(
+        _cube(inputs["input"], params.get("variable")), _cube(inputs["pet"], params.get("pet_variable")),
+        params.get("scales", spi.SCALES), params.get("time_dim", "time"), params.get("calibration")
+    )
+
+
+def _trend(inputs, params, stem):
+    return trend.mann_kendall(
+        _cube(inputs["input"], params.get("variable")), params.get("time_dim", "time"), params.get("alpha", 0.05)
+    )
+
+
+def _drought(inputs, params, stem):
+    return drought.drought_events(
+        _cube(inputs["input"], params.get("variable")), params.get("threshold", drought.THRESHOLDS[0]),
+        params.get("time_dim", "time"), params.get("min_duration", 1)
+    )
+
+
+def _export(inputs, params, stem):
+    value, path = inputs["input"], _path(params["path"])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    suffix = path.suffix.lower()
+    if isinstance(value, str):
+        if Path(value).is_dir():
+            shutil.copytree(value, path, dirs_exist_ok=True)
+        else:
+            shutil.copyfile(value, path)
+    elif suffix in VECTOR_SUFFIXES:
+        pyogrio.write_dataframe(value, path)
+    elif suffix == ".csv":
+        value.to_csv(path, index=False)
+    elif suffix == ".parquet":
+        value.to_parquet(path)
+    elif suffix == ".zarr":
+        value.to_zarr(path, mode="w")
+    else:
+        value.to_netcdf(path)
+    return str(path.resolve())
+
+
+OPERATIONS = {
+    "load": _load,
+    "reproject": _reproject,
+    "buffer": _buffer,
+    "union": _union,
+    "clip": _clip,
+    "intersect": _intersect,
+    "zonal": _zonal,
+    "spi": _spi,
+    "spei": _spei,
+    "trend": _trend,
+    "drought": _drought,
+    "export": _export,
+}
+UNCACHED = {"export"}  # always rerun: they write outside the cache
+
+
+def load_spec(path):
+    with open(path) as f:
+        return json.load(f) if str(path).endswith(".json") else yaml.safe_load(f)
+
+
+def _order(steps):
+    # Steps in dependency order; raises on unknown references and cycles
+    order, state = [], {}
+
+    def visit(name, trail):
+        if name not in steps:
+            raise ValueError(f"Unknown step {name!r}" + (f" referenced by {trail[-1]!r}" if trail else ""))
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError(f"Cycle through {' -> '.join(trail + [name])}")
+        state[name] = "visiting"
+        for dependency in _dependencies(steps[name]).values():
+            visit(dependency, trail + [name])
+        state[name] = "done"
+        order.append(name)
+
+    for name in steps:
+        visit(name, [])
+    return order
+
+
+def _dependencies(step):
+    return {key: step[key] for key in REFERENCES if key in step}
+
+
+def step_keys(steps):
+    """
+    Cache key of every step: a hash of its operation and parameters, the keys
+    of the steps it reads and the content of the files it loads.
+    """
+    keys = {}
+    for name in _order(steps):
+        step = steps[name]
+        if step.get("op") not in OPERATIONS:
+            raise ValueError(f"Step {name!r}: unknown op {step.get('op')!r}")
+        params = {key: value for key, value in step.items() if key not in REFERENCES}
+        ident = {
+            "version": VERSION,
+            "params": params,
+            "inputs": {key: keys[dependency] for key, dependency in _dependencies(step).items()},
+        }
+        if step["op"] == "load":
+            ident["file"] = file_digest(_path(step["path"]))
+        keys[name] = hashlib.sha256(json.dumps(ident, sort_keys=True, default=str).encode()).hexdigest()[:24]
+    return keys
+
+
+def _execute(op, params, input_files, stem):
+    # Runs in a worker process: inputs come from and the result goes to files
+    inputs = {key: load_output(path) for key, path in input_files.items()}
+    output = _save(OPERATIONS[op](inputs, params, Path(stem)), Path(stem))
+    if op not in UNCACHED:
+        Path(f"{stem}.json").write_text(json.dumps({"output": output}))
+    return output
+
+
+def _cached(stem):
+    meta = Path(f"{stem}.json")
+    if not meta.exists():
+        return None
+    output = json.loads(meta.read_text())["output"]
+    return output if os.path.exists(output) else None
+
+
+def run_pipeline(spec, cache_dir=None, workers=None, force=False, progress=None, cancelled=None, log=None):
+    """
+    Run a pipeline spec (a dict, or a YAML/JSON path). Returns {step: output
+    file}; load_output() turns one into its value. `force` ignores cached
+    results.
+    """
+    progress = progress or _noop_progress
+    cancelled = cancelled or _never_cancelled
+    log = log or (lambda message: None)
+    if not isinstance(spec, dict):
+        spec = load_spec(spec)
+    steps = spec["steps"]
+    cache_dir = Path(cache_dir or spec.get("cache") or CACHE_DIR)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    keys = step_keys(steps)
+    stems = {name: cache_dir / f"{name}-{key}" for name, key in keys.items()}
+
+    outputs, running = {}, {}
+    pending = _order(steps)
+    executor = ProcessPoolExecutor(max_workers=workers or spec.get("workers") or default_workers())
+    try:
+        while pending or running:
+            for name in list(pending):
+                step = steps[name]
+                dependencies = _dependencies(step)
+                if any(dependency not in outputs for dependency in dependencies.values()):
+                    continue
+                pending.remove(name)
+                cached = None if force or step["op"] in UNCACHED else _cached(stems[name])
+                if cached:
+                    outputs[name] = cached
+                    log(f"{name}: cached")
+                    progress(len(outputs), len(steps))
+                    continue
+                params = {key: value for key, value in step.items() if key not in REFERENCES}
+                inputs = {key: outputs[dependency] for key, dependency in dependencies.items()}
+                running[executor.submit(_execute, step["op"], params, inputs, str(stems[name]))] = name
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            if cancelled():
+                raise Cancelled("pipeline")
+            for future in done:
+                name = running.pop(future)
+                try:
+                    outputs[name] = future.result()
+                except Exception as error:
+                    raise RuntimeError(f"Step {name!r} ({steps[name]['op']}) failed: {error}") from error
+                log(f"{name}: done")
+                progress(len(outputs), len(steps))
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    if spec.get("map"):
+        render_map(spec["map"], outputs)
+    return outputs
+
+
+def _raster_overlay(path, colormap="viridis", max_size=1024):
+    # Downsampled RGBA of a raster in lon/lat, for a self-contained HTML map
+    with rasterio.open(path) as src, WarpedVRT(src, crs=WGS84, resampling=Resampling.average) as vrt:
+        scale = max(1, max(vrt.width, vrt.height) / max_size)
+        shape = (max(1, int(vrt.height / scale)), max(1, int(vrt.width / scale)))
+        data = vrt.read(1, out_shape=shape, masked=True).astype("float64")
+        bounds = vrt.bounds
+    values = data.compressed()
+    style = RasterStyle(*(np.percentile(values, [2, 98]) if values.size else (0.0, 1.0)), colormap=colormap)
+    rgba = np.moveaxis(style.apply(data.filled(np.nan), np.ma.getmaskarray(data)), 0, -1)
+    return rgba, [[bounds.bottom, bounds.left], [bounds.top, bounds.right]]
+
+
+def render_map(spec, outputs):
+    """
+    Static HTML map of step results: {"path": ..., "layers": [step, ...],
+    "colormap": ...}. Vectors become GeoJSON, rasters image overlays.
+    """
+    folium_map = folium.Map(tiles="OpenStreetMap")
+    bounds = []
+    for name in spec.get("layers", []):
+        value = load_output(outputs[name])
+        if isinstance(value, gpd.GeoDataFrame):
+            value = value.to_crs(WGS84)
+            folium.GeoJson(value, name=name).add_to(folium_map)
+            minx, miny, maxx, maxy = value.total_bounds
+            bounds.append([[miny, minx], [maxy, maxx]])
+        elif isinstance(value, str) and value.lower().endswith((".tif", ".tiff")):
+            image, extent = _raster_overlay(value, spec.get("colormap", "viridis"))
+            folium.raster_layers.ImageOverlay(image, extent, name=name, opacity=0.7, mercator_project=True).add_to(folium_map)
+            bounds.append(extent)
+    if bounds:
+        corners = np.array(bounds).reshape(-1, 2)
+        folium_map.fit_bounds([corners.min(axis=0).tolist(), corners.max(axis=0).tolist()])
+    folium.LayerControl().add_to(folium_map)
+    path = _path(spec["path"])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    folium_map.save(str(path))
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a MapGIS pipeline spec (YAML or JSON) headless")
+    parser.add_argument("spec")
+    parser.add_argument("--cache", help=f"cache directory (default {CACHE_DIR})")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="recompute every step")
+    args = parser.parse_args(argv)
+
+    outputs = run_pipeline(args.spec, args.cache, args.workers, args.force, log=print)
+    for name, output in outputs.items():
+        print(f"{name}: {output}")
+
+
+if __name__ == "__main__":
+    main()
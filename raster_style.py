@@ -0,0 +1,72 @@
+import numpy as np
+
+# Colouring of raster tiles. A style turns a float tile into RGBA through a
+# lookup table built once per style: stretched values index a 256-entry colour
+# ramp, classified values index one colour per class. Masked (nodata) pixels
+# are transparent. Changing a style only swaps the table; the tiles it is
+# applied to come from the tile source's cache of warped values.
+
+# Colour stops of the built-in ramps; other names are looked up in matplotlib
+# when it is installed
+RAMPS = {
+    "grey": ["#000000", "#ffffff"],
+    "viridis": ["#440154", "#3b528b", "#21918c", "#5ec962", "#fde725"],
+    "blues": ["#f7fbff", "#6baed6", "#08306b"],
+    "jet": ["#00007f", "#0000ff", "#00ffff", "#7fff7f", "#ffff00", "#ff0000", "#7f0000"],
+    "rdylbu": ["#d73027", "#fc8d59", "#fee090", "#e0f3f8", "#91bfdb", "#4575b4"],
+}
+
+
+def _rgb(color):
+    color = color.lstrip("#")
+    return [int(color[i:i + 2], 16) for i in (0, 2, 4)]
+
+
+def colormap(name, n=256):
+    # (n, 4) uint8 RGBA table sampled evenly along a ramp
+    if name in RAMPS:
+        stops = np.array([_rgb(color) for color in RAMPS[name]], dtype="float64")
+        positions = np.linspace(0, 1, len(stops))
+        samples = np.linspace(0, 1, n)
+        rgb = np.column_stack([np.interp(samples, positions, stops[:, k]) for k in range(3)])
+        return np.column_stack([np.rint(rgb), np.full(n, 255)]).astype("uint8")
+    try:
+        from matplotlib import colormaps
+    except ImportError:
+        raise ValueError(f"Unknown colormap {name!r}") from None
+    return (colormaps[name].resampled(n)(np.arange(n)) * 255).round().astype("uint8")
+
+
+class RasterStyle:
+    def __init__(self, vmin=0.0, vmax=1.0, colormap="grey", breaks=None, colors=None):
+        """
+        Linear stretch of [vmin, vmax] over `colormap`, or, when `breaks` is
+        given, classes split at those values coloured with `colors` (hex
+        strings, one more than breaks) or evenly from `colormap`.
+        """
+        self.vmin = vmin
+        self.vmax = vmax
+        self.colormap = colormap
+        self.breaks = None if breaks is None else np.asarray(breaks, dtype="float64")
+        self.colors = colors
+        self.lut = self._lut()
+
+    def _lut(self):
+        if self.breaks is None:
+            return colormap(self.colormap)
+        if self.colors is not None:
+            return np.array([_rgb(color) + [255] for color in self.colors], dtype="uint8")
+        return colormap(self.colormap, len(self.breaks) + 1)
+
+    def indices(self, data):
+        if self.breaks is not None:
+            return np.digitize(data, self.breaks)
+        span = (self.vmax - self.vmin) or 1.0
+        scaled = (np.nan_to_num(data, nan=self.vmin) - self.vmin) * ((len(self.lut) - 1) / span)
+        return np.clip(np.rint(scaled), 0, len(self.lut) - 1).astype("intp")
+
+    def apply(self, data, mask):
+        # (4, height, width) uint8 RGBA for a float array and its nodata mask
+        rgba = self.lut[self.indices(data)]
+        rgba[..., 3] = np.where(mask, 0, rgba[..., 3])
+        return np.moveaxis(rgba, -1, 0)
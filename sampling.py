@@ -0,0 +1,146 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import rasterio
+import shapely
+import xarray as xr
+from rasterio.windows import Window
+
+from datacube import DataCube
+from loaders import Cancelled, _never_cancelled, _noop_progress
+from locations import NIGERIA_STATES
+from tiles import WGS84
+
+# Raster values at point locations, as a points x time table. Point coordinates
+# become fractional pixel positions in one vectorized step; GeoTIFFs are then
+# read only in the blocks that contain a point, and xarray cubes through a
+# vectorized isel, so a lazily opened (dask/Zarr) cube only loads the chunks
+# under the points. Values are taken from the nearest pixel or interpolated
+# bilinearly from the four around the point.
+
+METHODS = ("nearest", "bilinear")
+
+
+def locations_frame(locations=NIGERIA_STATES):
+    # The polling locations as a point GeoDataFrame indexed by state
+    names = [location["state"].strip() for location in locations]
+    return gpd.GeoDataFrame(
+        index=pd.Index(names, name="state"),
+        geometry=gpd.points_from_xy([location["lon"] for location in locations], [location["lat"] for location in locations]),
+        crs=4326,
+    )
+
+
+def _taps(position, size, method):
+    """
+    Pixel indices and weights for fractional positions (pixel centres at
+    whole numbers) along one axis. Returns [(index, weight), ...] and a
+    validity mask for points outside the grid.
+    """
+    valid = (position >= -0.5) & (position <= size - 0.5)
+    if method == "nearest":
+        return [(np.clip(np.floor(position + 0.5), 0, size - 1).astype(int), np.ones(len(position)))], valid
+    lower = np.clip(np.floor(position), 0, max(size - 2, 0)).astype(int)
+    weight = np.clip(position - lower, 0.0, 1.0)
+    upper = np.minimum(lower + 1, size - 1)
+    return [(lower, 1 - weight), (upper, weight)], valid
+
+
+def _xy(points, crs):
+    if points.crs is not None and crs is not None:
+        points = points.to_crs(crs)
+    return shapely.get_x(points.geometry.values), shapely.get_y(points.geometry.values)
+
+
+def sample_raster(file_path, points, bands=None, method="nearest", progress=None, cancelled=None):
+    """
+    Values of a GeoTIFF at points, shape (points, bands).
+
+    Only the internal blocks containing a point (or one of its bilinear
+    neighbours) are read. Nodata is NaN; a raster without a CRS is taken as
+    WGS84.
+    """
+    progress = progress or _noop_progress
+    cancelled = cancelled or _never_cancelled
+    with rasterio.open(file_path) as src:
+        bands = list(bands or range(1, src.count + 1))
+        xs, ys = _xy(points, src.crs or WGS84)
+        cols, rows = ~src.transform * (xs, ys)
+        row_taps, valid_rows = _taps(rows - 0.5, src.height, method)
+        col_taps, valid_cols = _taps(cols - 0.5, src.width, method)
+        valid = valid_rows & valid_cols
+        taps = [(r, c, row_weight * col_weight) for r, row_weight in row_taps for c, col_weight in col_taps]
+
+        # Every pixel a tap needs, grouped by the internal block it lives in
+        tap_rows = np.concatenate([r for r, _, _ in taps])
+        tap_cols = np.concatenate([c for _, c, _ in taps])
+        block_height, block_width = src.block_shapes[bands[0] - 1]
+        block_cols = -(-src.width // block_width)
+        keys = (tap_rows // block_height) * block_cols + tap_cols // block_width
+        needed = np.flatnonzero(np.tile(valid, len(taps)))
+        order = needed[np.argsort(keys[needed], kind="stable")]
+        block_keys, starts = np.unique(keys[order], return_index=True)
+
+        pixels = np.full((len(bands), len(tap_rows)), np.nan)
+        full = Window(0, 0, src.width, src.height)
+        for done, (key, group) in enumerate(zip(block_keys, np.split(order, starts[1:])), start=1):
+            if cancelled():
+                raise Cancelled(file_path)
+            block_row, block_col = divmod(int(key), block_cols)
+            window = Window(block_col * block_width, block_row * block_height, block_width, block_height).intersection(full)
+            data = src.read(bands, window=window, masked=True).astype("float64").filled(np.nan)
+            pixels[:, group] = data[:, tap_rows[group] - window.row_off, tap_cols[group] - window.col_off]
+            progress(done, len(block_keys))
+
+    total = sum(pixels[:, k * len(valid):(k + 1) * len(valid)] * weight for k, (_, _, weight) in enumerate(taps))
+    return np.where(valid, total, np.nan).T
+
+
+def _positions(coord, values):
+    # Fractional index of values along a regular, possibly descending axis
+    coord = np.asarray(coord, dtype="float64")
+    if len(coord) == 1:
+        return np.zeros(len(values))
+    return (values - coord[0]) / ((coord[-1] - coord[0]) / (len(coord) - 1))
+
+
+def sample_cube(data, points, method="nearest", lat="lat", lon="lon"):
+    """
+    Values of a (..., lat, lon) DataArray at points, as a DataArray with the
+    spatial dimensions replaced by "point". Coordinates are lon/lat.
+    """
+    xs, ys = _xy(points, WGS84)
+    row_taps, valid_rows = _taps(_positions(data[lat].values, ys), data.sizes[lat], method)
+    col_taps, valid_cols = _taps(_positions(data[lon].values, xs), data.sizes[lon], method)
+    valid = xr.DataArray(valid_rows & valid_cols, dims="point")
+
+    total = 0.0
+    for rows, row_weight in row_taps:
+        for cols, col_weight in col_taps:
+            picked = data.isel({lat: xr.DataArray(rows, dims="point"), lon: xr.DataArray(cols, dims="point")})
+            total = total + picked * xr.DataArray(row_weight * col_weight, dims="point")
+    return total.where(valid).drop_vars([lat, lon], errors="ignore").assign_coords(point=points.index.values)
+
+
+def sample(source, points, method="nearest", variable=None, **kwargs):
+    """
+    Points x time table of `source` sampled at `points` (a GeoDataFrame).
+
+    `source` is a GeoTIFF path (one column per band), a DataArray or Dataset
+    with lat/lon dimensions, or a DataCube.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    if isinstance(source, DataCube):
+        # Whole records at scattered points: the time-series layout reads least
+        layouts = source.layouts
+        source = layouts["series"] if "series" in layouts else next(iter(layouts.values()))
+    if isinstance(source, xr.Dataset):
+        source = source[variable or next(iter(source.data_vars))]
+    if isinstance(source, xr.DataArray):
+        values = sample_cube(source, points, method, **kwargs).transpose("point", ...)
+        columns = source["time"].values if "time" in values.dims else [source.name]
+        return pd.DataFrame(values.values.reshape(len(points), -1), index=points.index, columns=columns)
+
+    values = sample_raster(source, points, method=method, **kwargs)
+    return pd.DataFrame(values, index=points.index, columns=[f"band{band}" for band in range(1, values.shape[1] + 1)])
@@ -0,0 +1,31 @@
+import numpy as np
+import shapely
+from shapely import STRtree
+
+# STRtree over a layer's geometries, built once when the layer loads. Query
+# results are positional row indices into the indexed geometry array, sorted.
+
+
+class SpatialIndex:
+    def __init__(self, geometries):
+        self.geometries = np.asarray(geometries)
+        self.tree = STRtree(self.geometries)
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def query_bbox(self, minx, miny, maxx, maxy):
+        return np.sort(self.tree.query(shapely.box(minx, miny, maxx, maxy)))
+
+    def identify(self, x, y, tolerance=0.0):
+        point = shapely.Point(x, y)
+        candidates = self.tree.query(point.buffer(tolerance) if tolerance else point)
+        hits = candidates[shapely.dwithin(self.geometries[candidates], point, tolerance)]
+        if len(hits) == 0:
+            return hits
+        # Closest first, so a click on overlapping features reports the nearest one
+        order = np.argsort(shapely.distance(self.geometries[hits], point), kind="stable")
+        return hits[order]
+
+    def select(self, geometry, predicate="intersects"):
+        return np.sort(self.tree.query(geometry, predicate=predicate))
@@ -0,0 +1,104 @@
+import numpy as np
+from scipy.special import ndtri
+
+from spi import PERIOD, SCALES, SPI_LIMIT, by_period, from_period, index_dataset, rolling_sums
+
+# Standardized Precipitation-Evapotranspiration Index. The climatic water
+# balance D = P - PET is accumulated over every scale from the same cumulative
+# sums as the SPI, and a log-logistic distribution is fitted to it per pixel and
+# calendar month from unbiased probability-weighted moments. The fit uses the
+# generalized-logistic form (shape k = -1/beta, as lmom's pelglo and the R SPEI
+# package), which covers samples skewed either way: negative skew gives an
+# upper-bounded distribution rather than a failed fit. Fits are reductions over
+# the sorted (..., years, 12) view, so all pixels and months are fitted at once.
+
+MIN_SAMPLES = 4
+SMALL_SHAPE = 1e-6  # |k| below this is fitted as the plain logistic
+
+
+def pwm(samples, axis=-2):
+    """
+    Unbiased probability-weighted moments w0, w1, w2 (alpha_s = E[x (1-F)^s])
+    along `axis`, ignoring NaN, plus the number of samples.
+    """
+    ordered = np.sort(np.moveaxis(samples, axis, -1), axis=-1)  # NaN last
+    n = (~np.isnan(ordered)).sum(axis=-1, keepdims=True).astype("float64")
+    i = np.arange(1, ordered.shape[-1] + 1)
+    x = np.nan_to_num(ordered)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w1 = np.clip(n - i, 0, None) / (n - 1)
+        w2 = w1 * np.clip(n - i - 1, 0, None) / (n - 2)
+        moments = [(x * weight).sum(axis=-1) / n[..., 0] for weight in (1.0, w1, w2)]
+    return moments, n[..., 0]
+
+
+def glo_params(samples, axis=-2):
+    """
+    Generalized logistic (location xi, scale alpha, shape k) per fit from the
+    sample L-moments; NaN where the fit fails. k < 0 is the log-logistic of
+    Vicente-Serrano et al. with beta = -1/k, k > 0 its mirror image.
+    """
+    (w0, w1, w2), n = pwm(samples, axis)
+    l1 = w0
+    l2 = w0 - 2 * w1
+    l3 = w0 - 6 * w1 + 6 * w2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        k = -l3 / l2
+        small = np.abs(k) < SMALL_SHAPE
+        kpi = np.where(small, 1.0, k * np.pi)
+        alpha = np.where(small, l2, l2 * np.sin(kpi) / kpi)
+        xi = np.where(small, l1, l1 - alpha * (1 / np.where(small, 1.0, k) - np.pi / np.sin(kpi)))
+    k = np.where(small, 0.0, k)
+    bad = (n < MIN_SAMPLES) | ~(alpha > 0) | ~(np.abs(k) < 1)
+    return np.where(bad, np.nan, xi), np.where(bad, np.nan, alpha), np.where(bad, np.nan, k)
+
+
+def glo_cdf(x, xi, alpha, k):
+    """
+    Generalized logistic CDF. Beyond the bound xi + alpha / k (below it for
+    k < 0, above it for k > 0) the probability is 0 or 1.
+    """
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        z = (x - xi) / alpha
+        arg = 1 - k * z
+        safe_k = np.where(k == 0, 1.0, k)
+        y = np.where(k == 0, z, -np.log(np.where(arg > 0, arg, 1.0)) / safe_k)
+        cdf = 1 / (1 + np.exp(-y))
+    outside = arg <= 0
+    return np.where(outside & (k < 0), 0.0, np.where(outside & (k > 0), 1.0, cdf))
+
+
+def glo_spei(balance, xi, alpha, k):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        index = ndtri(glo_cdf(balance, xi, alpha, k))
+    return np.where(np.isnan(balance) | np.isnan(alpha), np.nan, np.clip(index, -SPI_LIMIT, SPI_LIMIT))
+
+
+def spei_array(balance, scales=SCALES, offset=0, calibration=None, period=PERIOD):
+    """
+    SPEI of a (..., time) water-balance array (P - PET) for every scale,
+    shaped (..., len(scales), time). Arguments as in spi.spi_array.
+    """
+    balance = np.asarray(balance, dtype="float64")
+    steps = balance.shape[-1]
+    out = np.empty(balance.shape[:-1] + (len(scales), steps))
+
+    for k, (scale, acc) in enumerate(rolling_sums(balance, scales).items()):
+        grouped = by_period(acc, period, offset)
+        fit = grouped
+        if calibration is not None:
+            fit = by_period(np.where(calibration, acc, np.nan), period, offset)
+        xi, alpha, shape = glo_params(fit)
+        index = glo_spei(grouped, xi[..., None, :], alpha[..., None, :], shape[..., None, :])
+        out[..., k, :] = from_period(index, steps, offset)
+    return out
+
+
+def spei(precip, pet, scales=SCALES, time_dim="time", calibration=None, chunks=None):
+    """
+    SPEI-n for each scale from monthly precipitation and potential
+    evapotranspiration (DataArrays or Series in the same units), as a Dataset
+    with one variable per scale (spei_3, spei_6, ...). Runs lazily and in
+    parallel over spatial chunks like spi.spi.
+    """
+    return index_dataset(spei_array, precip - pet, "spei", scales, time_dim, calibration, chunks)
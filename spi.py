@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+from scipy.special import gammainc, ndtri
+
+# Standardized Precipitation Index over point series or gridded cubes.
+# Accumulations for every scale come from a single cumulative sum along time.
+# A gamma distribution is fitted per pixel and per calendar month with Thom's
+# maximum-likelihood approximation (the same A/alpha/beta as the notebooks),
+# as plain NumPy reductions over a (..., years, 12) view of the data.
+# Zero accumulations get their own probability mass, so dry months map to
+# finite SPI values rather than -inf.
+
+SCALES = (3, 6, 9, 12)
+PERIOD = 12  # time steps per year (monthly data)
+SPI_LIMIT = 3.09  # SPI is clipped to +/- this, i.e. probabilities in [0.001, 0.999]
+ZERO = 1e-6  # accumulations below this count as no precipitation
+
+
+def rolling_sums(values, scales, axis=-1):
+    """
+    Moving sums of `values` over each window length in `scales`, from one
+    cumulative sum along `axis`.
+
+    Returns {scale: array shaped like values}. A window containing NaN, or
+    one that runs off the start of the record, is NaN.
+    """
+    values = np.moveaxis(np.asarray(values, dtype="float64"), axis, -1)
+    missing = np.isnan(values)
+    pad = [(0, 0)] * (values.ndim - 1) + [(1, 0)]
+    total = np.pad(np.cumsum(np.where(missing, 0.0, values), axis=-1), pad)
+    gaps = np.pad(np.cumsum(missing, axis=-1), pad)
+
+    sums = {}
+    for scale in scales:
+        acc = np.full(values.shape, np.nan)
+        if scale <= values.shape[-1]:
+            window = total[..., scale:] - total[..., :-scale]
+            complete = (gaps[..., scale:] - gaps[..., :-scale]) == 0
+            acc[..., scale - 1:] = np.where(complete, window, np.nan)
+        sums[scale] = np.moveaxis(acc, -1, axis)
+    return sums
+
+
+def by_period(values, period=PERIOD, offset=0):
+    """
+    View a (..., time) array as (..., years, period) so that column m holds
+    every value of calendar step m. `offset` is the calendar step of the first
+    value; the ends are padded with NaN.
+    """
+    steps = values.shape[-1]
+    years = -(-(offset + steps) // period)
+    pad = [(0, 0)] * (values.ndim - 1) + [(offset, years * period - offset - steps)]
+    return np.pad(values, pad, constant_values=np.nan).reshape(values.shape[:-1] + (years, period))
+
+
+def from_period(values, steps, offset=0):
+    # Inverse of by_period
+    flat = values.reshape(values.shape[:-2] + (-1,))
+    return flat[..., offset:offset + steps]
+
+
+def gamma_params(samples, axis=-2, min_samples=3):
+    """
+    Thom MLE gamma fit along `axis`, ignoring NaN.
+
+    Returns (alpha, beta, q) where q is the probability of a zero. Fits with
+    fewer than `min_samples` non-zero values are NaN.
+    """
+    valid = ~np.isnan(samples)
+    wet = valid & (samples > ZERO)
+    n_valid = valid.sum(axis=axis)
+    n_wet = wet.sum(axis=axis)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(wet, samples, 0.0).sum(axis=axis) / n_wet
+        mean_log = np.where(wet, np.log(np.where(wet, samples, 1.0)), 0.0).sum(axis=axis) / n_wet
+        a = np.log(mean) - mean_log
+        alpha = (1 + np.sqrt(1 + 4 * a / 3)) / (4 * a)
+        beta = mean / alpha
+        q = (n_valid - n_wet) / n_valid
+
+    bad = (n_wet < min_samples) | ~(a > 0)
+    alpha[bad] = np.nan
+    beta[bad] = np.nan
+    return alpha, beta, q
+
+
+def gamma_spi(acc, alpha, beta, q):
+    # Mixed distribution: P(0) = q, gamma above that; then the inverse normal
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cdf = q + (1 - q) * gammainc(alpha, np.where(acc > ZERO, acc, 0.0) / beta)
+        index = ndtri(cdf)
+    return np.where(np.isnan(acc), np.nan, np.clip(index, -SPI_LIMIT, SPI_LIMIT))
+
+
+def spi_array(precip, scales=SCALES, offset=0, calibration=None, period=PERIOD):
+    """
+    SPI of a (..., time) precipitation array for every scale.
+
+    `offset` is the calendar month (0 = January) of the first step and
+    `calibration` an optional boolean mask over time selecting the steps the
+    distributions are fitted on. Returns an array of shape
+    (..., len(scales), time).
+    """
+    precip = np.asarray(precip, dtype="float64")
+    steps = precip.shape[-1]
+    out = np.empty(precip.shape[:-1] + (len(scales), steps))
+
+    for k, (scale, acc) in enumerate(rolling_sums(precip, scales).items()):
+        grouped = by_period(acc, period, offset)
+        fit = grouped
+        if calibration is not None:
+            fit = by_period(np.where(calibration, acc, np.nan), period, offset)
+        alpha, beta, q = gamma_params(fit)
+        index = gamma_spi(grouped, alpha[..., None, :], beta[..., None, :], q[..., None, :])
+        out[..., k, :] = from_period(index, steps, offset)
+    return out
+
+
+def index_dataset(fn, data, name, scales=SCALES, time_dim="time", calibration=None, chunks=None):
+    """
+    Run fn(values, scales, offset, calibration) -> (..., scale, time) over a
+    monthly DataArray (or Series) and split the result into one variable per
+    scale ({name}_3, {name}_6, ...).
+
+    Works lazily on dask-backed arrays: every spatial chunk is computed
+    independently and in parallel, with time gathered into a single chunk.
+    `chunks` (e.g. {"lat": 100}) splits a NumPy-backed array the same way.
+    `calibration` is an optional (start, end) pair of dates the distributions
+    are fitted on.
+    """
+    if isinstance(data, pd.Series):
+        data = xr.DataArray(data.values, coords={time_dim: data.index}, dims=[time_dim])
+    if chunks is not None:
+        data = data.chunk(chunks)
+    if data.chunks is not None:
+        data = data.chunk({time_dim: -1})
+
+    times = pd.DatetimeIndex(data[time_dim].values)
+    mask = None
+    if calibration is not None:
+        mask = np.asarray((times >= pd.Timestamp(calibration[0])) & (times <= pd.Timestamp(calibration[1])))
+
+    scales = list(scales)
+    result = xr.apply_ufunc(
+        fn, data,
+        kwargs={"scales": scales, "offset": times[0].month - 1, "calibration": mask},
+        input_core_dims=[[time_dim]],
+        output_core_dims=[["scale", time_dim]],
+        dask="parallelized",
+        output_dtypes=["float64"],
+        dask_gufunc_kwargs={"output_sizes": {"scale": len(scales)}},
+    ).assign_coords(scale=scales)
+    return xr.Dataset({f"{name}_{scale}": result.sel(scale=scale, drop=True) for scale in scales})
+
+
+def spi(precip, scales=SCALES, time_dim="time", calibration=None, chunks=None):
+    """
+    SPI-n for each scale of a monthly precipitation DataArray (or Series), as
+    a Dataset with one variable per scale (spi_3, spi_6, ...).
+    """
+    return index_dataset(spi_array, precip, "spi", scales, time_dim, calibration, chunks)
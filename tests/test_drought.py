@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+import drought
+
+
+def reference_events(series, threshold):
+    # Plain loop over one series
+    events, start = [], None
+    for t, value in enumerate(list(series) + [np.nan]):
+        if value <= threshold and start is None:
+            start = t
+        elif not value <= threshold and start is not None:
+            run = series[start:t]
+            events.append((start, t - 1, t - start, run.sum(), run.min()))
+            start = None
+    return events
+
+
+def test_classify_drought():
+    codes = drought.classify_drought([0.5, -1.0, -1.2, -1.5, -1.9, -2.0, -3.0, np.nan])
+    assert codes.tolist() == [0, 1, 1, 2, 2, 3, 3, 0]
+
+
+def test_events_match_loop_and_never_cross_series():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(6, 50))
+    values[2, -3:] = -2.5  # ends at the last step...
+    values[3, :3] = -2.5  # ...and the next series starts dry
+    values[4, 10] = np.nan
+    events = drought.event_arrays(values)
+    found = list(zip(events["series"], events["start"], events["end"], events["duration"], events["severity"], events["peak"]))
+    expected = [(row,) + event for row in range(len(values)) for event in reference_events(values[row], -1.0)]
+    assert len(found) == len(expected)
+    for got, want in zip(found, expected):
+        assert got[:4] == want[:4]
+        assert np.allclose(got[4:], want[4:])
+    assert np.array_equal(events["category"], drought.classify_drought(events["peak"]))
+
+
+def test_min_duration():
+    values = np.array([-1.5, 0, -1.2, -1.3, 0, -2, -2, -2])
+    events = drought.event_arrays(values, min_duration=2)
+    assert events["start"].tolist() == [2, 5]
+    assert events["duration"].tolist() == [2, 3]
+
+
+def test_series_catalog():
+    times = pd.date_range("2000-01-01", periods=6, freq="MS")
+    index = pd.Series([0.2, -1.1, -2.3, 0.5, -1.6, 0.1], index=times)
+    table = drought.drought_events(index)
+    assert len(table) == 2
+    assert table["duration"].tolist() == [2, 1]
+    assert list(table["category"].astype(str)) == ["Extreme drought", "Severe drought"]
@@ -0,0 +1,58 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import rasterio
+import shapely
+from rasterio.transform import from_origin
+
+import geoprocessing
+
+
+def write_raster(path, data):
+    profile = dict(
+        driver="GTiff", width=data.shape[1], height=data.shape[0], count=1, dtype="float32",
+        crs="EPSG:4326", transform=from_origin(3.0, 13.0, 0.1, 0.1), nodata=np.nan,
+    )
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(data, 1)
+    return path
+
+
+def test_clip_raster_keeps_pixels_inside(tmp_path):
+    data = np.arange(40 * 50, dtype="float32").reshape(40, 50)
+    path = write_raster(tmp_path / "r.tif", data)
+    output = geoprocessing.clip_raster(path, shapely.box(3.5, 10.5, 4.5, 11.5), tmp_path / "clip.tif", block_size=4)
+    with rasterio.open(output) as dst:
+        clipped = dst.read(1)
+        assert dst.transform == from_origin(3.5, 11.5, 0.1, 0.1)
+    assert clipped.shape == (10, 10)
+    assert np.array_equal(clipped, data[15:25, 5:15])
+
+
+def test_clip_raster_accepts_frames_and_series(tmp_path):
+    data = np.arange(40 * 50, dtype="float32").reshape(40, 50)
+    path = write_raster(tmp_path / "r.tif", data)
+    boxes = [shapely.box(3.5, 10.5, 4.0, 11.5), shapely.box(4.0, 10.5, 4.5, 11.5)]
+    series = gpd.GeoSeries(boxes, crs=4326)
+    for shapes in (series, gpd.GeoDataFrame(geometry=series), boxes):
+        output = geoprocessing.clip_raster(path, shapes, tmp_path / "clip.tif")
+        with rasterio.open(output) as dst:
+            assert dst.read(1).shape == (10, 10)
+
+
+def test_clip_raster_outside_the_raster(tmp_path):
+    path = write_raster(tmp_path / "r.tif", np.zeros((40, 50), dtype="float32"))
+    for shape in (shapely.box(20.0, 20.0, 21.0, 21.0), shapely.box(8.0, 10.0, 9.0, 11.0), shapely.Polygon()):
+        with pytest.raises(ValueError, match="do not overlap"):
+            geoprocessing.clip_raster(path, shape, tmp_path / "clip.tif")
+
+
+def test_chunks_in_a_process_pool_match_one_pass():
+    rng = np.random.default_rng(0)
+    geoms = shapely.points(rng.uniform(0, 100, 500), rng.uniform(0, 100, 500))
+    chunks = geoprocessing.spatial_chunks(geoms, chunk_size=100)
+    results = geoprocessing.run_chunks(geoprocessing._buffer_chunk, [(geoms[rows], 1.0, 4) for rows in chunks], workers=2)
+    buffered = np.empty(len(geoms), dtype=object)
+    for rows, result in zip(chunks, results):
+        buffered[rows] = result
+    assert shapely.equals(buffered, shapely.buffer(geoms, 1.0, quad_segs=4)).all()
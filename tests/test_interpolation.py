@@ -0,0 +1,88 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import rasterio
+import xarray as xr
+from rasterio.transform import from_origin
+
+import interpolation
+from zonal import Grid
+
+GRID = Grid(from_origin(0.0, 1000.0, 50.0, 50.0), (20, 20), rasterio.crs.CRS.from_epsg(32632))
+
+
+def stations(n=30, seed=0):
+    return np.random.default_rng(seed).uniform(0, 1000, (n, 2))
+
+
+def direct_idw(xy, values, cell, k=8, power=2.0):
+    distance = np.hypot(*(xy - cell).T)
+    nearest = np.argsort(distance)[:k]
+    if distance[nearest[0]] == 0:
+        return values[nearest[0]]
+    weights = 1 / distance[nearest] ** power
+    keep = ~np.isnan(values[nearest])
+    return np.sum(weights[keep] * values[nearest][keep]) / np.sum(weights[keep])
+
+
+def test_idw_matches_direct_weighted_mean():
+    xy = stations()
+    values = np.random.default_rng(1).normal(20, 5, (3, len(xy)))
+    values[1, [0, 4, 9]] = np.nan
+    cells = np.column_stack(interpolation.cell_centers(GRID))
+    weights = interpolation.idw_weights(xy, cells)
+    out = interpolation.interpolate_steps(weights, values, GRID)
+    assert out.shape == (3,) + GRID.shape
+    for step in range(3):
+        expected = [direct_idw(xy, values[step], cell) for cell in cells]
+        assert np.allclose(out[step].ravel(), expected, rtol=1e-5)
+
+
+def test_idw_takes_station_value_on_a_cell_centre():
+    cells = np.column_stack(interpolation.cell_centers(GRID))
+    xy = np.vstack([cells[37], stations(10)])
+    values = np.arange(len(xy), dtype="float64")[None]
+    out = interpolation.interpolate_steps(interpolation.idw_weights(xy, cells), values, GRID)
+    assert out.ravel()[37] == 0
+
+
+def test_cells_without_stations_are_nan():
+    xy = stations(3)
+    cells = np.column_stack(interpolation.cell_centers(GRID))
+    out = interpolation.interpolate_steps(interpolation.idw_weights(xy, cells, k=3), np.full((1, 3), np.nan), GRID)
+    assert np.isnan(out).all()
+
+
+def test_kriging_is_exact_and_unbiased():
+    xy = stations(25)
+    weights = interpolation.kriging_weights(xy, xy + 1e-3, (0.0, 4.0, 600.0), k=10)
+    assert np.allclose(np.asarray(weights.sum(axis=1)).ravel(), 1, atol=1e-4)
+    values = np.random.default_rng(2).normal(size=len(xy)).astype("float32")
+    assert np.allclose(weights @ values, values, atol=1e-3)
+
+
+def test_fit_variogram_recovers_range():
+    # Exponential covariance field sampled at many stations
+    rng = np.random.default_rng(3)
+    xy = rng.uniform(0, 10_000, (300, 2))
+    h = np.hypot(*(xy[:, None] - xy[None]).transpose(2, 0, 1))
+    cov = 2.0 * np.exp(-3 * h / 3000)
+    fields = rng.multivariate_normal(np.zeros(len(xy)), cov, size=200)
+    nugget, sill, rng_ = interpolation.fit_variogram(xy, fields, "exponential")
+    assert sill == pytest.approx(2.0, rel=0.25)
+    assert rng_ == pytest.approx(3000, rel=0.35)
+
+
+def test_outputs(tmp_path):
+    points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(*stations(12).T), crs=32632)
+    times = pd.date_range("2024-01-01", periods=4, freq="h")
+    values = pd.DataFrame(np.random.default_rng(4).normal(size=(4, 12)), index=times)
+    tif = interpolation.interpolate(points, values, tmp_path / "out.tif", GRID)
+    zarr = interpolation.interpolate(points, values, str(tmp_path / "out.zarr"), GRID)
+    with rasterio.open(tif) as src:
+        stack = src.read()
+        assert src.count == 4 and src.crs == GRID.crs
+    cube = xr.open_zarr(zarr)["value"]
+    assert cube.shape == (4,) + GRID.shape
+    assert np.allclose(cube.values, stack)
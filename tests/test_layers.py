@@ -0,0 +1,26 @@
+import functools
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+import layers
+import lod
+
+
+def write_without_crs(path, geoms):
+    gpd.GeoDataFrame({"id": range(len(geoms))}, geometry=geoms).to_file(path)
+    path.with_suffix(".prj").unlink(missing_ok=True)
+    return path
+
+
+def test_layers_without_crs_load_as_wgs84(tmp_path, monkeypatch):
+    monkeypatch.setattr(layers, "VectorLOD", functools.partial(lod.VectorLOD, cache_dir=tmp_path / "lod"))
+    points = write_without_crs(tmp_path / "points.shp", shapely.points(np.arange(5.0), np.arange(5.0)))
+    polygons = write_without_crs(tmp_path / "polygons.shp", [shapely.box(x, 0, x + 1, 1) for x in range(5)])
+
+    for layer, (x, y) in ((layers.CircleMarker(str(points)), (2.0, 2.0)), (layers.ShapefileLayer(str(polygons)), (2.5, 0.5))):
+        layer.load()
+        assert layer.latlon.crs.to_epsg() == 4326
+        assert np.allclose(layer.latlon.total_bounds, layer.geodata.total_bounds)
+        assert list(layer.identify(x, y, 0.1)) == [2]
@@ -0,0 +1,56 @@
+import numpy as np
+import geopandas as gpd
+import shapely
+
+import lod
+
+
+def grid_file(path, n=10):
+    cells = [shapely.box(x, y, x + 1, y + 1) for x in range(n) for y in range(n)]
+    frame = gpd.GeoDataFrame({"id": range(n * n)}, geometry=cells, crs=4326)
+    frame.to_file(path)
+    return frame
+
+
+def test_levels_are_cached_away_from_the_source(tmp_path):
+    source = tmp_path / "data" / "cells.shp"
+    source.parent.mkdir()
+    frame = grid_file(source)
+    cache = tmp_path / "cache"
+
+    built = lod.VectorLOD(source, frame, cache_dir=cache).build()
+    assert sorted(path.name for path in source.parent.iterdir()) == ["cells.cpg", "cells.dbf", "cells.prj", "cells.shp", "cells.shx"]
+    assert (built.cache_dir / "manifest.json").exists()
+    assert built.cache_dir.parent == cache
+
+    reloaded = lod.VectorLOD(source, frame, cache_dir=cache)
+    assert reloaded._load_cached()
+    for band in range(len(lod.ZOOM_BANDS) - 1):
+        assert len(reloaded.levels[band]) == len(frame)
+
+
+def test_cache_failure_is_logged(tmp_path):
+    source = tmp_path / "cells.shp"
+    frame = grid_file(source)
+    blocker = tmp_path / "cache"
+    blocker.write_text("not a directory")
+
+    messages = []
+    built = lod.VectorLOD(source, frame, cache_dir=blocker).build(log=messages.append)
+    assert len(messages) == 1 and "Could not cache" in messages[0]
+    assert len(built.levels) == len(lod.ZOOM_BANDS)
+
+
+def test_coverage_keeps_shared_edges():
+    # Strips between shared wiggly boundaries, like neighbouring admin areas
+    rng = np.random.default_rng(0)
+    y = np.linspace(0, 10, 400)
+    curves = [np.column_stack([i + 0.2 * np.sin(3 * y + i) + rng.normal(0, 0.01, len(y)), y]) for i in range(9)]
+    curves[0][:, 0], curves[-1][:, 0] = 0, 8
+    cells = np.array([shapely.Polygon(np.vstack([left, right[::-1]])) for left, right in zip(curves, curves[1:])])
+    assert shapely.coverage_is_valid(cells)
+
+    simplified = lod.simplify(cells, 0.1)
+    assert shapely.coverage_is_valid(simplified)
+    assert shapely.get_num_coordinates(simplified).sum() < shapely.get_num_coordinates(cells).sum() / 5
+    assert np.isclose(shapely.area(shapely.union_all(simplified)), 80.0, rtol=1e-3)
@@ -0,0 +1,83 @@
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+import shapely
+
+import pipeline
+
+
+@pytest.fixture
+def layer(tmp_path):
+    path = tmp_path / "zones.gpkg"
+    gpd.GeoDataFrame({"name": ["a", "b"]}, geometry=[shapely.box(0, 0, 1, 1), shapely.box(2, 0, 3, 1)],
+                     crs=4326).to_file(path)
+    return path
+
+
+def spec(layer, tmp_path, distance=1000):
+    return {
+        "cache": str(tmp_path / "cache"),
+        "steps": {
+            "zones": {"op": "load", "path": str(layer)},
+            "utm": {"op": "reproject", "input": "zones", "crs": "EPSG:32631"},
+            "buffered": {"op": "buffer", "input": "utm", "distance": distance},
+            "merged": {"op": "union", "input": "buffered"},
+            "out": {"op": "export", "input": "merged", "path": str(tmp_path / "out" / "merged.gpkg")},
+        },
+    }
+
+
+def run(spec):
+    messages = []
+    outputs = pipeline.run_pipeline(spec, workers=2, log=messages.append)
+    return outputs, {message.split(": ")[0]: message.split(": ")[1] for message in messages}
+
+
+def test_runs_then_reuses_cache(layer, tmp_path):
+    outputs, status = run(spec(layer, tmp_path))
+    assert set(status.values()) == {"done"}
+    merged = gpd.read_file(outputs["out"])
+    assert len(merged) == 1 and merged.crs.to_epsg() == 32631
+
+    _, status = run(spec(layer, tmp_path))
+    assert status == {"zones": "cached", "utm": "cached", "buffered": "cached", "merged": "cached", "out": "done"}
+
+
+def test_parameter_change_invalidates_downstream_only(layer, tmp_path):
+    run(spec(layer, tmp_path))
+    _, status = run(spec(layer, tmp_path, distance=2000))
+    assert status["zones"] == status["utm"] == "cached"
+    assert status["buffered"] == status["merged"] == "done"
+
+
+def test_keys_follow_file_content(layer, tmp_path):
+    steps = spec(layer, tmp_path)["steps"]
+    before = pipeline.step_keys(steps)
+    gpd.GeoDataFrame({"name": ["c"]}, geometry=[shapely.box(0, 0, 2, 2)], crs=4326).to_file(layer)
+    after = pipeline.step_keys(steps)
+    assert all(before[name] != after[name] for name in steps)
+    assert pipeline.step_keys(steps) == after
+
+
+def test_cached_results_load_back(layer, tmp_path):
+    outputs, _ = run(spec(layer, tmp_path))
+    value = pipeline.load_output(outputs["buffered"])
+    assert isinstance(value, gpd.GeoDataFrame) and len(value) == 2
+    frame = pd.DataFrame({"x": [1, 2]})
+    path = pipeline._save(frame, tmp_path / "table")
+    assert pipeline.load_output(path).equals(frame)
+
+
+def test_invalid_specs():
+    with pytest.raises(ValueError, match="Cycle"):
+        pipeline.step_keys({"a": {"op": "buffer", "input": "b"}, "b": {"op": "buffer", "input": "a"}})
+    with pytest.raises(ValueError, match="Unknown step"):
+        pipeline.step_keys({"a": {"op": "buffer", "input": "missing"}})
+    with pytest.raises(ValueError, match="unknown op"):
+        pipeline.step_keys({"a": {"op": "nope"}})
+
+
+def test_windows_paths():
+    assert pipeline._path("data\\cdf\\rain.nc") == Path("data") / "cdf" / "rain.nc"
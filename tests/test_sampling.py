@@ -0,0 +1,78 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import rasterio
+import xarray as xr
+from rasterio.transform import from_origin
+
+import sampling
+
+
+def write_raster(path, data, nodata=None):
+    profile = dict(
+        driver="GTiff", width=data.shape[2], height=data.shape[1], count=data.shape[0], dtype="float64",
+        crs="EPSG:4326", transform=from_origin(3.0, 13.0, 0.1, 0.1), tiled=True, blockxsize=16, blockysize=16,
+        nodata=nodata,
+    )
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(data)
+    return path
+
+
+def frame(lons, lats):
+    return gpd.GeoDataFrame(geometry=gpd.points_from_xy(lons, lats), crs=4326)
+
+
+def random_points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return frame(rng.uniform(3.06, 7.74, n), rng.uniform(8.26, 12.94, n))
+
+
+def test_nearest_matches_direct_lookup(tmp_path):
+    data = np.random.default_rng(0).normal(size=(2, 50, 48))
+    path = write_raster(tmp_path / "r.tif", data)
+    points = random_points(200)
+    values = sampling.sample_raster(path, points)
+    with rasterio.open(path) as src:
+        rows, cols = rasterio.transform.rowcol(src.transform, points.geometry.x, points.geometry.y)
+    assert np.allclose(values, data[:, rows, cols].T)
+
+
+def test_bilinear_is_exact_on_a_linear_field(tmp_path):
+    rows, cols = np.indices((50, 48))
+    data = (2.0 * rows + 3.0 * cols)[None].astype("float64")
+    path = write_raster(tmp_path / "r.tif", data)
+    points = random_points(200, seed=1)
+    values = sampling.sample_raster(path, points, method="bilinear")[:, 0]
+    # Pixel centres sit at whole fractional positions
+    with rasterio.open(path) as src:
+        col, row = ~src.transform * (points.geometry.x.values, points.geometry.y.values)
+    assert np.allclose(values, 2.0 * (row - 0.5) + 3.0 * (col - 0.5))
+
+
+def test_outside_and_nodata_are_nan(tmp_path):
+    data = np.ones((1, 50, 48))
+    data[0, 0, 0] = -9999
+    path = write_raster(tmp_path / "r.tif", data, nodata=-9999)
+    values = sampling.sample_raster(path, frame([3.05, 50.0, 3.5], [12.95, 10.0, 12.5]))[:, 0]
+    assert np.isnan(values[0]) and np.isnan(values[1]) and values[2] == 1
+
+
+def test_cube_matches_xarray():
+    rng = np.random.default_rng(2)
+    times = pd.date_range("2020-01-01", periods=5, freq="MS")
+    cube = xr.DataArray(
+        rng.normal(size=(5, 30, 40)), dims=("time", "lat", "lon"),
+        coords={"time": times, "lat": np.linspace(13, 4, 30), "lon": np.linspace(3, 14, 40)}, name="v",
+    )
+    points = frame(rng.uniform(3.5, 13.5, 25), rng.uniform(4.5, 12.5, 25))
+    lon = xr.DataArray(points.geometry.x.values, dims="point")
+    lat = xr.DataArray(points.geometry.y.values, dims="point")
+
+    nearest = sampling.sample(cube, points)
+    expected = cube.sel(lat=lat, lon=lon, method="nearest").transpose("point", "time").values
+    assert np.allclose(nearest.values, expected)
+
+    bilinear = sampling.sample(cube, points, method="bilinear")
+    expected = cube.interp(lat=lat, lon=lon).transpose("point", "time").values
+    assert np.allclose(bilinear.values, expected)
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+import spei
+
+
+def fisk_sample(size, seed=0):
+    # Log-logistic with beta = 6, scale 100, origin -50
+    return stats.fisk.rvs(c=6, loc=-50, scale=100, size=size, random_state=seed)
+
+
+def test_pwm_matches_direct_formula():
+    x = np.random.default_rng(0).normal(size=30)
+    ordered, n, i = np.sort(x), 30, np.arange(1, 31)
+    expected = [
+        ordered.mean(),
+        np.sum((n - i) / (n - 1) * ordered) / n,
+        np.sum((n - i) * (n - i - 1) / ((n - 1) * (n - 2)) * ordered) / n,
+    ]
+    (w0, w1, w2), count = spei.pwm(x[:, None], axis=0)
+    assert np.allclose([w0[0], w1[0], w2[0]], expected)
+    assert count[0] == 30
+
+
+def test_pwm_ignores_nan():
+    x = np.array([3.0, np.nan, 1.0, 2.0, np.nan])
+    moments, count = spei.pwm(x[:, None], axis=0)
+    expected, _ = spei.pwm(np.array([[3.0], [1.0], [2.0]]), axis=0)
+    assert count[0] == 3
+    assert np.allclose([m[0] for m in moments], [m[0] for m in expected])
+
+
+@pytest.mark.parametrize("sign", [1, -1])
+def test_glo_fit_recovers_loglogistic(sign):
+    # Positive skew is the log-logistic with k = -1/beta; its mirror image
+    # (negative skew) has k = +1/beta and must fit just as well
+    sample = sign * fisk_sample((200_000, 1))
+    xi, alpha, k = spei.glo_params(sample, axis=0)
+    assert k[0] == pytest.approx(-sign / 6, abs=0.01)
+    assert alpha[0] == pytest.approx(100 / 6, rel=0.03)
+    assert xi[0] == pytest.approx(sign * 50, rel=0.03)
+
+
+def test_glo_cdf_matches_scipy_both_skews():
+    xi, alpha, k = 50.0, 100 / 6, -1 / 6  # fisk(c=6, loc=-50, scale=100)
+    x = np.linspace(-60, 400, 200)
+    assert np.allclose(spei.glo_cdf(x, xi, alpha, k), stats.fisk.cdf(x, 6, loc=-50, scale=100))
+    # Mirror image: upper bounded at 50, F(x) = 1 - F_fisk(-x)
+    assert np.allclose(spei.glo_cdf(-x, -xi, alpha, -k), stats.fisk.sf(x, 6, loc=-50, scale=100))
+    assert spei.glo_cdf(np.array([60.0]), -xi, alpha, -k)[0] == 1.0
+
+
+def test_glo_cdf_logistic_limit():
+    x = np.linspace(-5, 5, 11)
+    assert np.allclose(spei.glo_cdf(x, 0.0, 1.0, 0.0), stats.logistic.cdf(x))
+
+
+def test_negatively_skewed_balance_is_fitted():
+    # Regression: with the log-logistic beta > 1 mask every negatively skewed
+    # month was dropped (about a fifth of the fits on a P - PET cube)
+    rng = np.random.default_rng(1)
+    balance = -stats.fisk.rvs(c=5, loc=-80, scale=100, size=(20, 30, 360), random_state=rng)
+    out = spei.spei_array(balance, scales=(3,))
+    expected = 20 * 30 * 2  # the first two steps have no 3-month window
+    assert np.isnan(out).sum() == expected
+    values = out[..., 2:]
+    assert abs(values.mean()) < 0.05
+    assert values.std() == pytest.approx(1.0, abs=0.05)
+
+
+def test_spei_series_standard_normal():
+    rng = np.random.default_rng(2)
+    precip = rng.gamma(0.9, 70, 480)
+    pet = 80 + rng.normal(0, 5, 480)
+    out = spei.spei_array(precip - pet, scales=(1, 12))
+    for row, start in zip(out, (0, 11)):
+        values = row[start:]
+        assert not np.isnan(values).any()
+        assert abs(values.mean()) < 0.1
+        assert values.std() == pytest.approx(1.0, abs=0.1)
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+import spi
+
+
+def reference_spi(precip, scale):
+    # One calendar month at a time: moving sum, Thom gamma fit, mixed CDF
+    acc = pd.Series(precip).rolling(scale).sum().to_numpy()
+    out = np.full(len(precip), np.nan)
+    for month in range(12):
+        rows = np.arange(month, len(precip), 12)
+        values = acc[rows]
+        valid = values[~np.isnan(values)]
+        wet = valid[valid > spi.ZERO]
+        a = np.log(wet.mean()) - np.log(wet).mean()
+        alpha = (1 + np.sqrt(1 + 4 * a / 3)) / (4 * a)
+        beta = wet.mean() / alpha
+        q = (len(valid) - len(wet)) / len(valid)
+        cdf = q + (1 - q) * stats.gamma.cdf(np.where(values > spi.ZERO, values, 0.0), alpha, scale=beta)
+        out[rows] = np.clip(stats.norm.ppf(cdf), -spi.SPI_LIMIT, spi.SPI_LIMIT)
+    out[np.isnan(acc)] = np.nan
+    return out
+
+
+def test_rolling_sums_match_pandas():
+    values = np.random.default_rng(0).gamma(1, 10, 100)
+    values[[10, 50]] = np.nan
+    sums = spi.rolling_sums(values, (1, 3, 12))
+    for scale, result in sums.items():
+        expected = pd.Series(values).rolling(scale).sum().to_numpy()
+        assert np.allclose(result, expected, equal_nan=True)
+
+
+def test_by_period_round_trip():
+    values = np.arange(30.0).reshape(1, 30)
+    grouped = spi.by_period(values, 12, offset=4)
+    assert grouped.shape == (1, 3, 12)
+    assert grouped[0, 0, 4] == 0 and np.isnan(grouped[0, 0, 3])
+    assert np.array_equal(spi.from_period(grouped, 30, offset=4), values)
+
+
+def test_spi_matches_reference_with_dry_months():
+    rng = np.random.default_rng(1)
+    precip = rng.gamma(0.8, 60, 360)
+    precip[rng.random(360) < 0.2] = 0.0
+    out = spi.spi_array(precip, scales=(1, 3, 12))
+    for row, scale in zip(out, (1, 3, 12)):
+        assert np.allclose(row, reference_spi(precip, scale), equal_nan=True, atol=1e-10)
+
+
+def test_spi_grid_equals_per_pixel():
+    rng = np.random.default_rng(2)
+    cube = rng.gamma(0.9, 50, (3, 4, 240))
+    out = spi.spi_array(cube, scales=(3,))
+    assert out.shape == (3, 4, 1, 240)
+    assert np.allclose(out[1, 2, 0], reference_spi(cube[1, 2], 3), equal_nan=True, atol=1e-10)
+
+
+def test_spi_dataset_offset_and_names():
+    rng = np.random.default_rng(3)
+    times = pd.date_range("2001-04-01", periods=240, freq="MS")
+    series = pd.Series(rng.gamma(0.9, 50, 240), index=times)
+    result = spi.spi(series, scales=(3, 6))
+    assert list(result.data_vars) == ["spi_3", "spi_6"]
+    expected = spi.spi_array(series.to_numpy(), scales=(3,), offset=3)[0]
+    assert np.allclose(result["spi_3"].values, expected, equal_nan=True)
+
+
+def test_spi_calibration_period():
+    rng = np.random.default_rng(4)
+    times = pd.date_range("1981-01-01", periods=480, freq="MS")
+    series = pd.Series(rng.gamma(0.9, 50, 480), index=times)
+    calibrated = spi.spi(series, scales=(1,), calibration=("1981-01-01", "2010-12-01"))["spi_1"].values
+    mask = (times >= "1981-01-01") & (times <= "2010-12-01")
+    assert calibrated[mask].mean() == pytest.approx(0, abs=0.1)
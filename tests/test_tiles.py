@@ -0,0 +1,56 @@
+import json
+
+import numpy as np
+import shapely
+from rasterio.warp import transform
+
+import tiles
+from spatial_index import SpatialIndex
+
+
+def point_source(tmp_path, lon, lat):
+    path = tmp_path / "points.shp"
+    path.write_bytes(b"")
+    return tiles.PointTileSource(path, SpatialIndex(shapely.points(lon, lat)))
+
+
+def brute_force(lon, lat, z, x, y, pad):
+    # Every point projected to the tile's pixels, kept if within pad
+    left, bottom, right, top = tiles.tile_bounds(z, x, y)
+    mx, my = transform(tiles.WGS84, tiles.WEB_MERCATOR, lon, lat)
+    px = (np.asarray(mx) - left) / (right - left) * tiles.TILE_SIZE
+    py = (top - np.asarray(my)) / (top - bottom) * tiles.TILE_SIZE
+    keep = (px >= -pad) & (px <= tiles.TILE_SIZE + pad) & (py >= -pad) & (py <= tiles.TILE_SIZE + pad)
+    return set(zip(np.round(px[keep], 1), np.round(py[keep], 1)))
+
+
+def test_tile_points_match_brute_force(tmp_path):
+    rng = np.random.default_rng(0)
+    lon, lat = rng.uniform(2.6, 14.7, 5000), rng.uniform(4.2, 13.9, 5000)
+    source = point_source(tmp_path, lon, lat)
+    for z, x, y in [(0, 0, 0), (4, 8, 7), (6, 33, 30), (6, 34, 31), (8, 132, 124), (3, 0, 0)]:
+        for pad in (0, 3):
+            px, py = source.points(z, x, y, pad)
+            assert set(zip(px, py)) == brute_force(lon, lat, z, x, y, pad)
+
+
+def test_tile_handler_responses(tmp_path):
+    source = point_source(tmp_path, [7.5, 7.5, 7.50000001], [9.0, 9.0, 9.0])
+    content_type, body = source.handle(["0", "0", "0.json"], {"pad": ["3"]})
+    assert content_type == "application/json"
+    # Points on the same tenth of a pixel are sent once
+    assert len(json.loads(body)["x"]) == 1
+    assert source.handle(["5", "0", "0.json"], {})[1] is None
+
+
+def test_sources_of_the_same_file_register_separately(tmp_path):
+    first = point_source(tmp_path, [7.5], [9.0])
+    second = point_source(tmp_path, [7.5], [9.0])
+    server = tiles.TileServer()
+    try:
+        urls = server.register(first), server.register(second)
+        assert urls[0] != urls[1]
+        server.unregister(first)
+        assert list(server.httpd.sources.values()) == [second]
+    finally:
+        server.shutdown()
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+import xarray as xr
+from scipy import stats
+
+import trend
+
+
+def reference_mann_kendall(values):
+    # O(n^2) loop over pairs, ties from value counts
+    x = values[~np.isnan(values)]
+    t = np.flatnonzero(~np.isnan(values))
+    n = len(x)
+    s = sum(np.sign(x[j] - x[i]) for i in range(n) for j in range(i + 1, n))
+    _, counts = np.unique(x, return_counts=True)
+    var_s = (n * (n - 1) * (2 * n + 5) - np.sum(counts * (counts - 1) * (2 * counts + 5))) / 18
+    z = (s - np.sign(s)) / np.sqrt(var_s) if s else 0.0
+    p = 2 * stats.norm.sf(abs(z))
+    slope = np.median([(x[j] - x[i]) / (t[j] - t[i]) for i in range(n) for j in range(i + 1, n)])
+    return s, var_s, z, p, slope
+
+
+def test_matches_brute_force_with_ties_and_gaps():
+    rng = np.random.default_rng(0)
+    values = np.round(rng.normal(0, 1, (20, 40)) + np.linspace(0, 1, 40), 1)  # rounding makes ties
+    values[3, [5, 17]] = np.nan
+    out = trend.mann_kendall_array(values)
+    fields = dict(zip(trend.FIELDS, out))
+    for row in range(len(values)):
+        s, var_s, z, p, slope = reference_mann_kendall(values[row])
+        assert fields["s"][row] == s
+        assert fields["var_s"][row] == pytest.approx(var_s)
+        assert fields["z"][row] == pytest.approx(z)
+        assert fields["p"][row] == pytest.approx(p)
+        assert fields["slope"][row] == pytest.approx(slope)
+        assert fields["trend"][row] == (np.sign(z) if p < 0.05 else 0)
+
+
+def test_tie_correction():
+    values = np.array([[1.0, 1.0, 2.0, 2.0, 2.0, 3.0]])
+    assert trend.tie_correction(values)[0] == 2 * 1 * 9 + 3 * 2 * 11
+
+
+def test_short_series_are_nan_and_blocks_agree():
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=(50, 30))
+    values[7, 2:] = np.nan
+    whole = trend.mann_kendall_array(values)
+    blocked = trend.mann_kendall_array(values, max_bytes=1)  # one row per block
+    assert np.isnan(whole[:, 7]).all()
+    assert np.allclose(whole, blocked, equal_nan=True)
+
+
+def test_dataset_over_chunks():
+    rng = np.random.default_rng(2)
+    data = xr.DataArray(rng.normal(size=(6, 5, 25)), dims=("lat", "lon", "time"))
+    result = trend.mann_kendall(data, chunks={"lat": 2}).compute()
+    expected = trend.mann_kendall_array(data.values)
+    for k, name in enumerate(trend.FIELDS):
+        assert np.allclose(result[name].values, expected[k], equal_nan=True)
@@ -0,0 +1,83 @@
+import asyncio
+
+from aiohttp import web
+
+import weather
+
+LOCATIONS = [{"state": f"S{i}", "lat": 6.0 + i, "lon": 3.0 + i} for i in range(20)]
+
+
+class StubServer:
+    # Local stand-in for weatherapi.com: S3 fails once with 503, S5 always 401
+    def __init__(self):
+        self.calls = {}
+        self.keys = set()
+
+    async def current(self, request):
+        query = request.query
+        self.keys.add(query["key"])
+        lat = float(query["q"].split(",")[0])
+        state = f"S{int(round(lat - 6))}"
+        self.calls[state] = self.calls.get(state, 0) + 1
+        if state == "S3" and self.calls[state] == 1:
+            return web.Response(status=503)
+        if state == "S5":
+            return web.Response(status=401)
+        return web.json_response({"current": {"temp_c": lat * 2}})
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/v1/current.json", self.current)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/v1"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+
+def run_round(**kwargs):
+    async def main():
+        async with StubServer() as server:
+            provider = weather.WeatherAPI("SECRET-KEY", base_url=server.url, rate=1000, burst=1000)
+            messages = []
+            async with weather.WeatherFetcher(provider, backoff=0.01, log=messages.append, **kwargs) as fetcher:
+                readings = [r async for _, r in fetcher.poll(LOCATIONS, rounds=2, interval=0)]
+            return readings, messages, server
+    return asyncio.run(main())
+
+
+def test_round_against_stub_server():
+    readings, messages, server = run_round()
+    assert len(readings) == 2
+    for round_readings in readings:
+        for location, reading in zip(LOCATIONS, round_readings):
+            expected = None if location["state"] == "S5" else location["lat"] * 2
+            assert reading == expected
+    assert server.keys == {"SECRET-KEY"}
+    assert server.calls["S3"] == 3  # one retry after the 503, then once more in round two
+    assert server.calls["S5"] == 2  # 401 is not retried
+
+
+def test_failures_are_logged_without_the_key():
+    _, messages, _ = run_round()
+    assert len(messages) == 2
+    for message in messages:
+        assert message.startswith("weatherapi: S5 failed: HTTP 401 from http://127.0.0.1:")
+        assert "SECRET-KEY" not in message and "?" not in message
+
+
+def test_rate_limiter_spaces_requests():
+    async def main():
+        limiter = weather.RateLimiter(rate=50, burst=1)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(6):
+            await limiter.acquire()
+        return loop.time() - start
+
+    assert asyncio.run(main()) >= 5 / 50 * 0.9
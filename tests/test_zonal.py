@@ -0,0 +1,90 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import rasterio
+import shapely
+import xarray as xr
+from rasterio.features import geometry_mask
+from rasterio.transform import from_origin
+
+import zonal
+from layer_cache import get_cache
+
+TRANSFORM = from_origin(0.0, 10.0, 0.1, 0.1)
+SHAPE = (100, 100)
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    get_cache().clear()
+
+
+def write_raster(path, data):
+    profile = dict(driver="GTiff", width=SHAPE[1], height=SHAPE[0], count=len(data), dtype="float64",
+                   crs="EPSG:4326", transform=TRANSFORM, nodata=np.nan)
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(data)
+    return path
+
+
+def brute_force(values, geom):
+    inside = geometry_mask([geom], SHAPE, TRANSFORM, invert=True)
+    v = values[inside]
+    v = v[~np.isnan(v)]
+    return {"count": len(v), "sum": v.sum(), "mean": v.mean(), "min": v.min(), "max": v.max(),
+            "std": v.std(), "p50": np.percentile(v, 50), "p90": np.percentile(v, 90)}
+
+
+def check(table, values, zones, step):
+    rows = table[table["step"] == step].set_index("zone")
+    for zone, geom in zip(zones.index, zones.geometry):
+        expected = brute_force(values, geom)
+        for name, value in expected.items():
+            if name not in rows:
+                continue
+            assert rows.loc[zone, name] == pytest.approx(value), (zone, name)
+
+
+def test_matches_brute_force(tmp_path):
+    data = np.random.default_rng(0).normal(size=(2,) + SHAPE)
+    data[0, 10:20, 10:20] = np.nan
+    path = write_raster(tmp_path / "r.tif", data)
+    zones = gpd.GeoDataFrame(geometry=[
+        shapely.box(0.5, 0.5, 4.5, 4.5), shapely.box(4.5, 4.5, 9.5, 9.8), shapely.Point(2, 7).buffer(1.5),
+    ], crs=4326)
+    table = zonal.zonal_stats(path, zones, percentiles=(50, 90), workers=2)
+    check(table, data[0], zones, "band1")
+    check(table, data[1], zones, "band2")
+
+
+def test_overlapping_zones_each_get_shared_pixels(tmp_path):
+    data = np.random.default_rng(1).normal(size=(1,) + SHAPE)
+    path = write_raster(tmp_path / "r.tif", data)
+    zones = gpd.GeoDataFrame(geometry=[
+        shapely.box(1, 1, 6, 6), shapely.box(4, 4, 9, 9), shapely.box(6, 1, 9, 3),  # the last only touches the first
+    ], crs=4326)
+    assert zonal.overlapping_zones(np.asarray(zones.geometry.values)).tolist() == [0, 1]
+    table = zonal.zonal_stats(path, zones, percentiles=(50, 90))
+    check(table, data[0], zones, "band1")
+
+
+def test_cube_steps_match_raster():
+    rng = np.random.default_rng(2)
+    lats = 10.0 - 0.05 - 0.1 * np.arange(SHAPE[0])
+    lons = 0.05 + 0.1 * np.arange(SHAPE[1])
+    cube = xr.DataArray(rng.normal(size=(3,) + SHAPE), dims=("time", "lat", "lon"),
+                        coords={"lat": lats[::-1], "lon": lons}, name="v")  # ascending lat
+    zones = gpd.GeoDataFrame(geometry=[shapely.box(1, 1, 5, 5)], crs=4326)
+    table = zonal.zonal_stats(cube, zones)
+    flipped = cube.values[:, ::-1]
+    for step in range(3):
+        check(table, flipped[step], zones, step)
+
+
+def test_no_steps_give_an_empty_table():
+    cube = xr.DataArray(np.zeros((0,) + SHAPE), dims=("time", "lat", "lon"),
+                        coords={"lat": 10.0 - 0.05 - 0.1 * np.arange(SHAPE[0]), "lon": 0.05 + 0.1 * np.arange(SHAPE[1])})
+    zones = gpd.GeoDataFrame(geometry=[shapely.box(1, 1, 5, 5)], crs=4326)
+    table = zonal.zonal_stats(cube, zones, percentiles=(50,))
+    assert len(table) == 0
+    assert list(table.columns) == ["zone", "step", *zonal.STATS, "p50"]
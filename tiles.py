@@ -0,0 +1,323 @@
+import hashlib
+import json
+import os
+import threading
+import warnings
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import rasterio
+import rasterio.shutil
+import shapely
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+from rasterio.errors import NotGeoreferencedWarning
+from rasterio.io import MemoryFile
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import calculate_default_transform, transform_bounds
+from rasterio.windows import from_bounds
+
+from raster_style import RasterStyle
+
+TILE_SIZE = 256
+ORIGIN = 20037508.342789244  # half the width of the web mercator plane in metres
+WEB_MERCATOR = CRS.from_epsg(3857)
+WGS84 = CRS.from_epsg(4326)
+MAX_LATITUDE = 85.0511287798  # web mercator's northern and southern limit
+CACHE_DIR = Path(os.environ.get("MAPGIS_CACHE", Path.home() / ".mapgis")) / "pyramids"
+TILE_CACHE = 256  # warped float tiles kept per source for restyling
+
+
+def tile_bounds(z, x, y):
+    # Web mercator bounds (left, bottom, right, top) of an XYZ tile
+    size = 2 * ORIGIN / 2 ** z
+    left = -ORIGIN + x * size
+    top = ORIGIN - y * size
+    return left, top - size, left + size, top
+
+
+def file_key(path):
+    stat = os.stat(path)
+    ident = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(ident.encode()).hexdigest()[:16]
+
+
+def source_key(source):
+    # Sources are keyed per instance, so two layers of the same file are
+    # restyled and removed independently
+    return getattr(source, "key", None) or f"{file_key(source.file_path)}-{id(source):x}"
+
+
+def mercator_grid(src):
+    # (transform, width, height) of the raster resampled to web mercator
+    crs = src.crs or WGS84
+    return calculate_default_transform(crs, WEB_MERCATOR, src.width, src.height, *src.bounds)
+
+
+def build_pyramid(path, cache_dir=CACHE_DIR):
+    """
+    Warp a raster to web mercator once, without touching the source.
+
+    The warped copy is a tiled, compressed GeoTIFF with internal overviews in
+    the cache directory, keyed by the file (path, size, mtime) and the target
+    grid, so later sessions reuse it. Returns the path to read from.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with rasterio.open(path) as src:
+        transform, width, height = mercator_grid(src)
+        grid = f"{file_key(path)}|{tuple(transform)[:6]}|{width}|{height}"
+        warped_path = cache_dir / f"{hashlib.sha1(grid.encode()).hexdigest()[:16]}.tif"
+        if warped_path.exists():
+            return warped_path
+
+        # Rasters without nodata get an alpha band so the warp's empty corners
+        # stay masked. Written under a temporary name and renamed once complete.
+        partial = warped_path.with_suffix(".partial.tif")
+        with WarpedVRT(
+            src, src_crs=src.crs or WGS84, crs=WEB_MERCATOR, transform=transform, width=width, height=height,
+            resampling=Resampling.bilinear, add_alpha=src.nodata is None
+        ) as vrt:
+            rasterio.shutil.copy(
+                vrt, partial, driver="GTiff", tiled=True, blockxsize=TILE_SIZE, blockysize=TILE_SIZE,
+                compress="deflate", bigtiff="if_safer"
+            )
+
+    with rasterio.open(partial, "r+") as dst:
+        factors = []
+        factor = 2
+        while max(dst.width, dst.height) / factor >= TILE_SIZE // 2:
+            factors.append(factor)
+            factor *= 2
+        if factors:
+            dst.build_overviews(factors, Resampling.average)
+    os.replace(partial, warped_path)
+    return warped_path
+
+
+class RasterTileSource:
+    def __init__(self, file_path, band=1, vmin=None, vmax=None, style=None):
+        self.file_path = file_path
+        self.key = f"raster-{file_key(file_path)}-{id(self):x}"
+        self.band = band
+        self.pyramid = build_pyramid(file_path)
+        self._local = threading.local()
+        self._tiles = OrderedDict()
+        self._tiles_lock = threading.Lock()
+        self.version = 0
+
+        with rasterio.open(self.pyramid) as src:
+            self.crs = src.crs
+            self.nodata = src.nodata
+            self.bounds = src.bounds
+            if style is None and (vmin is None or vmax is None):
+                # Stretch from the coarsest overview rather than the full band
+                ovr = src.overviews(band)
+                factor = ovr[-1] if ovr else 1
+                sample = src.read(
+                    band, masked=True,
+                    out_shape=(max(1, src.height // factor), max(1, src.width // factor))
+                )
+                vmin = float(sample.min()) if sample.count() else 0.0
+                vmax = float(sample.max()) if sample.count() else 1.0
+        self.style = style or RasterStyle(vmin, vmax)
+
+    def latlon_bounds(self):
+        left, bottom, right, top = transform_bounds(self.crs, WGS84, *self.bounds)
+        return [[bottom, left], [top, right]]
+
+    def _dataset(self):
+        # rasterio handles are not thread safe, so each server thread keeps its own
+        src = getattr(self._local, "src", None)
+        if src is None:
+            src = self._local.src = rasterio.open(self.pyramid)
+        return src
+
+    def set_style(self, style):
+        # Tiles already read are kept; only their colouring changes
+        self.style = style
+        self.version += 1
+
+    def render(self, data, mask):
+        return self.style.apply(data, mask)
+
+    def read_tile(self, z, x, y):
+        """
+        Float values of an XYZ tile (NaN where there is no data), or None
+        outside the raster. The pyramid is already in web mercator, so this is
+        a resampled window read, served from the matching overview.
+        """
+        left, bottom, right, top = tile_bounds(z, x, y)
+        inner = (
+            max(left, self.bounds.left), max(bottom, self.bounds.bottom),
+            min(right, self.bounds.right), min(top, self.bounds.top)
+        )
+        pixel = TILE_SIZE / (right - left)
+        col0, col1 = round((inner[0] - left) * pixel), round((inner[2] - left) * pixel)
+        row0, row1 = round((top - inner[3]) * pixel), round((top - inner[1]) * pixel)
+        if col1 <= col0 or row1 <= row0:
+            return None
+
+        src = self._dataset()
+        data = src.read(
+            self.band, window=from_bounds(*inner, src.transform), out_shape=(row1 - row0, col1 - col0),
+            masked=True, resampling=Resampling.bilinear
+        )
+        tile = np.full((TILE_SIZE, TILE_SIZE), np.nan, dtype="float32")
+        tile[row0:row1, col0:col1] = data.astype("float32").filled(np.nan)
+        return tile
+
+    def cached_tile(self, z, x, y):
+        key = (z, x, y)
+        with self._tiles_lock:
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+                return self._tiles[key]
+        tile = self.read_tile(z, x, y)
+        with self._tiles_lock:
+            self._tiles[key] = tile
+            while len(self._tiles) > TILE_CACHE:
+                self._tiles.popitem(last=False)
+        return tile
+
+    def tile(self, z, x, y):
+        tile = self.cached_tile(z, x, y)
+        if tile is None:
+            return None
+        return encode_png(self.render(tile, np.isnan(tile)))
+
+    def url_template(self, base):
+        # The style version makes the browser refetch tiles after a restyle
+        return f"{base}/{{z}}/{{x}}/{{y}}.png?v={self.version}"
+
+    def handle(self, parts, query):
+        z, x, y = int(parts[0]), int(parts[1]), int(parts[2].split(".")[0])
+        body = self.tile(z, x, y)
+        return "image/png", body
+
+
+class PointTileSource:
+    """
+    Point layer served per XYZ tile as JSON pixel positions, for the page's
+    canvas PointLayer. Each request queries the layer's spatial index with the
+    tile's bounds, so a tile costs the points inside it rather than the whole
+    layer, and points landing on the same tenth of a pixel are sent once.
+    """
+
+    def __init__(self, file_path, index):
+        # index is the layer's SpatialIndex over EPSG:4326 geometries
+        self.file_path = file_path
+        self.key = f"points-{file_key(file_path)}-{id(self):x}"
+        self.index = index
+
+    def points(self, z, x, y, pad=0):
+        # Pixel (x, y) arrays of the points within `pad` pixels of the tile
+        left, bottom, right, top = tile_bounds(z, x, y)
+        margin = pad * (right - left) / TILE_SIZE
+        west, east = np.degrees(np.array([left - margin, right + margin]) / ORIGIN * np.pi)
+        south, north = _mercator_lat(np.array([bottom - margin, top + margin]))
+        rows = self.index.query_bbox(west, south, east, north)
+        coords = shapely.get_coordinates(self.index.geometries[rows])
+        px = (np.radians(coords[:, 0]) * ORIGIN / np.pi - left) / (right - left) * TILE_SIZE
+        lat = np.radians(np.clip(coords[:, 1], -MAX_LATITUDE, MAX_LATITUDE))
+        py = (top - np.log(np.tan(np.pi / 4 + lat / 2)) * ORIGIN / np.pi) / (top - bottom) * TILE_SIZE
+        pixels = np.column_stack([px, py])
+        pixels = pixels[((pixels >= -pad) & (pixels <= TILE_SIZE + pad)).all(axis=1)]
+        pixels = np.unique(np.round(pixels, 1), axis=0)
+        return pixels[:, 0], pixels[:, 1]
+
+    def url_template(self, base):
+        return f"{base}/{{z}}/{{x}}/{{y}}.json"
+
+    def handle(self, parts, query):
+        z, x, y = int(parts[0]), int(parts[1]), int(parts[2].split(".")[0])
+        pad = float(query["pad"][0]) if "pad" in query else 0.0
+        px, py = self.points(z, x, y, pad)
+        if len(px) == 0:
+            return "application/json", None
+        return "application/json", json.dumps({"x": px.tolist(), "y": py.tolist()})
+
+
+def _mercator_lat(y):
+    # Latitude in degrees of a web mercator northing
+    return np.degrees(np.arctan(np.sinh(np.clip(y, -ORIGIN, ORIGIN) / ORIGIN * np.pi)))
+
+
+def encode_png(rgba):
+    with warnings.catch_warnings(), MemoryFile() as memfile:
+        warnings.simplefilter("ignore", NotGeoreferencedWarning)
+        with memfile.open(driver="PNG", width=rgba.shape[2], height=rgba.shape[1], count=4, dtype="uint8") as dst:
+            dst.write(rgba)
+        return memfile.read()
+
+
+class _TileHandler(BaseHTTPRequestHandler):
+    # Routes /<key>/<rest...> to the registered source, which returns
+    # (content type, body); a None body means an empty tile
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        try:
+            source = self.server.sources[parts[0]]
+            content_type, body = source.handle(parts[1:], parse_qs(url.query))
+        except (IndexError, ValueError, KeyError):
+            self.send_error(404)
+            return
+
+        if body is None:
+            self.send_response(204)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            return
+        if isinstance(body, str):
+            body = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", "max-age=3600")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TileServer:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.httpd = ThreadingHTTPServer((host, port), _TileHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.sources = {}
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def register(self, source):
+        key = source_key(source)
+        self.httpd.sources[key] = source
+        return source.url_template(f"{self.url}/{key}")
+
+    def unregister(self, source):
+        self.httpd.sources.pop(source_key(source), None)
+
+    def shutdown(self):
+        self.httpd.shutdown()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_tile_server():
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = TileServer()
+        return _server
@@ -0,0 +1,93 @@
+import numpy as np
+import xarray as xr
+from scipy.special import ndtr
+
+# Mann-Kendall trend test and Sen's slope for every pixel of a cube at once.
+# Each block of pixels is turned into a (pixels, pairs) matrix of pairwise
+# differences along time, so S, the tie-corrected variance and Sen's median
+# slope are plain reductions. Blocks are sized to stay under MAX_BYTES; on dask
+# arrays spatial chunks are processed in parallel. Missing values are dropped
+# per pixel, as pymannkendall does; pixels with fewer than MIN_SAMPLES values
+# are NaN (the notebook marked them -9999).
+
+MAX_BYTES = 64 * 2 ** 20
+MIN_SAMPLES = 3
+FIELDS = ("trend", "p", "slope", "z", "s", "var_s")
+
+
+def tie_correction(values):
+    # sum of t(t-1)(2t+5) over groups of t equal values, per row
+    rows, steps = values.shape
+    ordered = np.sort(values, axis=1)
+    starts = np.ones((rows, steps), dtype=bool)
+    starts[:, 1:] = ordered[:, 1:] != ordered[:, :-1]  # NaN never equals, so it never ties
+    run = np.cumsum(starts.ravel()) - 1
+    t = np.bincount(run).astype("float64")
+    run_row = np.repeat(np.arange(rows), starts.sum(axis=1))
+    return np.bincount(run_row, weights=t * (t - 1) * (2 * t + 5), minlength=rows)
+
+
+def _block(values, i, j, alpha):
+    n = (~np.isnan(values)).sum(axis=1).astype("float64")
+    diff = values[:, j] - values[:, i]
+    s = np.nansum(np.sign(diff), axis=1)
+    var_s = (n * (n - 1) * (2 * n + 5) - tie_correction(values)) / 18
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = np.where(s > 0, s - 1, np.where(s < 0, s + 1, 0.0)) / np.sqrt(var_s)
+        z[var_s == 0] = 0.0
+        p = 2 * ndtr(-np.abs(z))
+        slopes = diff / (j - i)
+        median = np.nanmedian if np.isnan(slopes).any() else np.median
+        slope = median(slopes, axis=1)
+
+    trend = np.where(p < alpha, np.sign(z), 0.0)
+    out = np.stack([trend, p, slope, z, s, var_s])
+    out[:, n < MIN_SAMPLES] = np.nan
+    return out
+
+
+def mann_kendall_array(values, alpha=0.05, max_bytes=MAX_BYTES):
+    """
+    Mann-Kendall test along the last axis of `values`.
+
+    Returns a (6, ...) array stacking FIELDS: trend (-1, 0, 1 at `alpha`),
+    two-sided p-value, Sen's slope per time step, Z, S and its tie-corrected
+    variance.
+    """
+    values = np.asarray(values, dtype="float64")
+    shape, steps = values.shape[:-1], values.shape[-1]
+    flat = values.reshape(-1, steps)
+    i, j = np.triu_indices(steps, 1)
+    rows = max(1, max_bytes // (8 * max(len(i), 1) * 2))
+
+    out = np.empty((len(FIELDS), flat.shape[0]))
+    for start in range(0, flat.shape[0], rows):
+        out[:, start:start + rows] = _block(flat[start:start + rows], i, j, alpha)
+    return out.reshape((len(FIELDS),) + shape)
+
+
+def mann_kendall(data, time_dim="time", alpha=0.05, chunks=None):
+    """
+    Per-pixel Mann-Kendall trend and Sen's slope of a DataArray.
+
+    `chunks` (e.g. {"lat": 100, "lon": 100}) splits a NumPy-backed array so
+    the spatial blocks run in parallel; dask-backed input keeps its spatial
+    chunks. Returns a Dataset with the variables in FIELDS.
+    """
+    if chunks is not None:
+        data = data.chunk(chunks)
+    if data.chunks is not None:
+        data = data.chunk({time_dim: -1})
+
+    def split(values):
+        return tuple(mann_kendall_array(values, alpha))
+
+    results = xr.apply_ufunc(
+        split, data,
+        input_core_dims=[[time_dim]],
+        output_core_dims=[[]] * len(FIELDS),
+        dask="parallelized",
+        output_dtypes=["float64"] * len(FIELDS),
+    )
+    return xr.Dataset(dict(zip(FIELDS, results)))
@@ -0,0 +1,180 @@
+import asyncio
+import random
+import time
+
+import aiohttp
+
+# Concurrent current-weather polling. One pooled aiohttp session is shared by
+# every request of a run, a semaphore caps requests in flight, each provider
+# has its own rate limit, and failed requests are retried with exponential
+# backoff, so a round over all locations takes about one round-trip.
+# Providers only know how to build a request and parse a reply; base_url can be
+# pointed at a local stub server for testing.
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def describe_error(error):
+    """
+    Short description of a failed request for logs: the HTTP status and the
+    URL without its query string, which carries the API key.
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        url = error.request_info.real_url.with_query(None) if error.request_info else "?"
+        return f"HTTP {error.status} from {url}"
+    return type(error).__name__
+
+
+class Provider:
+    name = None
+    base_url = None
+    rate = 10  # sustained requests per second
+    burst = 50  # requests allowed back to back
+
+    def __init__(self, api_key, base_url=None, rate=None, burst=None):
+        self.api_key = api_key
+        self.base_url = (base_url or self.base_url).rstrip("/")
+        self.rate = rate or self.rate
+        self.burst = burst or self.burst
+
+    def request(self, location):
+        # (url, query params) for one location
+        raise NotImplementedError
+
+    def parse(self, location, payload):
+        # Temperature in degrees Celsius from a decoded JSON reply
+        raise NotImplementedError
+
+
+class WeatherAPI(Provider):
+    name = "weatherapi"
+    base_url = "https://api.weatherapi.com/v1"
+
+    def request(self, location):
+        return f"{self.base_url}/current.json", {"key": self.api_key, "q": f"{location['lat']},{location['lon']}", "aqi": "no"}
+
+    def parse(self, location, payload):
+        return payload["current"]["temp_c"]
+
+
+class OpenWeatherMap(Provider):
+    name = "openweathermap"
+    base_url = "https://api.openweathermap.org/data/2.5"
+    # Free plan: 60 calls per minute
+    rate = 1
+    burst = 60
+
+    def request(self, location):
+        return f"{self.base_url}/weather", {"lat": location["lat"], "lon": location["lon"], "appid": self.api_key}
+
+    def parse(self, location, payload):
+        return payload["main"]["temp"] - 273.15
+
+
+PROVIDERS = {provider.name: provider for provider in (WeatherAPI, OpenWeatherMap)}
+
+
+class RateLimiter:
+    # Token bucket: `rate` requests per second sustained, up to `burst` at once
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class WeatherFetcher:
+    def __init__(self, provider, concurrency=64, retries=3, backoff=0.5, timeout=10, log=None):
+        self.provider = provider
+        self.log = log or (lambda message: None)
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.limiter = RateLimiter(provider.rate, provider.burst)
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def fetch(self, location):
+        url, params = self.provider.request(location)
+        for attempt in range(self.retries + 1):
+            delay = self.backoff * 2 ** attempt * (1 + random.random())
+            try:
+                await self.limiter.acquire()
+                async with self._semaphore, self.session.get(url, params=params) as response:
+                    if response.status in RETRY_STATUS and attempt < self.retries:
+                        retry_after = response.headers.get("Retry-After")
+                        if retry_after and retry_after.isdigit():
+                            delay = max(delay, float(retry_after))
+                        await asyncio.sleep(delay)
+                        continue
+                    response.raise_for_status()
+                    payload = await response.json(content_type=None)
+                return self.provider.parse(location, payload)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries or (isinstance(e, aiohttp.ClientResponseError) and e.status not in RETRY_STATUS):
+                    raise
+                await asyncio.sleep(delay)
+
+    async def fetch_round(self, locations):
+        """
+        Current temperature at every location, in the order given.
+
+        A location that still fails after its retries is reported as None so
+        one bad request never sinks the whole round.
+        """
+        results = await asyncio.gather(*(self.fetch(location) for location in locations), return_exceptions=True)
+        readings = []
+        for location, result in zip(locations, results):
+            if isinstance(result, Exception):
+                self.log(f"{self.provider.name}: {location.get('state', location)} failed: {describe_error(result)}")
+                result = None
+            readings.append(result)
+        return readings
+
+    async def poll(self, locations, rounds, interval=1.0):
+        # Rounds start every `interval` seconds (or back to back if a round
+        # takes longer than that)
+        for n in range(rounds):
+            started = time.monotonic()
+            yield n, await self.fetch_round(locations)
+            if n < rounds - 1:
+                await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def poll_rounds(provider, locations, rounds, interval=1.0, concurrency=64, on_round=None, log=None):
+    """
+    Blocking helper: run `rounds` polling rounds and return them as a list of
+    reading lists (one temperature or None per location). Failed locations
+    are reported through log(message).
+    """
+    async def run():
+        collected = []
+        async with WeatherFetcher(provider, concurrency=concurrency, log=log) as fetcher:
+            async for n, readings in fetcher.poll(locations, rounds, interval):
+                collected.append(readings)
+                if on_round:
+                    on_round(n, readings)
+        return collected
+
+    return asyncio.run(run())
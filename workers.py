@@ -0,0 +1,51 @@
+import threading
+import traceback
+
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from loaders import Cancelled
+
+
+class TaskSignals(QObject):
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    log = pyqtSignal(str)
+
+
+class Task(QRunnable):
+    """
+    Runs fn(progress, cancelled, log) on a QThreadPool thread.
+
+    fn reports progress(done, total), polls cancelled() between chunks of
+    work and sends non-fatal messages through log(text); results and errors
+    come back to the GUI thread through the signals.
+    """
+
+    def __init__(self, fn):
+        super().__init__()
+        self.fn = fn
+        self.signals = TaskSignals()
+        self._cancel = threading.Event()
+        self.setAutoDelete(False)
+
+    def cancel(self):
+        self._cancel.set()
+
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+    def run(self):
+        try:
+            result = self.fn(self.signals.progress.emit, self.is_cancelled, self.signals.log.emit)
+        except Cancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.failed.emit(str(e))
+        else:
+            if self.is_cancelled():
+                self.signals.cancelled.emit()
+            else:
+                self.signals.finished.emit(result)
@@ -0,0 +1,278 @@
+import argparse
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import pyogrio
+import rasterio
+import shapely
+import xarray as xr
+from rasterio.features import rasterize
+from rasterio.errors import WindowError
+from rasterio.transform import from_origin
+from rasterio.windows import Window, from_bounds
+from rasterio.windows import transform as window_transform
+
+from datacube import DIM_NAMES
+from geoprocessing import default_workers
+from layer_cache import get_cache
+from loaders import Cancelled, _never_cancelled, _noop_progress
+from tiles import WGS84
+
+# Zonal statistics of a raster or (time, lat, lon) cube per polygon. Zones are
+# rasterized onto the data grid once; the result is kept in the layer cache as
+# the pixel order grouping every zone's pixels together, keyed by the zone
+# geometries and the grid. Each band/time step is then a few bincount and
+# reduceat passes over that order, for all zones at once, and steps run on a
+# thread pool. Zones that overlap another are rasterized one by one instead,
+# so a pixel they share counts for each of them.
+
+STATS = ("count", "mean", "sum", "min", "max", "std")
+
+
+class Grid:
+    def __init__(self, transform, shape, crs):
+        self.transform = transform
+        self.shape = tuple(shape)
+        self.crs = crs or WGS84
+
+    def key(self):
+        return (self.crs.to_wkt(), tuple(self.transform)[:6], self.shape)
+
+
+def _zones_key(zones):
+    digest = hashlib.sha1()
+    for wkb in shapely.to_wkb(zones.geometry.values):
+        digest.update(wkb or b"")
+    return digest.hexdigest()
+
+
+def overlapping_zones(geoms):
+    # Positions of the zones sharing area with another zone (touching edges don't count)
+    valid = np.flatnonzero(~(shapely.is_missing(geoms) | shapely.is_empty(geoms)))
+    left, right = shapely.STRtree(geoms[valid]).query(geoms[valid], predicate="intersects")
+    pairs = left < right
+    left, right = valid[left[pairs]], valid[right[pairs]]
+    shared = shapely.area(shapely.intersection(geoms[left], geoms[right])) > 0
+    return np.unique(np.concatenate([left[shared], right[shared]]))
+
+
+def _zone_pixels(geom, grid, all_touched):
+    # Flat indices of one zone's pixels, rasterized only over its bounding window
+    full = Window(0, 0, grid.shape[1], grid.shape[0])
+    try:
+        bounds = from_bounds(*geom.bounds, grid.transform)
+        col0, row0 = int(np.floor(bounds.col_off)) - 1, int(np.floor(bounds.row_off)) - 1
+        col1 = int(np.ceil(bounds.col_off + bounds.width)) + 1
+        row1 = int(np.ceil(bounds.row_off + bounds.height)) + 1
+        window = Window(col0, row0, col1 - col0, row1 - row0).intersection(full)
+    except WindowError:
+        return np.empty(0, dtype=np.intp)
+    mask = rasterize([(geom, 1)], out_shape=(window.height, window.width),
+                     transform=window_transform(window, grid.transform), fill=0, all_touched=all_touched, dtype="uint8")
+    rows, cols = np.nonzero(mask)
+    return (rows + window.row_off) * grid.shape[1] + cols + window.col_off
+
+
+def zone_order(zones, grid, all_touched=False):
+    """
+    (order, sizes): flat indices of the pixels covered by a zone, grouped by
+    zone in row order of `zones`, and the pixel count of each zone. Cached per
+    (zone geometries, grid).
+
+    Zones are burned into one label raster, except those that overlap another
+    zone: each of these is rasterized on its own, so a shared pixel counts for
+    every zone covering it.
+    """
+    def build():
+        geoms = zones.to_crs(grid.crs).geometry.values if zones.crs is not None else zones.geometry.values
+        geoms = np.asarray(geoms, dtype=object)
+        separate = overlapping_zones(geoms)
+        burned = np.ones(len(geoms), dtype=bool)
+        burned[separate] = False
+        shapes = [(geom, i + 1) for i, geom in enumerate(geoms)
+                  if burned[i] and geom is not None and not geom.is_empty]
+        labels = np.zeros(grid.shape, dtype="int32")
+        if shapes:
+            labels = rasterize(shapes, out_shape=grid.shape, transform=grid.transform, fill=0,
+                               all_touched=all_touched, dtype="int32")
+        labels = labels.ravel()
+        order = np.argsort(labels, kind="stable")
+        sizes = np.bincount(labels, minlength=len(zones) + 1)
+        order, sizes = order[sizes[0]:], sizes[1:]
+        if not len(separate):
+            return order, sizes
+
+        pixels = np.split(order, np.cumsum(sizes)[:-1])
+        for i in separate:
+            pixels[i] = _zone_pixels(geoms[i], grid, all_touched)
+        return np.concatenate(pixels), np.array([len(p) for p in pixels])
+
+    key = ("zones", _zones_key(zones), grid.key(), all_touched)
+    return get_cache().lookup(key, build)
+
+
+def zone_stats(values, order, sizes, stats=STATS, percentiles=()):
+    """
+    Statistics of one 2-D array for every zone; NaN values are skipped.
+    Returns {name: array over zones}.
+    """
+    zones = len(sizes)
+    v = np.asarray(values, dtype="float64").ravel()[order]
+    label = np.repeat(np.arange(zones), sizes)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    valid = ~np.isnan(v)
+
+    count = np.bincount(label[valid], minlength=zones)
+    total = np.bincount(label[valid], weights=v[valid], minlength=zones)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+    out = {"count": count, "sum": np.where(count > 0, total, np.nan), "mean": mean}
+
+    if "std" in stats:
+        deviation = (v - mean[label])[valid]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out["std"] = np.sqrt(np.bincount(label[valid], weights=deviation ** 2, minlength=zones) / count)
+
+    nonempty = sizes > 0
+    for name, reduce, fill in (("min", np.minimum, np.inf), ("max", np.maximum, -np.inf)):
+        if name in stats:
+            result = np.full(zones, np.nan)
+            if nonempty.any():
+                result[nonempty] = reduce.reduceat(np.where(valid, v, fill), starts[nonempty])
+            out[name] = np.where(count > 0, result, np.nan)
+
+    if percentiles:
+        # Sort within each zone (NaN last), then interpolate between ranks
+        # (one trailing NaN keeps the index of an empty last zone in range)
+        ordered = np.append(v[np.lexsort((v, label))], np.nan)
+        for q in percentiles:
+            rank = np.maximum(count - 1, 0) * q / 100
+            lower = np.floor(rank).astype(int)
+            low, high = ordered[starts + lower], ordered[starts + np.ceil(rank).astype(int)]
+            out[f"p{q:g}"] = np.where(count > 0, low + (high - low) * (rank - lower), np.nan)
+
+    return {name: out[name] for name in list(stats) + [f"p{q:g}" for q in percentiles]}
+
+
+def _raster_steps(file_path):
+    with rasterio.open(file_path) as src:
+        grid = Grid(src.transform, src.shape, src.crs)
+        steps = list(range(1, src.count + 1))
+
+    def read(band):
+        # One handle per call: rasterio datasets are not shared between threads
+        with rasterio.open(file_path) as src:
+            return src.read(band, masked=True).astype("float64").filled(np.nan)
+
+    return grid, [f"band{band}" for band in steps], steps, read
+
+
+def _cube_steps(data, time_dim="time"):
+    data = data.rename({dim: DIM_NAMES[dim] for dim in data.dims if dim in DIM_NAMES})
+    if time_dim not in data.dims:
+        data = data.expand_dims(time_dim)
+    data = data.transpose(time_dim, "lat", "lon")
+    if data["lat"].values[0] < data["lat"].values[-1]:
+        data = data.isel(lat=slice(None, None, -1))  # north-up like a GeoTIFF
+    lats, lons = data["lat"].values, data["lon"].values
+    dy = abs(lats[0] - lats[-1]) / max(len(lats) - 1, 1)
+    dx = abs(lons[-1] - lons[0]) / max(len(lons) - 1, 1)
+    grid = Grid(from_origin(lons[0] - dx / 2, lats[0] + dy / 2, dx, dy), (len(lats), len(lons)), WGS84)
+    steps = list(range(data.sizes[time_dim]))
+    labels = list(data[time_dim].values) if time_dim in data.coords else steps
+
+    def read(step):
+        return np.asarray(data.isel({time_dim: step}).values, dtype="float64")
+
+    return grid, labels, steps, read
+
+
+def zonal_stats(source, zones, stats=STATS, percentiles=(), all_touched=False, workers=None,
+                progress=None, cancelled=None):
+    """
+    Statistics of `source` per zone and step as a long DataFrame with one row
+    per (zone, step).
+
+    `source` is a GeoTIFF path (every band is a step) or a (time, lat, lon)
+    DataArray; `zones` is a polygon GeoDataFrame whose index labels the rows.
+    """
+    progress = progress or _noop_progress
+    cancelled = cancelled or _never_cancelled
+    if isinstance(source, xr.DataArray):
+        grid, labels, steps, read = _cube_steps(source)
+    else:
+        grid, labels, steps, read = _raster_steps(source)
+    if not steps:
+        columns = ["zone", "step"] + list(stats) + [f"p{q:g}" for q in percentiles]
+        return pd.DataFrame(columns=columns)
+    order, sizes = zone_order(zones, grid, all_touched)
+
+    def run(step):
+        return zone_stats(read(step), order, sizes, stats, percentiles)
+
+    results = [None] * len(steps)
+    with ThreadPoolExecutor(max_workers=min(workers or default_workers(), len(steps))) as executor:
+        futures = {executor.submit(run, step): i for i, step in enumerate(steps)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            if cancelled():
+                for pending in futures:
+                    pending.cancel()
+                raise Cancelled(str(source.name if isinstance(source, xr.DataArray) else source))
+            results[futures[future]] = future.result()
+            progress(done, len(steps))
+
+    frames = []
+    for label, result in zip(labels, results):
+        frame = pd.DataFrame(result, index=zones.index)
+        frame.insert(0, "step", label)
+        frames.append(frame)
+    return pd.concat(frames).rename_axis("zone").reset_index()
+
+
+def join_zones(zones, table):
+    # Zones with one set of statistic columns per step (suffixed when several)
+    steps = table["step"].unique()
+    joined = zones.copy()
+    for step in steps:
+        columns = table[table["step"] == step].set_index("zone").drop(columns="step")
+        if len(steps) > 1:
+            columns = columns.add_suffix(f"_{step}")
+        joined = joined.join(columns)
+    return joined
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Zonal statistics of a raster per polygon")
+    parser.add_argument("raster", help="GeoTIFF, or NetCDF/Zarr cube with --variable")
+    parser.add_argument("zones")
+    parser.add_argument("output", help=".csv, .parquet, or a vector file to join the statistics to the zones")
+    parser.add_argument("--variable", help="cube variable")
+    parser.add_argument("--stats", nargs="+", choices=STATS, default=list(STATS))
+    parser.add_argument("--percentiles", nargs="+", type=float, default=[])
+    parser.add_argument("--all-touched", action="store_true")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    source = args.raster
+    if not source.lower().endswith((".tif", ".tiff")):
+        opened = xr.open_zarr(source) if source.rstrip("/").endswith(".zarr") else xr.open_dataset(source, chunks={})
+        source = opened[args.variable or next(iter(opened.data_vars))]
+
+    def progress(done, total):
+        print(f"\rzonal stats: {done}/{total}", end="", flush=True)
+
+    zones = pyogrio.read_dataframe(args.zones)
+    table = zonal_stats(source, zones, args.stats, args.percentiles, args.all_touched, args.workers, progress)
+    print()
+    if args.output.endswith(".csv"):
+        table.to_csv(args.output, index=False)
+    elif args.output.endswith(".parquet"):
+        table.to_parquet(args.output, index=False)
+    else:
+        pyogrio.write_dataframe(join_zones(zones, table), args.output)
+
+
+if __name__ == "__main__":
+    main()